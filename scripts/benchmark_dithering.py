@@ -0,0 +1,108 @@
+"""
+Dithering engine benchmark for InkyPi.
+
+Dithers a synthetic test frame (smooth gradients, a photo-like noise field and flat areas
+with text-like edges) onto the measured Spectra 6 palette with every engine and reports throughput
+and quality at each resolution. Quality is the RMS error between the source and the
+dithered frame, drawn in the panel's measured colors, after both are blurred, which approximates how the frame looks from a
+viewing distance; lower is better.
+
+Usage:
+    python scripts/benchmark_dithering.py
+    python scripts/benchmark_dithering.py --engines bayer blue-noise --repeat 5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(SCRIPTS_DIR), "src"))
+
+from utils.dithering import DITHER_ENGINES, dither_image, palette_image  # noqa: E402
+from utils.palette import get_palette  # noqa: E402
+
+RESOLUTIONS = [[800, 480], [1600, 1200]]
+
+VIEWING_BLUR_RADIUS = 2
+
+def make_test_frame(width, height, seed=1):
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    pixels = np.zeros((height, width, 3), dtype=np.float32)
+    pixels[..., 0] = 255 * x
+    pixels[..., 1] = 255 * y
+    pixels[..., 2] = 255 * (1 - x) * y
+
+    # photo-like low frequency noise in the lower half
+    noise = rng.random((height // 16 + 1, width // 16 + 1, 3)).astype(np.float32) * 255
+    noise = np.asarray(Image.fromarray(noise.astype(np.uint8)).resize((width, height), Image.Resampling.BICUBIC),
+                       dtype=np.float32)
+    pixels[height // 2:] = 0.5 * pixels[height // 2:] + 0.5 * noise[height // 2:]
+
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(image)
+    # flat panel with text-like strokes, where ordered dithering patterns show most
+    draw.rectangle([width // 10, height // 10, width // 2, height // 3], fill=(240, 240, 240))
+    for line in range(6):
+        top = height // 10 + 8 + line * (height // 40 + 4)
+        draw.rectangle([width // 10 + 8, top, width // 2 - 8 - line * 12, top + height // 80 + 1], fill=(20, 20, 20))
+    return image
+
+def perceived_error(source, dithered, palette):
+    # compare against what the panel shows, the measured colors
+    dithered = dithered.copy()
+    dithered.putpalette(palette_image(palette.measured).getpalette())
+    source = np.asarray(source.filter(ImageFilter.GaussianBlur(VIEWING_BLUR_RADIUS)), dtype=np.float32)
+    dithered = np.asarray(dithered.convert("RGB").filter(ImageFilter.GaussianBlur(VIEWING_BLUR_RADIUS)),
+                          dtype=np.float32)
+    return float(np.sqrt(np.mean(np.square(source - dithered))))
+
+def benchmark(engine, frame, palette, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        dithered = dither_image(frame, palette, engine)
+        durations.append(time.perf_counter() - start)
+    wall_time = statistics.median(durations)
+    megapixels = frame.width * frame.height / 1e6
+    return {
+        "wall_time": wall_time,
+        "megapixels_per_second": megapixels / wall_time,
+        "error": perceived_error(frame, dithered, palette),
+    }
+
+def parse_resolution(value):
+    width, height = value.lower().split("x")
+    return [int(width), int(height)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark InkyPi dithering engines")
+    parser.add_argument("--engines", nargs="*", choices=list(DITHER_ENGINES), help="Engines to run (default: all)")
+    parser.add_argument("--resolutions", nargs="*", help="Resolutions as WIDTHxHEIGHT (default: 800x480 1600x1200)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per engine, the median is reported")
+    args = parser.parse_args()
+
+    engines = args.engines or list(DITHER_ENGINES)
+    resolutions = [parse_resolution(r) for r in args.resolutions] if args.resolutions else RESOLUTIONS
+
+    palette = get_palette("spectra6")
+    palette.lut()
+    print(f"{'engine':<18}{'resolution':>12}{'time (s)':>11}{'MP/s':>8}{'error':>8}")
+    for width, height in resolutions:
+        frame = make_test_frame(width, height)
+        # warm up lazily built threshold maps so they aren't counted
+        dither_image(frame.crop((0, 0, 16, 16)), palette, "blue-noise")
+        for engine in engines:
+            result = benchmark(engine, frame, palette, args.repeat)
+            print(f"{engine:<18}{f'{width}x{height}':>12}{result['wall_time']:>11.3f}"
+                  f"{result['megapixels_per_second']:>8.2f}{result['error']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
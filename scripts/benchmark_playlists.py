@@ -0,0 +1,97 @@
+"""
+Playlist model benchmark for InkyPi.
+
+Builds a synthetic playlist config with many plugin instances and times the operations
+the refresh task and the web UI run on it: loading and saving the JSON, finding instances,
+checking whether instances should refresh and picking the active playlist. Also checks
+that the JSON round-trips unchanged.
+
+Usage:
+    python scripts/benchmark_playlists.py
+    python scripts/benchmark_playlists.py --playlists 8 --instances 500
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(SCRIPTS_DIR), "src"))
+
+from model import PlaylistManager  # noqa: E402
+
+PLUGIN_IDS = ["clock", "weather", "calendar", "apod", "wpotd", "image_url", "rss", "todo_list"]
+
+def make_config(playlists, instances, seed=1):
+    rng = random.Random(seed)
+    now = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+    config = {"playlists": [], "active_playlist": None}
+    for index in range(playlists):
+        start = rng.randrange(0, 24)
+        end = (start + rng.randrange(1, 24)) % 24
+        plugins = []
+        for number in range(instances):
+            refresh = ({"interval": rng.choice([300, 900, 3600, 86400])} if rng.random() < 0.7
+                       else {"scheduled": f"{rng.randrange(24):02d}:{rng.randrange(60):02d}"})
+            plugins.append({
+                "plugin_id": rng.choice(PLUGIN_IDS),
+                "name": f"Instance {index}-{number}",
+                "plugin_settings": {"setting": number},
+                "refresh": refresh,
+                "latest_refresh_time": (now - timedelta(seconds=rng.randrange(2 * 86400))).isoformat(),
+            })
+        config["playlists"].append({
+            "name": f"Playlist {index}",
+            "start_time": f"{start:02d}:00",
+            "end_time": f"{end:02d}:00" if index else "24:00",
+            "plugins": plugins,
+            "current_plugin_index": None,
+        })
+    return config
+
+def timed(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the InkyPi playlist model")
+    parser.add_argument("--playlists", type=int, default=4, help="Number of playlists")
+    parser.add_argument("--instances", type=int, default=300, help="Plugin instances per playlist")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per operation, the median is reported")
+    args = parser.parse_args()
+
+    config = make_config(args.playlists, args.instances)
+    manager = PlaylistManager.from_dict(config)
+    if json.dumps(manager.to_dict(), sort_keys=True) != json.dumps(config, sort_keys=True):
+        sys.exit("Playlist JSON doesn't round-trip unchanged")
+
+    instances = [plugin for playlist in manager.playlists for plugin in playlist.plugins]
+    keys = [(plugin.plugin_id, plugin.name) for plugin in instances]
+    current_dt = datetime(2026, 10, 19, 12, 30, tzinfo=timezone.utc)
+    minutes = [current_dt + timedelta(minutes=minute) for minute in range(0, 24 * 60, 15)]
+
+    results = {
+        "from_dict": timed(lambda: PlaylistManager.from_dict(config), args.repeat),
+        "to_dict": timed(manager.to_dict, args.repeat),
+        "find_plugin (all)": timed(lambda: [manager.find_plugin(*key) for key in keys], args.repeat),
+        "should_refresh (all)": timed(lambda: [plugin.should_refresh(current_dt) for plugin in instances], args.repeat),
+        "determine_active_playlist (x96)": timed(lambda: [manager.determine_active_playlist(dt) for dt in minutes],
+                                                 args.repeat),
+    }
+
+    print(f"{len(instances)} plugin instances in {args.playlists} playlists")
+    print(f"{'operation':<34}{'time (ms)':>10}")
+    for name, duration in results.items():
+        print(f"{name:<34}{duration * 1000:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+"""
+Plugin benchmark suite for InkyPi.
+
+Runs each plugin's generate_image against recorded HTTP fixtures and reports wall time,
+CPU time (including Chromium child processes), peak RSS and Chromium screenshot time per
+plugin and resolution. Results can be stored as a baseline and later runs are compared
+against it, flagging regressions.
+
+Network access is never made: every outgoing `requests` call is redirected to a local
+stand-in server that replays the responses described in benchmark_fixtures/routes.json.
+Image downloads are synthesized at the recorded size instead of being stored in the repo.
+
+Each (plugin, resolution, orientation) case runs in a fresh process so that peak RSS
+measurements are not polluted by previous cases.
+
+Usage:
+    python scripts/benchmark_plugins.py
+    python scripts/benchmark_plugins.py --cases weather_open_meteo rss --repeat 5
+    python scripts/benchmark_plugins.py --save-baseline
+"""
+
+import argparse
+import copy
+import fnmatch
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import urlsplit, parse_qsl
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(SCRIPTS_DIR), "src")
+FIXTURES_DIR = os.path.join(SCRIPTS_DIR, "benchmark_fixtures")
+ROUTES_FILE = os.path.join(FIXTURES_DIR, "routes.json")
+DEFAULT_BASELINE_FILE = os.path.join(FIXTURES_DIR, "baseline.json")
+
+RESOLUTIONS = [
+    [400, 300],  # Inky wHAT
+    [640, 400],  # Inky Impression 4"
+    [600, 448],  # Inky Impression 5.7"
+    [800, 480],  # Inky Impression 7.3"
+]
+ORIENTATIONS = ["horizontal", "vertical"]
+
+# Metrics compared against the baseline, with the minimum absolute change that counts
+# as a regression so that sub-noise differences on fast plugins are ignored.
+REGRESSION_METRICS = {
+    "wall_time": 0.05,
+    "cpu_time": 0.05,
+    "chromium_time": 0.05,
+    "peak_rss_mb": 5.0,
+}
+
+BENCHMARK_CASES = [
+    {
+        "name": "weather_openweathermap",
+        "plugin_id": "weather",
+        "settings": {"latitude": "46.05", "longitude": "14.51", "units": "metric",
+                     "weatherProvider": "OpenWeatherMap", "titleSelection": "location"},
+    },
+    {
+        "name": "weather_open_meteo",
+        "plugin_id": "weather",
+        "settings": {"latitude": "46.05", "longitude": "14.51", "units": "metric",
+                     "weatherProvider": "OpenMeteo", "customTitle": "Ljubljana"},
+    },
+    {
+        "name": "apod",
+        "plugin_id": "apod",
+        "settings": {"customDate": "2025-06-01"},
+    },
+    {
+        "name": "wpotd",
+        "plugin_id": "wpotd",
+        "settings": {"customDate": "2025-06-01", "shrinkToFitWpotd": "true"},
+    },
+    {
+        "name": "calendar_month",
+        "plugin_id": "calendar",
+        "settings": {"viewMode": "dayGridMonth",
+                     "calendarURLs[]": ["https://calendar.example.com/work.ics", "https://calendar.example.com/home.ics"],
+                     "calendarColors[]": ["#007BFF", "#E53935"]},
+    },
+    {
+        "name": "rss",
+        "plugin_id": "rss",
+        "settings": {"title": "Benchmark News", "feedUrl": "https://news.example.com/feed.xml", "includeImages": "true"},
+    },
+    {
+        "name": "github_contributions",
+        "plugin_id": "github",
+        "settings": {"githubType": "contributions", "githubUsername": "inkypi",
+                     "contributionColor[]": ["#ebedf0", "#9be9a8", "#40c463", "#30a14e", "#216e39"]},
+    },
+    {
+        "name": "immich_album",
+        "plugin_id": "image_album",
+        "settings": {"albumProvider": "Immich", "url": "https://immich.example.com", "album": "Family",
+                     "padImage": "true", "backgroundOption": "blur"},
+    },
+    {
+        "name": "unsplash",
+        "plugin_id": "unsplash",
+        "settings": {},
+    },
+    {
+        "name": "clock",
+        "plugin_id": "clock",
+        "settings": {"selectedClockFace": "Gradient Clock"},
+    },
+    {
+        "name": "year_progress",
+        "plugin_id": "year_progress",
+        "settings": {},
+    },
+]
+
+class BenchmarkDeviceConfig:
+    """Minimal stand-in for Config providing the values plugins read while generating."""
+
+    def __init__(self, resolution, orientation):
+        self.cache_dir = tempfile.mkdtemp(prefix="inkypi-benchmark-")
+        self.config = {
+            "resolution": list(resolution),
+            "orientation": orientation,
+            "timezone": "Europe/Ljubljana",
+            "time_format": "24h",
+        }
+
+    def get_config(self, key=None, default={}):
+        if key is not None:
+            return self.config.get(key, default)
+        return self.config
+
+    def get_resolution(self):
+        width, height = self.config["resolution"]
+        return (int(width), int(height))
+
+    def load_env_key(self, key):
+        return "benchmark-key"
+
+# -------------------------
+# Fixture server
+# -------------------------
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    """Replays recorded responses for requests rewritten as /<host>/<path>?<query>."""
+
+    routes = []
+    image_cache = {}
+    image_lock = threading.Lock()
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        self._respond()
+
+    def _respond(self):
+        parts = urlsplit(self.path)
+        host, _, path = parts.path.lstrip("/").partition("/")
+        path = "/" + path
+        query = dict(parse_qsl(parts.query))
+
+        body = {}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            try:
+                body = json.loads(self.rfile.read(length))
+            except ValueError:
+                body = {}
+
+        route = find_route(self.routes, host, path, query, body)
+        if route is None:
+            self.send_error(404, f"No fixture recorded for {host}{path}")
+            return
+
+        payload, content_type = self._load_payload(route)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _load_payload(self, route):
+        if "image" in route:
+            size = tuple(route["image"])
+            with self.image_lock:
+                if size not in self.image_cache:
+                    self.image_cache[size] = synthesize_jpeg(size)
+            return self.image_cache[size], "image/jpeg"
+
+        file_path = os.path.join(FIXTURES_DIR, route["file"])
+        with open(file_path, "rb") as f:
+            payload = f.read()
+        return payload, route.get("content_type", "application/json")
+
+    def log_message(self, format, *args):
+        pass
+
+def find_route(routes, host, path, query, body):
+    """Returns the first route matching the host, path glob, and query/body subsets."""
+    for route in routes:
+        if route["host"] != host or not fnmatch.fnmatch(path, route["path"]):
+            continue
+        if any(query.get(key) != str(value) for key, value in route.get("query", {}).items()):
+            continue
+        if any(body.get(key) != value for key, value in route.get("body", {}).items()):
+            continue
+        return route
+    return None
+
+def synthesize_jpeg(size):
+    """Creates a photo-like JPEG of the given size so decode and resize costs are realistic."""
+    from PIL import Image
+
+    width, height = size
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 48)
+    mandel = Image.effect_mandelbrot(size, (-2.0, -1.2, 1.0, 1.2), 64)
+    image = Image.merge("RGB", (gradient, noise, mandel))
+
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+def start_fixture_server():
+    with open(ROUTES_FILE) as f:
+        FixtureRequestHandler.routes = json.load(f)["routes"]
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def install_fixture_redirect(port):
+    """Routes every outgoing `requests` call to the local fixture server."""
+    from requests.adapters import HTTPAdapter
+
+    original_send = HTTPAdapter.send
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        rewritten = f"http://127.0.0.1:{port}/{parts.hostname}{parts.path or '/'}"
+        if parts.query:
+            rewritten += f"?{parts.query}"
+        request.url = rewritten
+        return original_send(self, request, **kwargs)
+
+    HTTPAdapter.send = send
+
+# -------------------------
+# Benchmark worker
+# -------------------------
+
+def read_plugin_config(plugin_id):
+    with open(os.path.join(SRC_DIR, "plugins", plugin_id, "plugin-info.json")) as f:
+        return json.load(f)
+
+def max_rss_mb(who):
+    max_rss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    if sys.platform == "darwin":
+        max_rss /= 1024
+    return max_rss / 1024
+
+def run_case(case, resolution, orientation, port, repeat, result_queue):
+    """Runs one case in the current (fresh) process and puts the result on the queue."""
+    try:
+        sys.path.insert(0, SRC_DIR)
+        install_fixture_redirect(port)
+
+        from plugins.plugin_registry import load_plugins, get_plugin_instance
+        from utils import metrics
+        from utils.metrics import REGISTRY
+
+        plugin_config = read_plugin_config(case["plugin_id"])
+        load_plugins([plugin_config])
+        plugin = get_plugin_instance(plugin_config)
+        device_config = BenchmarkDeviceConfig(resolution, orientation)
+
+        samples = []
+        for _ in range(repeat):
+            REGISTRY.reset()
+            settings = copy.deepcopy(case["settings"])
+
+            children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpu_before = time.process_time()
+            start = time.perf_counter()
+
+            with metrics.plugin_context(case["plugin_id"]), metrics.track_generate():
+                plugin.generate_image(settings, device_config)
+
+            wall_time = time.perf_counter() - start
+            children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            child_cpu = (children_after.ru_utime - children_before.ru_utime) + \
+                        (children_after.ru_stime - children_before.ru_stime)
+            stages = {s["stage"]: s["sum"] for s in REGISTRY.snapshot()["stages"]}
+
+            samples.append({
+                "wall_time": wall_time,
+                "cpu_time": time.process_time() - cpu_before + child_cpu,
+                "chromium_time": stages.get("screenshot", 0.0),
+                "data_fetch_time": stages.get("data_fetch", 0.0),
+            })
+
+        result = {key: statistics.median(s[key] for s in samples) for key in samples[0]}
+        result["peak_rss_mb"] = max_rss_mb(resource.RUSAGE_SELF)
+        result["chromium_peak_rss_mb"] = max_rss_mb(resource.RUSAGE_CHILDREN)
+        result_queue.put(result)
+    except Exception as e:
+        result_queue.put({"error": f"{type(e).__name__}: {e}"})
+
+def run_isolated(case, resolution, orientation, port, repeat, timeout):
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    process = context.Process(target=run_case, args=(case, resolution, orientation, port, repeat, result_queue))
+    process.start()
+    try:
+        result = result_queue.get(timeout=timeout)
+    except Exception:
+        result = {"error": f"Timed out after {timeout}s"}
+        process.terminate()
+    process.join()
+    return result
+
+# -------------------------
+# Reporting
+# -------------------------
+
+def case_key(case_name, resolution, orientation):
+    return f"{case_name}@{resolution[0]}x{resolution[1]}/{orientation}"
+
+def find_regressions(result, baseline, threshold):
+    regressions = []
+    for metric, min_delta in REGRESSION_METRICS.items():
+        current, previous = result.get(metric), baseline.get(metric)
+        if current is None or previous is None:
+            continue
+        if current > previous * (1 + threshold) and current - previous > min_delta:
+            regressions.append(f"{metric} {previous:.2f} -> {current:.2f}")
+    return regressions
+
+def print_row(key, result, regressions):
+    if "error" in result:
+        print(f"{key:<48} ERROR {result['error']}")
+        return
+    flag = "  REGRESSION: " + ", ".join(regressions) if regressions else ""
+    print(f"{key:<48} {result['wall_time']:>8.2f} {result['cpu_time']:>8.2f} "
+          f"{result['chromium_time']:>9.2f} {result['peak_rss_mb']:>8.1f}{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark InkyPi plugins against recorded fixtures")
+    parser.add_argument("--cases", nargs="*", help="Case names to run (default: all)")
+    parser.add_argument("--resolutions", nargs="*", help="Resolutions as WIDTHxHEIGHT (default: all)")
+    parser.add_argument("--orientations", nargs="*", choices=ORIENTATIONS, default=["horizontal"])
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case, the median is reported")
+    parser.add_argument("--timeout", type=int, default=300, help="Seconds before a case is aborted")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_FILE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown flagged as a regression")
+    parser.add_argument("--output", help="Write the raw results to this JSON file")
+    args = parser.parse_args()
+
+    cases = [c for c in BENCHMARK_CASES if not args.cases or c["name"] in args.cases]
+    resolutions = RESOLUTIONS
+    if args.resolutions:
+        resolutions = [[int(v) for v in r.lower().split("x")] for r in args.resolutions]
+
+    baseline = {}
+    if os.path.isfile(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    server = start_fixture_server()
+    port = server.server_address[1]
+
+    print(f"{'case':<48} {'wall(s)':>8} {'cpu(s)':>8} {'chrome(s)':>9} {'rss(MB)':>8}")
+    results, regression_count = {}, 0
+    try:
+        for case in cases:
+            for resolution in resolutions:
+                for orientation in args.orientations:
+                    key = case_key(case["name"], resolution, orientation)
+                    result = run_isolated(case, resolution, orientation, port, args.repeat, args.timeout)
+                    regressions = []
+                    if "error" not in result and key in baseline:
+                        regressions = find_regressions(result, baseline[key], args.threshold)
+                    regression_count += bool(regressions)
+                    results[key] = result
+                    print_row(key, result, regressions)
+    finally:
+        server.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        successful = {key: result for key, result in results.items() if "error" not in result}
+        with open(args.baseline, "w") as f:
+            json.dump(successful, f, indent=2)
+        print(f"Saved baseline for {len(successful)} cases to {args.baseline}")
+
+    if regression_count:
+        print(f"{regression_count} case(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
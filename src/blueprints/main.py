@@ -1,80 +1,39 @@
 from flask import Blueprint, request, jsonify, current_app, render_template, send_file, Response
 import os
+import json
+import time
+import hashlib
+import threading
 from io import BytesIO
-from datetime import datetime
+from werkzeug.http import http_date
 from PIL import Image, ImageOps
-import numpy as np
+from utils.frame_store import file_signature
+from utils.frame_delta import FrameHistory, DELTA_VERSION
+from utils.packed_rle import rle_encode, RLE_MIMETYPE, RLE_VERSION
 
 main_bp = Blueprint("main", __name__)
 
-# Waveshare 7.3" Spectra6 display configuration
-DISPLAY_WIDTH = 800
-DISPLAY_HEIGHT = 480
-PORTRAIT_MODE = True
-
-# ============================================================
-# COLOR PALETTE for Spectra 6 display
-# ============================================================
-# Index 0 = Black
-# Index 1 = White  
-# Index 2 = Green
-# Index 3 = Blue
-# Index 4 = Red
-# Index 5 = Yellow
-# ============================================================
-
-def _create_palette_image():
-    """Create palette image that PIL will strictly adhere to."""
-    # Create image with one pixel per color
-    palette_img = Image.new('P', (6, 1))
-    
-    # Define the 6-color palette
-    palette_data = [
-        0, 0, 0,          # 0 = Black
-        255, 255, 255,    # 1 = White
-        0, 128, 0,        # 2 = Green
-        0, 0, 255,        # 3 = Blue
-        255, 0, 0,        # 4 = Red
-        255, 255, 0,      # 5 = Yellow
-    ] + [0] * (768 - 18)  # Pad to 256 colors
-    
-    palette_img.putpalette(palette_data)
-    
-    # Put each color index in a pixel - this forces PIL to use these indices
-    pixels = palette_img.load()
-    for i in range(6):
-        pixels[i, 0] = i
-    
-    return palette_img
-
-# Pre-create palette image at module load
-PALETTE_IMAGE = _create_palette_image()
-
-
-def resize_and_dither_image(image_path):
-    """Resize image to fit display and apply 6-color dithering."""
-    img = Image.open(image_path).convert('RGB')
-
-    # Quantize with our strict 6-color palette
-    quantized = img.quantize(
-        colors=6,
-        palette=PALETTE_IMAGE,
-        dither=Image.Dither.FLOYDSTEINBERG
-    )
-
-    return quantized
-
-
-def convert_to_display_format(image_path):
-    """Convert image to 4bpp packed format using fast PIL quantize."""
-    quantized = resize_and_dither_image(image_path)
-
-    # Get pixel indices and pack
-    pixels = np.array(quantized, dtype=np.uint8)
-    flat = pixels.flatten()
-    packed = (flat[0::2] << 4) | flat[1::2]
-
-    return bytes(packed)
+# Frame change notifications, see FrameNotifier
+LONG_POLL_TIMEOUT_SECONDS = 60
+SSE_STREAM_SECONDS = 10 * 60
+SSE_KEEPALIVE_SECONDS = 25
+SSE_RETRY_MILLISECONDS = 5000
+
+# Packed frames recently sent to remote displays, the bases for delta transfers
+PACKED_FRAME_HISTORY = FrameHistory()
+
+def resize_and_dither_image(image_path, engine=None, profile=None):
+    """Fit the image to the panel profile and map it onto its palette."""
+    device_config = current_app.config['DEVICE_CONFIG']
+    profile = profile or device_config.get_remote_panel_profile()
+    with Image.open(image_path) as img:
+        return profile.dither(img, engine, device_config.cache_dir)
+
+
+def convert_to_display_format(image_path, engine=None, profile=None):
+    """Convert image to the panel profile's device-ready buffer with the given dither engine."""
+    profile = profile or current_app.config['DEVICE_CONFIG'].get_remote_panel_profile()
+    return profile.encode(resize_and_dither_image(image_path, engine, profile))
 
 
 @main_bp.route('/')
@@ -99,53 +58,223 @@ def preview_image():
         return jsonify({"error": "Image not found"}), 404
 
     try:
-        quantized = resize_and_dither_image(image_path)
-        # Convert palette image back to RGB for PNG output
-        rgb_image = quantized.convert('RGB')
-
-        # Save to bytes buffer
-        buffer = BytesIO()
-        rgb_image.save(buffer, format='PNG')
-        buffer.seek(0)
-
-        return send_file(buffer, mimetype='image/png')
+        device_config = current_app.config['DEVICE_CONFIG']
+        etag, png = _get_preview_png(image_path, device_config.get_dither_engine(), device_config.get_remote_panel_profile())
+        response = send_file(BytesIO(png), mimetype='image/png', etag=etag, conditional=True)
+        # revalidate on every load, the preview changes whenever the current image does
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+_preview_cache = {"signature": None, "etag": None, "png": None}
+_preview_lock = threading.Lock()
+
+def _get_preview_png(image_path, engine, profile):
+    """Returns the ETag and PNG bytes of the dithered preview, dithering only when the image, engine or profile changed."""
+    with _preview_lock:
+        signature = (file_signature(image_path), engine, profile.name)
+        if signature[0] is None or signature != _preview_cache["signature"]:
+            quantized = resize_and_dither_image(image_path, engine, profile)
+            # Convert palette image back to RGB for PNG output
+            buffer = BytesIO()
+            quantized.convert('RGB').save(buffer, format='PNG')
+            _preview_cache.update(
+                signature=signature,
+                etag=hashlib.sha1(repr(signature).encode("utf-8")).hexdigest(),
+                png=buffer.getvalue(),
+            )
+        return _preview_cache["etag"], _preview_cache["png"]
+
 
 @main_bp.route('/api/current_image')
 def get_current_image():
     """Serve current image in display format."""
     image_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'images', 'current_image.png')
+    return _frame_response(image_path, current_app.config['FRAME_NOTIFIER'], current_app.config['DEVICE_CONFIG'],
+                           PACKED_FRAME_HISTORY)
 
-    if not os.path.exists(image_path):
-        return jsonify({"error": "Image not found"}), 404
+@main_bp.route('/api/targets')
+def list_targets():
+    """List the display targets with their frame sizes, panel profiles and current frame hashes."""
+    targets = current_app.config['DEVICE_CONFIG'].get_targets()
+    return jsonify([{
+        "name": target.name,
+        "resolution": list(target.get_resolution()),
+        "orientation": target.get_config("orientation"),
+        "panel_profile": target.panel_profile.name,
+        "hash": target.frame_notifier.current(),
+    } for target in targets.values()])
 
-    file_mtime = int(os.path.getmtime(image_path))
-    last_modified = datetime.fromtimestamp(file_mtime)
+@main_bp.route('/api/targets/<name>/current_image')
+def get_target_image(name):
+    """Serve a display target's current image, like /api/current_image."""
+    target = current_app.config['DEVICE_CONFIG'].get_target(name)
+    if target is None:
+        return jsonify({"error": "Target not found"}), 404
+    return _frame_response(target.current_image_file, target.frame_notifier, target, target.packed_frames)
 
-    if_modified_since = request.headers.get('If-Modified-Since')
-    if if_modified_since:
-        try:
-            client_mtime = datetime.strptime(if_modified_since, '%a, %d %b %Y %H:%M:%S %Z')
-            if file_mtime <= int(client_mtime.timestamp()):
-                return '', 304
-        except (ValueError, AttributeError):
-            pass
+def _frame_response(image_path, notifier, device_config, history):
+    """Answers a frame request for the image at image_path, packed with device_config's engine and profile."""
+    # read the file and its hash together, a refresh may replace it at any time
+    with notifier.commit_lock:
+        if not os.path.exists(image_path):
+            return jsonify({"error": "Image not found"}), 404
+        frame_key = notifier.current()
+        file_mtime = int(device_config.get_frame_store().modified_time(image_path))
+        with open(image_path, 'rb') as f:
+            image_data = f.read()
 
     output_format = request.args.get('format', 'spectra6').lower()
+    # compression is opt-in, by format or by accepting the RLE mimetype
+    if output_format == 'spectra6' and any(mimetype == RLE_MIMETYPE and quality > 0
+                                           for mimetype, quality in request.accept_mimetypes):
+        output_format = 'spectra6-rle'
+    packed = output_format in ['raw', 'spectra6', 'spectra6-rle']
+    engine = device_config.get_dither_engine() if packed else None
+    profile = device_config.get_remote_panel_profile() if packed else None
+    # packed frames also depend on the dither engine and the panel profile
+    etag = None
+    if frame_key:
+        etag = f"{frame_key}-{engine}-{profile.name}-{output_format}" if packed else f"{frame_key}-{output_format}"
 
-    if output_format in ['raw', 'spectra6']:
+    # the frame hash is exact, the mtime only has one second resolution
+    if etag and request.if_none_match:
+        if request.if_none_match.contains(etag):
+            return _set_frame_headers(Response(status=304), frame_key, etag, file_mtime)
+    elif request.if_modified_since and file_mtime <= request.if_modified_since.timestamp():
+        return _set_frame_headers(Response(status=304), frame_key, etag, file_mtime)
+
+    if packed:
+        base_key = request.args.get('base')
+        if frame_key and base_key == frame_key:
+            return _set_frame_headers(Response(status=304), frame_key, etag, file_mtime)
         try:
-            packed_data = convert_to_display_format(image_path)
-            response = Response(packed_data, mimetype='application/octet-stream')
-            response.headers['Last-Modified'] = last_modified.strftime('%a, %d %b %Y %H:%M:%S GMT')
-            response.headers['Cache-Control'] = 'no-cache'
-            response.headers['Content-Length'] = len(packed_data)
-            return response
+            packed_data = _get_packed_frame(image_data, frame_key, engine, profile, history)
         except Exception as e:
             return jsonify({"error": str(e)}), 500
+
+        # clients holding a recent frame get only what changed since
+        delta = None
+        if base_key and frame_key:
+            with Image.open(BytesIO(image_data)) as img:
+                row_bytes = profile.frame_row_bytes(img.size)
+            delta = history.delta(f"{base_key}:{engine}:{profile.name}",
+                                  f"{frame_key}:{engine}:{profile.name}", row_bytes)
+        body = delta or packed_data
+        if output_format == 'spectra6-rle':
+            body = rle_encode(body)
+            response = Response(body, mimetype=RLE_MIMETYPE)
+            response.headers['X-Frame-Compression'] = f"rle-v{RLE_VERSION}"
+        else:
+            response = Response(body, mimetype='application/octet-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Content-Length'] = len(body)
+        response.headers['X-Frame-Encoding'] = f"delta-v{DELTA_VERSION}" if delta else "full"
+        response.vary.add('Accept')
+        if delta:
+            response.headers['X-Delta-Base'] = base_key
     else:
-        response = send_file(image_path, mimetype='image/png')
-        response.headers['Last-Modified'] = last_modified.strftime('%a, %d %b %Y %H:%M:%S GMT')
-        return response
\ No newline at end of file
+        response = send_file(BytesIO(image_data), mimetype='image/png', conditional=False)
+    return _set_frame_headers(response, frame_key, etag, file_mtime)
+
+def _get_packed_frame(image_data, frame_key, engine, profile, history):
+    """Returns the packed frame, reusing frames recently packed into history."""
+    history_key = f"{frame_key}:{engine}:{profile.name}"
+    packed_data = history.get(history_key) if frame_key else None
+    if packed_data is None:
+        packed_data = convert_to_display_format(BytesIO(image_data), engine, profile)
+        if frame_key:
+            history.add(history_key, packed_data)
+    return packed_data
+
+def _set_frame_headers(response, frame_key, etag, file_mtime):
+    response.headers['Last-Modified'] = http_date(file_mtime)
+    if etag:
+        response.set_etag(etag)
+        # the hash clients compare against frame change notifications
+        response.headers['X-Frame-Hash'] = frame_key
+    return response
+
+@main_bp.route('/api/current_image/wait')
+def wait_for_current_image():
+    """Long-poll until the current frame differs from the `hash` the client holds.
+
+    Answers right away if the client's hash is already outdated, otherwise after the frame
+    changes or `timeout` seconds pass, with the current hash and whether it changed.
+    """
+    return _wait_for_frame(current_app.config['FRAME_NOTIFIER'])
+
+@main_bp.route('/api/targets/<name>/current_image/wait')
+def wait_for_target_image(name):
+    """Long-poll until a display target's current frame changes, like /api/current_image/wait."""
+    target = current_app.config['DEVICE_CONFIG'].get_target(name)
+    if target is None:
+        return jsonify({"error": "Target not found"}), 404
+    return _wait_for_frame(target.frame_notifier)
+
+def _wait_for_frame(notifier):
+    known_key = request.args.get('hash') or None
+    try:
+        timeout = min(max(float(request.args.get('timeout', LONG_POLL_TIMEOUT_SECONDS)), 0), LONG_POLL_TIMEOUT_SECONDS)
+    except ValueError:
+        return jsonify({"error": "Invalid timeout"}), 400
+
+    frame_key = notifier.current()
+    if frame_key == known_key and timeout:
+        with notifier.listener_slot() as acquired:
+            if not acquired:
+                return _too_many_listeners()
+            frame_key = notifier.wait_for_change(known_key, timeout)
+
+    response = jsonify({"hash": frame_key, "changed": frame_key != known_key})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@main_bp.route('/api/current_image/events')
+def current_image_events():
+    """Stream a Server-Sent `frame` event with the frame hash whenever the current image changes.
+
+    The first event carries the current hash unless it matches the Last-Event-ID the browser
+    sends on reconnect. Streams end after a while so server threads are recycled; EventSource
+    clients reconnect on their own.
+    """
+    return _frame_events(current_app.config['FRAME_NOTIFIER'])
+
+@main_bp.route('/api/targets/<name>/current_image/events')
+def target_image_events(name):
+    """Stream frame events of a display target, like /api/current_image/events."""
+    target = current_app.config['DEVICE_CONFIG'].get_target(name)
+    if target is None:
+        return jsonify({"error": "Target not found"}), 404
+    return _frame_events(target.frame_notifier)
+
+def _frame_events(notifier):
+    known_key = request.headers.get('Last-Event-ID') or None
+    if not notifier.acquire_listener():
+        return _too_many_listeners()
+
+    def stream(known_key):
+        yield f"retry: {SSE_RETRY_MILLISECONDS}\n\n"
+        deadline = time.monotonic() + SSE_STREAM_SECONDS
+        while time.monotonic() < deadline and not notifier.closed:
+            frame_key = notifier.current()
+            if frame_key != known_key:
+                known_key = frame_key
+                yield f"id: {frame_key or ''}\nevent: frame\ndata: {json.dumps({'hash': frame_key})}\n\n"
+            elif notifier.wait_for_change(known_key, SSE_KEEPALIVE_SECONDS) == known_key:
+                # comments keep proxies from closing the connection and reveal dead clients
+                yield ": keepalive\n\n"
+
+    response = Response(stream(known_key), mimetype='text/event-stream')
+    # runs when the server closes the response, even if the stream never started
+    response.call_on_close(notifier.release_listener)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def _too_many_listeners():
+    response = jsonify({"error": "Too many clients waiting for frame changes"})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(SSE_RETRY_MILLISECONDS // 1000)
+    return response
@@ -4,7 +4,7 @@ import json
 from datetime import datetime, timedelta
 import os
 import logging
-from utils.app_utils import resolve_path, handle_request_files, parse_form
+from utils.app_utils import resolve_path, parse_form, stage_request_files, process_uploads_in_background, get_upload_resize_options
 
 
 logger = logging.getLogger(__name__)
@@ -51,7 +51,9 @@ def add_plugin():
                 return jsonify({"error": "Refresh time is required"}), 400
             refresh_config = {"scheduled": refresh_time}
 
-        plugin_settings.update(handle_request_files(request.files, device_config=device_config))
+        resize_options = get_upload_resize_options(device_config, plugin_settings)
+        file_locations, staged_files = stage_request_files(request.files, resize_options=resize_options)
+        plugin_settings.update(file_locations)
         plugin_dict = {
             "plugin_id": plugin_id,
             "refresh": refresh_config,
@@ -63,9 +65,16 @@ def add_plugin():
             return jsonify({"error": "Failed to add to playlist"}), 500
 
         device_config.write_config()
+
+        # uploaded images are added to the instance settings as they are converted
+        upload_job = process_uploads_in_background(current_app.config['UPLOAD_PROCESSOR'], staged_files,
+                                                   device_config, plugin_id, instance_name, resize_options)
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
-    return jsonify({"success": True, "message": "Scheduled refresh configured."})
+    response = {"success": True, "message": "Scheduled refresh configured."}
+    if upload_job:
+        response["upload_job"] = upload_job.id
+    return jsonify(response)
 
 @playlist_bp.route('/playlist')
 def playlists():
@@ -73,10 +82,21 @@ def playlists():
     playlist_manager = device_config.get_playlist_manager()
     refresh_info = device_config.get_refresh_info()
 
+    # frame hashes of the instance images, used to link their immutable thumbnails
+    frame_store = device_config.get_frame_store()
+    image_paths = {}
+    for playlist in playlist_manager.playlists:
+        for plugin_instance in playlist.plugins:
+            image_path = frame_store.frame_path(os.path.join(device_config.plugin_image_dir, plugin_instance.get_image_path()))
+            image_paths[image_path] = f"{playlist.name}/{plugin_instance.plugin_id}/{plugin_instance.name}"
+    frame_keys = frame_store.frame_keys(image_paths)
+    thumbnails = {image_paths[path]: key for path, key in frame_keys.items()}
+
     return render_template(
         'playlist.html',
         playlist_config=playlist_manager.to_dict(),
-        refresh_info=refresh_info.to_dict()
+        refresh_info=refresh_info.to_dict(),
+        thumbnails=thumbnails
     )
 
 @playlist_bp.route('/create_playlist', methods=['POST'])
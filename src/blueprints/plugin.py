@@ -1,24 +1,31 @@
-from flask import Blueprint, request, jsonify, current_app, render_template, send_from_directory
+from flask import Blueprint, request, jsonify, current_app, render_template, send_from_directory, send_file
 from plugins.plugin_registry import get_plugin_instance
-from utils.app_utils import resolve_path, handle_request_files, parse_form
-from refresh_task import ManualRefresh, PlaylistRefresh
+from utils.app_utils import resolve_path, handle_request_files, parse_form, stage_request_files, process_uploads_in_background, get_upload_resize_options
+from refresh_task import ManualRefresh, PlaylistRefresh, generate_image
+from utils.dithering import DITHER_ENGINES
 import json
 import os
 import logging
+from io import BytesIO
 
 logger = logging.getLogger(__name__)
 plugin_bp = Blueprint("plugin", __name__)
 
+THUMBNAIL_MAX_AGE_SECONDS = 365 * 24 * 60 * 60
+
 def _delete_plugin_instance_images(device_config, plugin_instance_obj):
     """Delete all images associated with a plugin instance."""
-    # Delete the plugin instance's generated image
-    plugin_image_path = os.path.join(device_config.plugin_image_dir, plugin_instance_obj.get_image_path())
-    if os.path.exists(plugin_image_path):
-        try:
-            os.remove(plugin_image_path)
-            logger.info(f"Deleted plugin instance image: {plugin_image_path}")
-        except Exception as e:
-            logger.warning(f"Failed to delete plugin instance image {plugin_image_path}: {e}")
+    # Delete the plugin instance's generated image, in whichever frame format it was saved
+    frame_store = device_config.get_frame_store()
+    base_image_path = os.path.join(device_config.plugin_image_dir, plugin_instance_obj.get_image_path())
+    frame_store.invalidate(base_image_path)
+    for plugin_image_path in frame_store.frame_paths(base_image_path):
+        if os.path.exists(plugin_image_path):
+            try:
+                os.remove(plugin_image_path)
+                logger.info(f"Deleted plugin instance image: {plugin_image_path}")
+            except Exception as e:
+                logger.warning(f"Failed to delete plugin instance image {plugin_image_path}: {e}")
 
     # Call the plugin's cleanup method to handle plugin-specific resource cleanup
     try:
@@ -55,6 +62,7 @@ def plugin_page(plugin_id):
                 template_params["plugin_instance"] = plugin_instance_name
 
             template_params["playlists"] = playlist_manager.get_playlist_names()
+            template_params["dither_engines"] = list(DITHER_ENGINES)
         except Exception as e:
             logger.exception("EXCEPTION CAUGHT: " + str(e))
             return jsonify({"error": f"An error occurred: {str(e)}"}), 500
@@ -106,16 +114,31 @@ def plugin_instance_image(playlist_name, plugin_id, instance_name):
         return "Plugin instance not found", 404
 
     # Get the image path
-    image_filename = plugin_instance.get_image_path()
-    image_path = os.path.join(device_config.plugin_image_dir, image_filename)
+    frame_store = device_config.get_frame_store()
+    image_path = frame_store.frame_path(os.path.join(device_config.plugin_image_dir, plugin_instance.get_image_path()))
 
     # Check if the image exists
     if not os.path.exists(image_path):
         # Return a placeholder or 404
         return "Image not yet generated", 404
 
-    # Serve the image
-    return send_from_directory(device_config.plugin_image_dir, image_filename)
+    # Serve the image from the frame cache, converted to PNG if stored in another format
+    png = frame_store.load_png(image_path)
+    return send_file(BytesIO(png), mimetype='image/png', last_modified=frame_store.modified_time(image_path))
+
+@plugin_bp.route('/thumbnails/<string:frame_key>/<string:size>')
+def frame_thumbnail(frame_key, size):
+    """Serve a thumbnail of a stored frame. Thumbnails are named by frame hash so they never change."""
+    device_config = current_app.config['DEVICE_CONFIG']
+    thumbnail_path = device_config.get_frame_store().thumbnail_path(frame_key, size)
+    if not thumbnail_path or not os.path.exists(thumbnail_path):
+        return "Thumbnail not found", 404
+
+    response = send_file(thumbnail_path, etag=f"{frame_key}-{size}", max_age=THUMBNAIL_MAX_AGE_SECONDS,
+                         conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 @plugin_bp.route('/delete_plugin_instance', methods=['POST'])
 def delete_plugin_instance():
@@ -147,6 +170,9 @@ def delete_plugin_instance():
         # save changes to device config file
         device_config.write_config()
 
+        # uploaded files may be shared with other instances, the collector removes them once unreferenced
+        current_app.config['IMAGE_STORE_COLLECTOR'].trigger()
+
     except Exception as e:
         logger.exception("EXCEPTION CAUGHT: " + str(e))
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
@@ -164,18 +190,37 @@ def update_plugin_instance(instance_name):
         if not instance_name:
             raise RuntimeError("Instance name is required")
         plugin_settings = form_data
-        plugin_settings.update(handle_request_files(request.files, request.form, device_config))
+        resize_options = get_upload_resize_options(device_config, form_data)
+        file_locations, staged_files = stage_request_files(request.files, request.form, resize_options)
+        plugin_settings.update(file_locations)
 
         plugin_id = plugin_settings.pop("plugin_id")
         plugin_instance = playlist_manager.find_plugin(plugin_id, instance_name)
         if not plugin_instance:
             return jsonify({"error": f"Plugin instance: {instance_name} does not exist"}), 500
 
-        plugin_instance.settings = plugin_settings
-        device_config.write_config()
+        # under the write lock, as background uploads add files to the instance settings
+        with device_config.write_lock:
+            plugin_instance.settings = plugin_settings
+            device_config.write_config()
+
+        # uploaded images are added to the instance settings as they are converted
+        upload_job = process_uploads_in_background(current_app.config['UPLOAD_PROCESSOR'], staged_files,
+                                                   device_config, plugin_id, instance_name, resize_options)
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
-    return jsonify({"success": True, "message": f"Updated plugin instance {instance_name}."})
+    response = {"success": True, "message": f"Updated plugin instance {instance_name}."}
+    if upload_job:
+        response["upload_job"] = upload_job.id
+    return jsonify(response)
+
+@plugin_bp.route('/upload_status/<string:job_id>')
+def upload_status(job_id):
+    upload_processor = current_app.config['UPLOAD_PROCESSOR']
+    job = upload_processor.get_job(job_id)
+    if not job:
+        return jsonify({"error": "Upload job not found"}), 404
+    return jsonify(job.to_dict())
 
 @plugin_bp.route('/display_plugin_instance', methods=['POST'])
 def display_plugin_instance():
@@ -276,7 +321,8 @@ def update_now():
 
     try:
         plugin_settings = parse_form(request.form)
-        plugin_settings.update(handle_request_files(request.files, device_config=device_config))
+        plugin_settings.update(handle_request_files(request.files, device_config=device_config,
+                                                    upload_processor=current_app.config['UPLOAD_PROCESSOR']))
         plugin_id = plugin_settings.pop("plugin_id")
 
         # Check if refresh task is running
@@ -290,7 +336,7 @@ def update_now():
                 return jsonify({"error": f"Plugin '{plugin_id}' not found"}), 404
 
             plugin = get_plugin_instance(plugin_config)
-            image = plugin.generate_image(plugin_settings, device_config)
+            image = generate_image(plugin, plugin_settings, device_config)
             display_manager.display_image(image, image_settings=plugin_config.get("image_settings", []))
 
     except Exception as e:
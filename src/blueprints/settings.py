@@ -1,10 +1,16 @@
-from flask import Blueprint, request, jsonify, current_app, render_template, Response
+from flask import Blueprint, request, jsonify, current_app, render_template, Response, url_for
 from utils.time_utils import calculate_seconds
+from utils.metrics import REGISTRY
+from utils.tracing import TRACER, to_chrome_trace
+from utils.profiler import SamplingProfiler, get_profile_job, start_profile
+from utils.dithering import DITHER_ENGINES, DEFAULT_DITHER_ENGINE
+from utils.log_stream import LogFilter, iter_journal_entries, iter_log_lines, gzip_stream, parse_limit
 from datetime import datetime, timedelta
 import os
+import json
+import hmac
 import pytz
 import logging
-import io
 
 # Try to import cysystemd for journal reading (Linux only)
 try:
@@ -25,11 +31,17 @@ except ImportError:
 logger = logging.getLogger(__name__)
 settings_bp = Blueprint("settings", __name__)
 
+# Longest profile, and the default and longest wait for the next refresh to profile, in seconds
+MAX_PROFILE_SECONDS = 300
+DEFAULT_PROFILE_WAIT_SECONDS = 120
+MAX_PROFILE_WAIT_SECONDS = 3600
+
 @settings_bp.route('/settings')
 def settings_page():
     device_config = current_app.config['DEVICE_CONFIG']
     timezones = sorted(pytz.all_timezones_set)
-    return render_template('settings.html', device_settings=device_config.get_config(), timezones = timezones)
+    return render_template('settings.html', device_settings=device_config.get_config(), timezones = timezones, metrics=REGISTRY.snapshot(),
+                           dither_engines=list(DITHER_ENGINES), default_dither_engine=DEFAULT_DITHER_ENGINE)
 
 @settings_bp.route('/save_settings', methods=['POST'])
 def save_settings():
@@ -47,6 +59,9 @@ def save_settings():
             return jsonify({"error": "Time Zone is required"}), 400
         if not time_format or time_format not in ["12h", "24h"]:
             return jsonify({"error": "Time format is required"}), 400
+        dither_engine = form_data.get("ditherEngine", DEFAULT_DITHER_ENGINE)
+        if dither_engine not in DITHER_ENGINES:
+            return jsonify({"error": f"Unknown dithering engine: {dither_engine}"}), 400
         previous_interval_seconds = device_config.get_config("plugin_cycle_interval_seconds")
         plugin_cycle_interval_seconds = calculate_seconds(int(interval), unit)
         if plugin_cycle_interval_seconds > 86400 or plugin_cycle_interval_seconds <= 0:
@@ -60,6 +75,7 @@ def save_settings():
             "timezone": form_data.get("timezoneName"),
             "time_format": form_data.get("timeFormat"),
             "plugin_cycle_interval_seconds": plugin_cycle_interval_seconds,
+            "dither_engine": dither_engine,
             "image_settings": {
                 "saturation": float(form_data.get("saturation", "1.0")),
                 "brightness": float(form_data.get("brightness", "1.0")),
@@ -90,11 +106,121 @@ def shutdown():
         os.system("sudo shutdown -h now")
     return jsonify({"success": True})
 
+@settings_bp.route('/metrics')
+def refresh_metrics():
+    """Expose refresh pipeline timings and counters in the Prometheus text format."""
+    return Response(REGISTRY.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@settings_bp.route('/api/traces')
+def refresh_traces():
+    """List the kept refresh traces, oldest first."""
+    return jsonify([trace.to_dict() for trace in TRACER.get_traces()])
+
+@settings_bp.route('/download-traces')
+def download_traces():
+    """Download the kept refresh traces, or the `last` few, in the Chrome trace event format."""
+    last = request.args.get('last', type=int)
+    traces = TRACER.get_traces(last if last and last > 0 else None)
+    now_str = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return Response(json.dumps(to_chrome_trace(traces), default=str), mimetype="application/json",
+                    headers={"Content-Disposition": f"attachment; filename=inkypi_traces_{now_str}.json"})
+
+def _check_profiler_token(device_config):
+    """Returns an error response unless the request carries the PROFILER_TOKEN, as a bearer token or the `token` argument."""
+    expected_token = device_config.load_env_key("PROFILER_TOKEN")
+    if not expected_token:
+        return jsonify({"error": "Profiling is disabled, set PROFILER_TOKEN in the .env file to enable it"}), 403
+    auth_header = request.headers.get("Authorization", "")
+    token = auth_header[len("Bearer "):] if auth_header.startswith("Bearer ") else request.args.get("token", "")
+    if not hmac.compare_digest(token.encode(), expected_token.encode()):
+        return jsonify({"error": "Invalid profiler token"}), 401
+    return None
+
+@settings_bp.route('/profile')
+def profile():
+    """Start profiling all threads with the sampling profiler.
+
+    The profile runs on its own thread; the response (202) holds its `id`, and the result is
+    downloaded from /profile/<id> once finished. Requires the PROFILER_TOKEN set in the .env file.
+    Optional arguments: `seconds` to sample (default 10), `interval` between samples in
+    milliseconds (default 10), `idle=1` to keep waiting threads, and `refresh=1` to profile
+    the next refresh instead, waiting up to `timeout` seconds (default 120) for it to start.
+    """
+    error = _check_profiler_token(current_app.config['DEVICE_CONFIG'])
+    if error:
+        return error
+
+    profile_refresh = request.args.get('refresh') in ('1', 'true')
+    # a refresh is profiled until it finishes, `seconds` caps it
+    seconds = request.args.get('seconds', default=MAX_PROFILE_SECONDS if profile_refresh else 10, type=float)
+    interval_ms = request.args.get('interval', default=10, type=float)
+    timeout = request.args.get('timeout', default=DEFAULT_PROFILE_WAIT_SECONDS, type=float)
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        return jsonify({"error": f"seconds must be between 0 and {MAX_PROFILE_SECONDS}"}), 400
+    if not 1 <= interval_ms <= 1000:
+        return jsonify({"error": "interval must be between 1 and 1000 milliseconds"}), 400
+    if not 0 < timeout <= MAX_PROFILE_WAIT_SECONDS:
+        return jsonify({"error": f"timeout must be between 0 and {MAX_PROFILE_WAIT_SECONDS}"}), 400
+
+    profiler = SamplingProfiler(interval_ms / 1000, include_idle=request.args.get('idle') in ('1', 'true'))
+    if profile_refresh:
+        job = start_profile(profiler, seconds, TRACER, timeout)
+    else:
+        job = start_profile(profiler, seconds)
+    if job is None:
+        return jsonify({"error": "A profile is already running"}), 409
+    logger.info(f"Started profile {job.id} | refresh: {profile_refresh} | seconds: {seconds:g}")
+    return jsonify(dict(job.to_dict(), result=url_for('settings.profile_result', job_id=job.id))), 202
+
+@settings_bp.route('/profile/<string:job_id>')
+def profile_result(job_id):
+    """Download the result of a profile started with /profile, or its status (202) while it runs.
+
+    Optional arguments: `format` (`collapsed`, the default, or `speedscope`).
+    """
+    error = _check_profiler_token(current_app.config['DEVICE_CONFIG'])
+    if error:
+        return error
+    output_format = request.args.get('format', 'collapsed')
+    if output_format not in ("collapsed", "speedscope"):
+        return jsonify({"error": f"Unknown profile format: {output_format}"}), 400
+
+    job = get_profile_job(job_id)
+    if job is None:
+        return jsonify({"error": "Profile not found"}), 404
+    if job.status == "running":
+        return jsonify(job.to_dict()), 202
+    if job.status == "timeout":
+        return jsonify(dict(job.to_dict(), error=f"No refresh started within {job.timeout:g} seconds")), 408
+    if job.status == "failed":
+        return jsonify(job.to_dict()), 500
+
+    profiler = job.profiler
+    started_str = datetime.fromtimestamp(job.started).strftime("%Y%m%d-%H%M%S")
+    if output_format == "speedscope":
+        body, mimetype = json.dumps(profiler.to_speedscope(f"InkyPi {started_str}")), "application/json"
+        filename = f"inkypi_profile_{started_str}.speedscope.json"
+    else:
+        body, mimetype, filename = profiler.to_collapsed(), "text/plain", f"inkypi_profile_{started_str}.txt"
+    return Response(body, mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={filename}",
+                             "X-Profile-Samples": str(profiler.samples)})
+
+@settings_bp.route('/api/system_stats')
+def system_stats():
+    """Return buffered system stats samples, optionally only those newer than `since`."""
+    sampler = current_app.config['SYSTEM_STATS']
+    since = request.args.get('since', type=float)
+    return jsonify({"interval": sampler.interval, "samples": sampler.get_samples(since)})
+
 @settings_bp.route('/download-logs')
 def download_logs():
+    """Stream the InkyPi service logs of the last `hours`.
+
+    Optional arguments: `level` (minimum level, e.g. WARNING), `plugin` (plugin id), `q`
+    (substring), `limit` (maximum number of lines) and `gzip=1` for a compressed download.
+    """
     try:
-        buffer = io.StringIO()
-        
         # Get 'hours' from query parameters, default to 2 if not provided or invalid
         hours_str = request.args.get('hours', '2')
         try:
@@ -103,41 +229,38 @@ def download_logs():
             hours = 2
         since = datetime.now() - timedelta(hours=hours)
 
+        try:
+            log_filter = LogFilter.from_args(request.args.get('level'), request.args.get('plugin'), request.args.get('q'))
+            limit = parse_limit(request.args.get('limit'))
+        except ValueError as e:
+            return Response(str(e), status=400, mimetype="text/plain")
+
         if not JOURNAL_AVAILABLE:
             # Return a message when running in development mode without systemd
-            buffer.write(f"Log download not available in development mode (cysystemd not installed).\n")
-            buffer.write(f"Logs would normally show InkyPi service logs from the last {hours} hours.\n")
-            buffer.write(f"\nTo see Flask development logs, check your terminal output.\n")
+            lines = iter([
+                f"Log download not available in development mode (cysystemd not installed).\n",
+                f"Logs would normally show InkyPi service logs from the last {hours} hours.\n",
+                f"\nTo see Flask development logs, check your terminal output.\n",
+            ])
         else:
             reader = JournalReader()
             reader.open(JournalOpenMode.SYSTEM)
             reader.add_filter(Rule("_SYSTEMD_UNIT", "inkypi.service"))
             reader.seek_realtime_usec(int(since.timestamp() * 1_000_000))
+            # records are read, filtered and sent one at a time, the reader is closed at the end
+            lines = iter_log_lines(iter_journal_entries(reader), log_filter if log_filter.active else None, limit)
 
-            for record in reader:
-                try:
-                    ts = datetime.fromtimestamp(record.get_realtime_usec() / 1_000_000)
-                    formatted_ts = ts.strftime("%b %d %H:%M:%S")
-                except Exception:
-                    formatted_ts = "??? ?? ??:??:??"
-
-                data = record.data
-                hostname = data.get("_HOSTNAME", "unknown-host")
-                identifier = data.get("SYSLOG_IDENTIFIER") or data.get("_COMM", "?")
-                pid = data.get("_PID", "?")
-                msg = data.get("MESSAGE", "").rstrip()
-
-                # Format the log entry similar to the journalctl default output
-                buffer.write(f"{formatted_ts} {hostname} {identifier}[{pid}]: {msg}\n")
-
-        buffer.seek(0)
         # Add date and time to the filename
         now_str = datetime.now().strftime("%Y%m%d-%H%M%S")
         filename = f"inkypi_{now_str}.log"
+        if request.args.get('gzip') in ('1', 'true'):
+            body, mimetype, filename = gzip_stream(lines), "application/gzip", f"{filename}.gz"
+        else:
+            body, mimetype = (line.encode("utf-8") for line in lines), "text/plain"
         return Response(
-            buffer.read(),
-            mimetype="text/plain",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+            body,
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename={filename}", "X-Accel-Buffering": "no"}
         )
 
     except Exception as e:
@@ -1,8 +1,19 @@
 import os
 import json
 import logging
+import threading
+from collections import ChainMap
 from dotenv import load_dotenv
 from model import PlaylistManager, RefreshInfo
+from utils.frame_store import FrameStore, FrameCache, DEFAULT_FRAME_FORMAT, DEFAULT_PNG_COMPRESS_LEVEL, DEFAULT_FRAME_CACHE_MB
+from utils.dithering import DEFAULT_DITHER_ENGINE
+from utils.panel_profiles import get_panel_profile, DEFAULT_REMOTE_PANEL_PROFILE
+from utils.frame_notifier import FrameNotifier
+from utils.frame_delta import FrameHistory
+from utils import tracing
+
+# Remote displays of a target that may wait for frame changes at the same time
+DEFAULT_TARGET_LISTENERS = 1
 
 logger = logging.getLogger(__name__)
 
@@ -19,11 +30,30 @@ class Config:
     # Directory path for storing plugin instance images
     plugin_image_dir = os.path.join(BASE_DIR, "static", "images", "plugins")
 
+    # Directory path for persistent plugin caches (API responses, downloaded media)
+    cache_dir = os.path.join(BASE_DIR, "cache")
+
+    # Directory path for encoded frames shared by plugin instance images and the current image
+    frame_store_dir = os.path.join(cache_dir, "frames")
+
+    # Directory path for the UI thumbnails of stored frames, named by frame hash
+    thumbnail_dir = os.path.join(cache_dir, "thumbnails")
+
+    # Directory path for the current and plugin instance images of display targets, by target name
+    target_image_dir = os.path.join(BASE_DIR, "static", "images", "targets")
+
+    # Held while the config is updated and written, the device and its targets are refreshed concurrently
+    write_lock = threading.RLock()
+
     def __init__(self):
         self.config = self.read_config()
         self.plugins_list = self.read_plugins_list()
+        # indexed by id, the first plugin wins on duplicate ids
+        self.plugins_by_id = {plugin['id']: plugin for plugin in reversed(self.plugins_list)}
         self.playlist_manager = self.load_playlist_manager()
         self.refresh_info = self.load_refresh_info()
+        self.frame_store = None
+        self.targets = None
 
     def read_config(self):
         """Reads the device config JSON file and returns it as a dictionary."""
@@ -55,10 +85,11 @@ class Config:
     def write_config(self):
         """Updates the cached config from the model objects and writes to the config file."""
         logger.debug(f"Writing device config to {self.config_file}")
-        self.update_value("playlist_config", self.playlist_manager.to_dict())
-        self.update_value("refresh_info", self.refresh_info.to_dict())
-        with open(self.config_file, 'w') as outfile:
-            json.dump(self.config, outfile, indent=4)
+        with tracing.span("write_config"), self.write_lock:
+            self.update_value("playlist_config", self.playlist_manager.to_dict())
+            self.update_value("refresh_info", self.refresh_info.to_dict())
+            with open(self.config_file, 'w') as outfile:
+                json.dump(self.config, outfile, indent=4)
 
     def get_config(self, key=None, default={}):
         """Gets the value of a specific configuration key or returns the entire config if none provided."""
@@ -72,7 +103,7 @@ class Config:
 
     def get_plugin(self, plugin_id):
         """Finds and returns a plugin config by its ID."""
-        return next((plugin for plugin in self.plugins_list if plugin['id'] == plugin_id), None)
+        return self.plugins_by_id.get(plugin_id)
 
     def get_resolution(self):
         """Returns the display resolution as a tuple (width, height) from the configuration."""
@@ -111,6 +142,117 @@ class Config:
         """Returns the playlist manager."""
         return self.playlist_manager
 
+    def get_frame_store(self):
+        """Returns the frame store used to save plugin instance and current images.
+
+        Decoded frames are kept in a memory-budgeted cache shared by the refresh task and web handlers.
+        """
+        if self.frame_store is None:
+            frame_cache_mb = self.get_config("frame_cache_mb", default=DEFAULT_FRAME_CACHE_MB)
+            self.frame_store = FrameStore(
+                self.frame_store_dir,
+                self.get_config("frame_format", default=DEFAULT_FRAME_FORMAT),
+                self.get_config("png_compress_level", default=DEFAULT_PNG_COMPRESS_LEVEL),
+                cache=FrameCache(int(frame_cache_mb * 1024 * 1024)),
+                thumbnail_dir=self.thumbnail_dir,
+            )
+        return self.frame_store
+
     def get_refresh_info(self):
         """Returns the refresh information."""
         return self.refresh_info
+
+    def get_dither_engine(self):
+        """Returns the dither engine for the current image, the displayed instance's choice or the device's."""
+        plugin_instance = None
+        if self.refresh_info.plugin_instance:
+            plugin_instance = self.playlist_manager.find_plugin(self.refresh_info.plugin_id, self.refresh_info.plugin_instance)
+        engine = plugin_instance.settings.get("ditherEngine") if plugin_instance else None
+        return engine or self.get_config("dither_engine", default=DEFAULT_DITHER_ENGINE)
+
+    def get_panel_profile(self):
+        """Returns the panel profile of the local display set by `panel_profile`, or None to use the driver's conversion."""
+        name = self.get_config("panel_profile", default=None)
+        if not name:
+            return None
+        profile = get_panel_profile(name)
+        if profile is None:
+            logger.warning(f"Unknown panel profile '{name}', using the display driver's conversion")
+        return profile
+
+    def get_remote_panel_profile(self):
+        """Returns the panel profile of the frames served to remote displays."""
+        name = self.get_config("remote_panel_profile", default=DEFAULT_REMOTE_PANEL_PROFILE)
+        profile = get_panel_profile(name)
+        if profile is None:
+            logger.warning(f"Unknown remote panel profile '{name}', using {DEFAULT_REMOTE_PANEL_PROFILE}")
+            profile = get_panel_profile(DEFAULT_REMOTE_PANEL_PROFILE)
+        return profile
+
+    def get_targets(self):
+        """Returns the display targets configured under `targets`, by name."""
+        if self.targets is None:
+            self.targets = {name: TargetConfig(self, name) for name in self.get_config("targets", default={})}
+        return self.targets
+
+    def get_target(self, name):
+        """Returns the named display target, or None."""
+        return self.get_targets().get(name)
+
+class TargetConfig(Config):
+    """A named display target, a remote display with its own panel profile, orientation and playlists.
+
+    Targets are configured under `targets` in the device config, e.g.
+
+        "targets": {"kitchen": {"panel_profile": "spectra6", "orientation": "vertical"}}
+
+    The resolution defaults to the panel profile's. Settings a target doesn't set, like the
+    timezone or the plugin cycle interval, come from the device config. Its playlists and
+    refresh info are stored with the target and written with the device config.
+
+    Attributes:
+        name (str): Target name, used in its endpoints and image paths.
+        panel_profile (PanelProfile): Profile of the frames served to the target.
+        frame_notifier (FrameNotifier): Told about every new current image of the target.
+        packed_frames (FrameHistory): Frames recently packed for the target, the bases for delta transfers.
+    """
+
+    def __init__(self, device_config, name):
+        self.device_config = device_config
+        self.name = name
+        target_config = device_config.get_config("targets")[name]
+        profile_name = target_config.get("panel_profile", DEFAULT_REMOTE_PANEL_PROFILE)
+        self.panel_profile = get_panel_profile(profile_name)
+        if self.panel_profile is None:
+            raise ValueError(f"Unknown panel profile '{profile_name}' for target {name}")
+        target_config.setdefault("resolution", list(self.panel_profile.frame_size))
+        # a target without playlists starts with its own default playlist, not the device's
+        target_config.setdefault("playlist_config", {})
+        target_config.setdefault("refresh_info", {})
+        self.config = ChainMap(target_config, device_config.config)
+
+        self.current_image_file = os.path.join(self.target_image_dir, name, "current_image.png")
+        self.plugin_image_dir = os.path.join(self.target_image_dir, name, "plugins")
+        self.plugins_list = device_config.plugins_list
+        self.plugins_by_id = device_config.plugins_by_id
+        self.playlist_manager = self.load_playlist_manager()
+        self.refresh_info = self.load_refresh_info()
+        self.frame_store = device_config.get_frame_store()
+        self.targets = {}
+
+        frame_key = self.frame_store.frame_keys([self.current_image_file]).get(self.current_image_file)
+        self.frame_notifier = FrameNotifier(frame_key, target_config.get("max_listeners", DEFAULT_TARGET_LISTENERS))
+        self.packed_frames = FrameHistory()
+
+    def write_config(self):
+        """Stores the target's playlists and refresh info in the device config and writes it."""
+        with self.write_lock:
+            self.update_value("playlist_config", self.playlist_manager.to_dict())
+            self.update_value("refresh_info", self.refresh_info.to_dict())
+            self.device_config.write_config()
+
+    def get_panel_profile(self):
+        return self.panel_profile
+
+    def get_remote_panel_profile(self):
+        return self.panel_profile
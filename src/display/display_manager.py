@@ -1,9 +1,12 @@
+import os
 import fnmatch
 import json
 import logging
 
 from utils.image_utils import resize_image, change_orientation, apply_image_enhancement
 from display.mock_display import MockDisplay
+from utils.metrics import REGISTRY
+from utils.frame_notifier import FrameNotifier
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +25,7 @@ class DisplayManager:
 
     """Manages the display and rendering of images."""
 
-    def __init__(self, device_config):
+    def __init__(self, device_config, frame_notifier=None):
 
         """
         Initializes the display manager and selects the correct display type 
@@ -30,12 +33,14 @@ class DisplayManager:
 
         Args:
             device_config (object): Configuration object containing display settings.
+            frame_notifier (FrameNotifier, optional): Told about every new current image.
 
         Raises:
             ValueError: If an unsupported display type is specified.
         """
         
         self.device_config = device_config
+        self.frame_notifier = frame_notifier or FrameNotifier(self.current_frame_key())
      
         display_type = device_config.get_config("display_type", default="inky")
 
@@ -54,6 +59,16 @@ class DisplayManager:
         else:
             raise ValueError(f"Unsupported display type: {display_type}")
 
+    def current_frame_key(self):
+        """Returns the content hash of the current image, or None if there is none yet."""
+        frame_store = self.device_config.get_frame_store()
+        current_image_path = self.device_config.current_image_file
+        frame_key = frame_store.frame_keys([current_image_path]).get(current_image_path)
+        if frame_key is None and os.path.exists(current_image_path):
+            # written before the frame store existed, hash its pixels instead
+            frame_key = frame_store.frame_key(frame_store.load(current_image_path), "png")
+        return frame_key
+
     def display_image(self, image, image_settings=[]):
         
         """
@@ -70,15 +85,22 @@ class DisplayManager:
         if not hasattr(self, "display"):
             raise ValueError("No valid display instance initialized.")
         
-        # Save the image
+        # Save the image, as PNG since the web UI serves it directly. A frame that was just
+        # saved as a PNG plugin image is linked rather than encoded again.
         logger.info(f"Saving image to {self.device_config.current_image_file}")
-        image.save(self.device_config.current_image_file)
+        with REGISTRY.timer("current_image_save"):
+            frame_store = self.device_config.get_frame_store()
+            with self.frame_notifier.commit_lock:
+                current_image_path = frame_store.save(image, self.device_config.current_image_file, frame_format="png")
+                self.frame_notifier.publish(frame_store.frame_keys([current_image_path]).get(current_image_path))
 
         # Resize and adjust orientation
-        image = change_orientation(image, self.device_config.get_config("orientation"))
-        image = resize_image(image, self.device_config.get_resolution(), image_settings)
-        if self.device_config.get_config("inverted_image"): image = image.rotate(180)
-        image = apply_image_enhancement(image, self.device_config.get_config("image_settings"))
+        with REGISTRY.timer("post_process"):
+            image = change_orientation(image, self.device_config.get_config("orientation"))
+            image = resize_image(image, self.device_config.get_resolution(), image_settings)
+            if self.device_config.get_config("inverted_image"): image = image.rotate(180)
+            image = apply_image_enhancement(image, self.device_config.get_config("image_settings"))
 
         # Pass to the concrete instance to render to the device.
-        self.display.display_image(image, image_settings)
\ No newline at end of file
+        with REGISTRY.timer("display_write"):
+            self.display.display_image(image, image_settings)
\ No newline at end of file
@@ -1,6 +1,7 @@
 import logging
 from inky.auto import auto
 from display.abstract_display import AbstractDisplay
+from utils import tracing
 
 class MockDisplay:
     # --- Color Constants (required to fix AttributeError) ---
@@ -54,6 +55,9 @@ class InkyDisplay(AbstractDisplay):
         self.inky_display = MockDisplay()
         self.inky_display.set_border(self.inky_display.BLACK)
 
+        # panels with a profile get frames already dithered to the controller's color codes
+        self.panel_profile = self.device_config.get_panel_profile()
+
         # store display resolution in device config
         if not self.device_config.get_config("resolution"):
             self.device_config.update_value(
@@ -81,6 +85,14 @@ class InkyDisplay(AbstractDisplay):
         if not image:
             raise ValueError(f"No image provided.")
 
+        if self.panel_profile:
+            with tracing.span("encode", profile=self.panel_profile.name):
+                dithered = self.panel_profile.dither(image, self.device_config.get_dither_engine(), self.device_config.cache_dir)
+                # "P" images are taken as color codes as they are
+                image = self.panel_profile.code_image(dithered)
+
         # Display the image on the Inky display
-        self.inky_display.set_image(image)
-        self.inky_display.show()
\ No newline at end of file
+        with tracing.span("set_image"):
+            self.inky_display.set_image(image)
+        with tracing.span("spi_transfer"):
+            self.inky_display.show()
\ No newline at end of file
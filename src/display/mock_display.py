@@ -1,7 +1,9 @@
 import os
+import shutil
 import logging
 from datetime import datetime
 from .abstract_display import AbstractDisplay
+from utils.frame_store import FrameStore
 
 logger = logging.getLogger(__name__)
 
@@ -15,15 +17,20 @@ class MockDisplay(AbstractDisplay):
         self.height = resolution[1]
         self.output_dir = device_config.get_config('output_dir', 'mock_display_output')
         os.makedirs(self.output_dir, exist_ok=True)
+        self.frame_store = FrameStore(os.path.join(self.output_dir, ".frames"), "png")
         
     def initialize_display(self):
         """Initialize mock display (no-op for development)."""
         logger.info(f"Mock display initialized: {self.width}x{self.height}")
         
     def display_image(self, image, image_settings=[]):
+        latest = self.frame_store.save(image, os.path.join(self.output_dir, 'latest.png'))
+
+        # Also keep a timestamped copy of every frame. It shares the encoded file but isn't
+        # tracked by the frame store, which only records the destinations it keeps up to date.
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filepath = os.path.join(self.output_dir, f"display_{timestamp}.png")
-        image.save(filepath, "PNG")
-        
-        # Also save as latest.png for convenience
-        image.save(os.path.join(self.output_dir, 'latest.png'), "PNG")
\ No newline at end of file
+        try:
+            os.link(latest, filepath)
+        except OSError:
+            shutil.copyfile(latest, filepath)
\ No newline at end of file
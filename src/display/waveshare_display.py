@@ -7,6 +7,7 @@ from display.abstract_display import AbstractDisplay
 from PIL import Image
 from pathlib import Path
 from plugins.plugin_registry import get_plugin_instance
+from utils import tracing
 
 logger = logging.getLogger(__name__)
 
@@ -72,6 +73,11 @@ class WaveshareDisplay(AbstractDisplay):
 
         self.bi_color_display = len(display_args_spec.args) > 2
 
+        # panels with a profile are encoded by the shared encoder, others by the driver's getbuffer
+        self.panel_profile = self.device_config.get_panel_profile()
+        if self.panel_profile:
+            logger.info(f"Encoding frames with panel profile {self.panel_profile.name}")
+
         # update the resolution directly from the loaded device context
         if not self.device_config.get_config("resolution"):
             w, h = int(self.epd_display.width), int(self.epd_display.height)
@@ -103,20 +109,31 @@ class WaveshareDisplay(AbstractDisplay):
             raise ValueError(f"No image provided.")
 
         # Assume device was in sleep mode.
-        self.epd_display_init()
+        with tracing.span("epd_init"):
+            self.epd_display_init()
 
         # Clear residual pixels before updating the image.
-        self.epd_display.Clear()
+        with tracing.span("epd_clear"):
+            self.epd_display.Clear()
 
         # Display the image on the WS display.
-        if not self.bi_color_display:
-            self.epd_display.display(self.epd_display.getbuffer(image))
+        if self.panel_profile:
+            with tracing.span("encode", profile=self.panel_profile.name):
+                buffer = self.panel_profile.encode_image(image, self.device_config.get_dither_engine(),
+                                                         self.device_config.cache_dir)
+            with tracing.span("spi_transfer", bytes=len(buffer)):
+                self.epd_display.display(*self.panel_profile.split_planes(buffer))
+        elif not self.bi_color_display:
+            with tracing.span("encode"):
+                buffer = self.epd_display.getbuffer(image)
+            with tracing.span("spi_transfer"):
+                self.epd_display.display(buffer)
         else:
             color_image = Image.new('1', image.size, 255)
-            self.epd_display.display(
-                self.epd_display.getbuffer(image),
-                self.epd_display.getbuffer(color_image)
-            )
+            with tracing.span("encode"):
+                buffers = (self.epd_display.getbuffer(image), self.epd_display.getbuffer(color_image))
+            with tracing.span("spi_transfer"):
+                self.epd_display.display(*buffers)
 
         # Put device into low power mode (EPD displays maintain image when powered off)
         logger.info("Putting Waveshare display into sleep mode for power saving.")
@@ -24,7 +24,12 @@ from flask import Flask, request
 from werkzeug.serving import is_running_from_reloader
 from config import Config
 from display.display_manager import DisplayManager
-from refresh_task import RefreshTask
+from refresh_task import RefreshTask, TargetRefreshTask
+from utils.system_stats import SystemStatsSampler
+from utils.upload_processor import UploadProcessor
+from utils.image_store import ImageStoreCollector
+from utils.app_utils import get_image_store
+from utils import tracing
 from blueprints.main import main_bp
 from blueprints.settings import settings_bp
 from blueprints.plugin import plugin_bp
@@ -61,14 +66,27 @@ app.jinja_loader = ChoiceLoader([FileSystemLoader(directory) for directory in te
 
 device_config = Config()
 display_manager = DisplayManager(device_config)
-refresh_task = RefreshTask(device_config, display_manager)
+system_stats = SystemStatsSampler()
+refresh_task = RefreshTask(device_config, display_manager, system_stats)
+target_refresh_task = TargetRefreshTask(device_config)
+upload_processor = UploadProcessor()
+image_store_collector = ImageStoreCollector(get_image_store(), device_config)
 
 load_plugins(device_config.get_plugins())
 
+# keep traces of the last refreshes, including the HTTP requests plugins make
+tracing.TRACER.resize(device_config.get_config("trace_capacity", default=tracing.DEFAULT_TRACE_CAPACITY))
+tracing.instrument_requests()
+
 # Store dependencies
 app.config['DEVICE_CONFIG'] = device_config
 app.config['DISPLAY_MANAGER'] = display_manager
 app.config['REFRESH_TASK'] = refresh_task
+app.config['TARGET_REFRESH_TASK'] = target_refresh_task
+app.config['SYSTEM_STATS'] = system_stats
+app.config['UPLOAD_PROCESSOR'] = upload_processor
+app.config['IMAGE_STORE_COLLECTOR'] = image_store_collector
+app.config['FRAME_NOTIFIER'] = display_manager.frame_notifier
 
 # Set additional parameters
 app.config['MAX_FORM_PARTS'] = 10_000
@@ -84,8 +102,11 @@ register_heif_opener()
 
 if __name__ == '__main__':
 
-    # start the background refresh task
+    # start the background refresh task, system stats sampler and upload collector
     refresh_task.start()
+    target_refresh_task.start()
+    system_stats.start()
+    image_store_collector.start()
 
     # display default inkypi image on startup
     if device_config.get_config("startup") is True:
@@ -110,6 +131,15 @@ if __name__ == '__main__':
             except:
                 pass  # Ignore if we can't get the IP
             
-        serve(app, host="0.0.0.0", port=PORT, threads=1)
+        # one thread for the web UI plus one per remote display waiting for frame changes
+        notifiers = [display_manager.frame_notifier] + [target.frame_notifier for target in device_config.get_targets().values()]
+        serve(app, host="0.0.0.0", port=PORT, threads=1 + sum(notifier.max_listeners for notifier in notifiers))
     finally:
-        refresh_task.stop()
\ No newline at end of file
+        display_manager.frame_notifier.close()
+        for target in device_config.get_targets().values():
+            target.frame_notifier.close()
+        refresh_task.stop()
+        target_refresh_task.stop()
+        system_stats.stop()
+        upload_processor.shutdown()
+        image_store_collector.stop()
\ No newline at end of file
@@ -1,10 +1,21 @@
 import os
 import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 
 logger = logging.getLogger(__name__)
 
+MINUTES_PER_DAY = 24 * 60
+
+def minutes_of_day(time_str):
+    """Returns the minute of the day of an 'HH:MM' time, '24:00' being 1440."""
+    hours, minutes = time_str.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def parse_datetime(value):
+    """Returns the datetime of an ISO-formatted string, or None if not set."""
+    return datetime.fromisoformat(value) if value else None
+
 class RefreshInfo:
     """Keeps track of refresh metadata.
 
@@ -17,6 +28,9 @@ class RefreshInfo:
         plugin_instance (str): Plugin instance name if refresh_type is 'Playlist'.
     """
 
+    __slots__ = ("_refresh_time", "_refresh_dt", "image_hash", "refresh_type", "plugin_id", "playlist",
+                 "plugin_instance")
+
     def __init__(self, refresh_type, plugin_id, refresh_time, image_hash, playlist=None, plugin_instance=None):
         """Initialize RefreshInfo instance."""
         self.refresh_time = refresh_time
@@ -26,12 +40,18 @@ class RefreshInfo:
         self.playlist = playlist
         self.plugin_instance = plugin_instance
 
+    @property
+    def refresh_time(self):
+        return self._refresh_time
+
+    @refresh_time.setter
+    def refresh_time(self, value):
+        self._refresh_time = value
+        self._refresh_dt = parse_datetime(value)
+
     def get_refresh_datetime(self):
         """Returns the refresh time as a datetime object or None if not set."""
-        latest_refresh = None
-        if self.refresh_time:
-            latest_refresh = datetime.fromisoformat(self.refresh_time)
-        return latest_refresh
+        return self._refresh_dt
 
     def to_dict(self):
         refresh_dict = {
@@ -67,6 +87,8 @@ class PlaylistManager:
     DEFAULT_PLAYLIST_START = "00:00"
     DEFAULT_PLAYLIST_END = "24:00"
 
+    __slots__ = ("playlists", "active_playlist")
+
     def __init__(self, playlists=[], active_playlist=None):
         """Initialize PlaylistManager with a list of playlists."""
         self.playlists = playlists
@@ -91,18 +113,15 @@ class PlaylistManager:
 
     def determine_active_playlist(self, current_datetime):
         """Determine the active playlist based on the current time."""
-        current_time = current_datetime.strftime("%H:%M")  # Get current time in "HH:MM" format
+        current_minute = current_datetime.hour * 60 + current_datetime.minute
 
         # get active playlists that have plugins
-        active_playlists = [p for p in self.playlists if p.is_active(current_time)]
+        active_playlists = [p for p in self.playlists if p.is_active_at(current_minute)]
         if not active_playlists:
             return None
 
-        # Sort playlists by priority
-        active_playlists.sort(key=lambda p: p.get_priority())
-        playlist = active_playlists[0]
-
-        return playlist
+        # the playlist with the shortest time range has priority, the first one on ties
+        return min(active_playlists, key=lambda p: p.get_priority())
 
     def get_playlist(self, playlist_name):
         """Returns the playlist with the specified name."""
@@ -167,36 +186,75 @@ class PlaylistManager:
 class Playlist:
     """Represents a playlist with a time interval.
 
+    Start and end times are kept as minutes of the day as well, and plugin instances are
+    indexed by (plugin_id, name), so checks on every refresh don't parse or scan.
+
     Attributes:
         name (str): Name of the playlist.
         start_time (str): Playlist start time in 'HH:MM'.
         end_time (str): Playlist end time in 'HH:MM'.
-        plugins (list): A list of PluginInstance objects within the playlist.
+        plugins (list): A list of PluginInstance objects within the playlist. Add and remove
+            instances through the playlist's methods, which keep the index.
         current_plugin_index (int): Index of the currently active plugin in the playlist.
     """
 
+    __slots__ = ("name", "_start_time", "_end_time", "start_minute", "end_minute", "plugins", "_plugin_index",
+                 "current_plugin_index")
+
     def __init__(self, name, start_time, end_time, plugins=None, current_plugin_index=None):
         self.name = name
         self.start_time = start_time
         self.end_time = end_time
         self.plugins = [PluginInstance.from_dict(p) for p in (plugins or [])]
+        self._plugin_index = {}
+        self._reindex()
         self.current_plugin_index = current_plugin_index
 
+    @property
+    def start_time(self):
+        return self._start_time
+
+    @start_time.setter
+    def start_time(self, value):
+        self._start_time = value
+        self.start_minute = minutes_of_day(value)
+
+    @property
+    def end_time(self):
+        return self._end_time
+
+    @end_time.setter
+    def end_time(self, value):
+        self._end_time = value
+        self.end_minute = minutes_of_day(value)
+
+    def _reindex(self):
+        # the first instance wins on duplicates, like a scan of the list would
+        self._plugin_index = {}
+        for plugin in self.plugins:
+            self._plugin_index.setdefault((plugin.plugin_id, plugin.name), plugin)
+
     def is_active(self, current_time):
-        """Check if the playlist is active at the given time."""
-        if self.start_time <= self.end_time:
+        """Check if the playlist is active at the given 'HH:MM' time."""
+        return self.is_active_at(minutes_of_day(current_time))
+
+    def is_active_at(self, current_minute):
+        """Check if the playlist is active at the given minute of the day."""
+        if self.start_minute <= self.end_minute:
             # Non-wrapping window (EG: 09:00-15:00)
-            return self.start_time <= current_time < self.end_time
+            return self.start_minute <= current_minute < self.end_minute
         else:
             # Wrapping window across midnight (EG: 21:00-03:00)
-            return current_time >= self.start_time or current_time < self.end_time
+            return current_minute >= self.start_minute or current_minute < self.end_minute
 
     def add_plugin(self, plugin_data):
         """Add a new plugin instance to the playlist."""
         if self.find_plugin(plugin_data["plugin_id"], plugin_data["name"]):
             logger.warning(f"Plugin '{plugin_data['plugin_id']}' with instance '{plugin_data['name']}' already exists.")
             return False
-        self.plugins.append(PluginInstance.from_dict(plugin_data))
+        plugin = PluginInstance.from_dict(plugin_data)
+        self.plugins.append(plugin)
+        self._plugin_index[(plugin.plugin_id, plugin.name)] = plugin
         return True
 
     def update_plugin(self, plugin_id, instance_name, updated_data):
@@ -204,6 +262,8 @@ class Playlist:
         plugin = self.find_plugin(plugin_id, instance_name)
         if plugin:
             plugin.update(updated_data)
+            if (plugin.plugin_id, plugin.name) != (plugin_id, instance_name):
+                self._reindex()
             return True
         logger.warning(f"Plugin '{plugin_id}' with name '{instance_name}' not found.")
         return False
@@ -212,15 +272,16 @@ class Playlist:
         """Remove a specific plugin instance from the playlist."""
         initial_count = len(self.plugins)
         self.plugins = [p for p in self.plugins if not (p.plugin_id == plugin_id and p.name == name)]
-        
+
         if len(self.plugins) == initial_count:
             logger.warning(f"Plugin '{plugin_id}' with instance '{name}' not found.")
             return False
+        self._plugin_index.pop((plugin_id, name), None)
         return True
 
     def find_plugin(self, plugin_id, name):
         """Find a plugin instance by its plugin_id and name."""
-        return next((p for p in self.plugins if p.plugin_id == plugin_id and p.name == name), None)
+        return self._plugin_index.get((plugin_id, name))
 
     def get_next_plugin(self):
         """Returns the next plugin instance in the playlist and update the current_plugin_index."""
@@ -228,7 +289,7 @@ class Playlist:
             self.current_plugin_index = 0
         else:
             self.current_plugin_index = (self.current_plugin_index + 1) % len(self.plugins)
-        
+
         return self.plugins[self.current_plugin_index]
 
     def get_priority(self):
@@ -237,19 +298,11 @@ class Playlist:
 
     def get_time_range_minutes(self):
         """Calculate the time difference in minutes between start_time and end_time."""
-        start = datetime.strptime(self.start_time, "%H:%M")
-        # Handle '24:00' by converting it to '00:00' of the next day
-        if self.end_time != "24:00":
-            end = datetime.strptime(self.end_time, "%H:%M")
-        else:
-            end = datetime.strptime("00:00", "%H:%M")
-            end += timedelta(days=1)
-
+        end_minute = self.end_minute
         # If the window wraps past midnight (EG: 21:00 -> 03:00), treat end as next day
-        if end < start:
-            end += timedelta(days=1)
-            
-        return int((end - start).total_seconds() // 60)
+        if end_minute < self.start_minute:
+            end_minute += MINUTES_PER_DAY
+        return end_minute - self.start_minute
 
     def to_dict(self):
         return {
@@ -273,6 +326,8 @@ class Playlist:
 class PluginInstance:
     """Represents an individual plugin instance within a playlist.
 
+    The latest refresh time and the refresh settings are kept parsed as well.
+
     Attributes:
         plugin_id (str): Plugin id for this instance.
         name (str): Name of the plugin instance.
@@ -281,6 +336,9 @@ class PluginInstance:
         latest_refresh (str): ISO-formatted string representing the last refresh time.
     """
 
+    __slots__ = ("plugin_id", "name", "settings", "_refresh", "_interval", "_scheduled_time", "_latest_refresh_time",
+                 "_latest_refresh_dt")
+
     def __init__(self, plugin_id, name, settings, refresh, latest_refresh_time=None):
         self.plugin_id = plugin_id
         self.name = name
@@ -288,6 +346,27 @@ class PluginInstance:
         self.refresh = refresh
         self.latest_refresh_time = latest_refresh_time
 
+    @property
+    def refresh(self):
+        return self._refresh
+
+    @refresh.setter
+    def refresh(self, value):
+        self._refresh = value
+        interval = value.get("interval")
+        self._interval = timedelta(seconds=interval) if interval else None
+        scheduled = value.get("scheduled")
+        self._scheduled_time = time(*divmod(minutes_of_day(scheduled), 60)) if "scheduled" in value else None
+
+    @property
+    def latest_refresh_time(self):
+        return self._latest_refresh_time
+
+    @latest_refresh_time.setter
+    def latest_refresh_time(self, value):
+        self._latest_refresh_time = value
+        self._latest_refresh_dt = parse_datetime(value)
+
     def update(self, updated_data):
         """Update attributes of the class with the dictionary values."""
         for key, value in updated_data.items():
@@ -295,29 +374,23 @@ class PluginInstance:
 
     def should_refresh(self, current_time):
         """Checks whether the plugin should be refreshed based on its refresh settings and the current time."""
-        latest_refresh_dt = self.get_latest_refresh_dt()
+        latest_refresh_dt = self._latest_refresh_dt
         if not latest_refresh_dt:
             return True
 
         # Check for interval-based refresh
-        if "interval" in self.refresh:
-            interval = self.refresh.get("interval")
-            if interval and (current_time - latest_refresh_dt) >= timedelta(seconds=interval):
-                return True
+        if self._interval and (current_time - latest_refresh_dt) >= self._interval:
+            return True
 
         # Check for scheduled refresh (HH:MM format)
-        if "scheduled" in self.refresh:
-            scheduled_time_str = self.refresh.get("scheduled")
-            latest_refresh_str = latest_refresh_dt.strftime("%H:%M")
+        scheduled_time = self._scheduled_time
+        if scheduled_time is not None:
+            latest_refresh_time = latest_refresh_dt.time().replace(second=0, microsecond=0)
 
             # If the latest refresh is before the scheduled time today
-            if latest_refresh_str < scheduled_time_str:
+            if latest_refresh_time < scheduled_time:
                 return True
-        
-        if "scheduled" in self.refresh:
-            scheduled_time_str = self.refresh.get("scheduled")
-            scheduled_time = datetime.strptime(scheduled_time_str, "%H:%M").time()
-            
+
             latest_refresh_date = latest_refresh_dt.date()
             current_date = current_time.date()
 
@@ -334,11 +407,8 @@ class PluginInstance:
 
     def get_latest_refresh_dt(self):
         """Returns the latest refresh time as a datetime object, or None if not set."""
-        latest_refresh = None
-        if self.latest_refresh_time:
-            latest_refresh = datetime.fromisoformat(self.latest_refresh_time)
-        return latest_refresh
-    
+        return self._latest_refresh_dt
+
     def to_dict(self):
         return {
             "plugin_id": self.plugin_id,
@@ -356,4 +426,4 @@ class PluginInstance:
             settings=data["plugin_settings"],
             refresh=data["refresh"],
             latest_refresh_time=data.get("latest_refresh_time"),
-        )
\ No newline at end of file
+        )
@@ -2,6 +2,8 @@
 APOD Plugin for InkyPi
 This plugin fetches the Astronomy Picture of the Day (APOD) from NASA's API
 and displays it on the InkyPi device. It supports optional manual date selection or random dates.
+Pictures are kept in the shared media cache: the next day's picture is fetched shortly after
+it is published, and a pool of random days is fetched ahead for the random mode.
 For the API key, set `NASA_SECRET={API_KEY}` in your .env file.
 """
 
@@ -11,10 +13,17 @@ from io import BytesIO
 import requests
 import logging
 from random import randint
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from utils.media_cache import get_media_cache, latest_published_day, published_at
 
 logger = logging.getLogger(__name__)
 
+MEDIA_SOURCE = "apod"
+# A new picture goes up at midnight US Eastern time
+PUBLISH_DELAY = timedelta(hours=5, minutes=15)
+RANDOM_POOL_SIZE = 5
+REQUEST_TIMEOUT = 30
+
 class Apod(BasePlugin):
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
@@ -33,18 +42,37 @@ class Apod(BasePlugin):
         if not api_key:
             raise RuntimeError("NASA API Key not configured.")
 
-        params = {"api_key": api_key}
+        cache = get_media_cache(device_config.cache_dir)
+        min_edge = max(device_config.get_resolution())
+        fetch = lambda day: self._fetch_apod(api_key, day)
 
         if settings.get("randomizeApod") == "true":
-            start = datetime(2015, 1, 1)
-            end = datetime.today()
-            delta_days = (end - start).days
-            random_date = start + timedelta(days=randint(0, delta_days))
-            params["date"] = random_date.strftime("%Y-%m-%d")
+            # random days are taken from a pool fetched in the background
+            item = cache.take_random(MEDIA_SOURCE, min_edge)
+            if item is None:
+                item = cache.get_or_fetch(MEDIA_SOURCE, self._random_date(), fetch, min_edge)
+            cache.fill_pool(MEDIA_SOURCE, RANDOM_POOL_SIZE, self._random_date, fetch, min_edge)
         elif settings.get("customDate"):
-            params["date"] = settings["customDate"]
+            day = datetime.strptime(settings["customDate"], "%Y-%m-%d").date()
+            item = cache.get_or_fetch(MEDIA_SOURCE, day, fetch, min_edge)
+        else:
+            day = latest_published_day(PUBLISH_DELAY)
+            item = cache.get_or_fetch(MEDIA_SOURCE, day, fetch, min_edge)
+            next_day = day + timedelta(days=1)
+            cache.prefetch(MEDIA_SOURCE, next_day, fetch, min_edge, at=published_at(next_day, PUBLISH_DELAY))
+
+        logger.info(f"APOD for {item.day.isoformat()}: {item.metadata.get('title')}")
+        return item.image
+
+    @staticmethod
+    def _random_date():
+        start = date(2015, 1, 1)
+        return start + timedelta(days=randint(0, (date.today() - start).days))
 
-        response = requests.get("https://api.nasa.gov/planetary/apod", params=params)
+    def _fetch_apod(self, api_key, day):
+        """Fetches the APOD of a day, returning its metadata and image."""
+        params = {"api_key": api_key, "date": day.isoformat()}
+        response = requests.get("https://api.nasa.gov/planetary/apod", params=params, timeout=REQUEST_TIMEOUT)
 
         if response.status_code != 200:
             logger.error(f"NASA API error: {response.text}")
@@ -58,10 +86,12 @@ class Apod(BasePlugin):
         image_url = data.get("hdurl") or data.get("url")
 
         try:
-            img_data = requests.get(image_url)
+            img_data = requests.get(image_url, timeout=REQUEST_TIMEOUT)
             image = Image.open(BytesIO(img_data.content))
+            image.load()
         except Exception as e:
             logger.error(f"Failed to load APOD image: {str(e)}")
             raise RuntimeError("Failed to load APOD image.")
 
-        return image
\ No newline at end of file
+        metadata = {key: data.get(key) for key in ("date", "title", "explanation", "copyright", "url", "hdurl")}
+        return metadata, image
@@ -2,6 +2,9 @@ import logging
 import os
 from utils.app_utils import resolve_path, get_fonts
 from utils.image_utils import take_screenshot_html
+from utils import metrics
+from utils.metrics import REGISTRY
+from utils import tracing
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pathlib import Path
 import asyncio
@@ -81,6 +84,8 @@ class BasePlugin:
         return template_params
 
     def render_image(self, dimensions, html_file, css_file=None, template_params={}):
+        metrics.mark_render_start()
+
         # load the base plugin and current plugin css files
         css_files = [os.path.join(BASE_PLUGIN_RENDER_DIR, "plugin.css")]
         if css_file:
@@ -94,7 +99,10 @@ class BasePlugin:
         template_params["static_dir"] = STATIC_DIR
 
         # load and render the given html template
-        template = self.env.get_template(html_file)
-        rendered_html = template.render(template_params)
+        with tracing.span("template_load", template=html_file):
+            template = self.env.get_template(html_file)
+        with REGISTRY.timer("html_render"):
+            rendered_html = template.render(template_params)
 
-        return take_screenshot_html(rendered_html, dimensions)
+        with REGISTRY.timer("screenshot"):
+            return take_screenshot_html(rendered_html, dimensions)
@@ -2,18 +2,79 @@ import os
 from utils.app_utils import resolve_path, get_font
 from plugins.base_plugin.base_plugin import BasePlugin
 from plugins.calendar.constants import LOCALE_MAP, FONT_SIZES
+from plugins.calendar.ics_stream import read_calendar_window, to_date
 from PIL import Image, ImageColor, ImageDraw, ImageFont
-import icalendar
 import recurring_ical_events
 from io import BytesIO
 import logging
+import hashlib
+import threading
+import tempfile
 import requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import pytz
 
 logger = logging.getLogger(__name__)
 
+MAX_FETCH_WORKERS = 4
+FETCH_TIMEOUT_SECONDS = 30
+# Number of expanded view ranges memoized per calendar
+MAX_CACHED_RANGES = 4
+# Extra days parsed around the view range so the parsed calendar can be reused as the view moves
+PARSE_WINDOW_MARGIN = timedelta(days=7)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Bytes of a downloaded feed kept in memory before it is spooled to a temporary file
+SPOOL_MAX_BYTES = 1024 * 1024
+
+class CachedCalendar:
+    """A parsed calendar along with its validators and memoized event expansions.
+
+    Attributes:
+        calendar (icalendar.Calendar): The parsed calendar, limited to events within the window.
+        body_hash (str): SHA-256 hash of the ICS body the calendar was parsed from.
+        window (tuple): First and last date (inclusive) the calendar was parsed for.
+        etag (str): ETag header returned with the body, if any.
+        last_modified (str): Last-Modified header returned with the body, if any.
+        ranges (OrderedDict): Expanded events keyed by (start, end), least recently used first.
+    """
+
+    def __init__(self, calendar, body_hash, window, etag=None, last_modified=None):
+        self.calendar = calendar
+        self.body_hash = body_hash
+        self.window = window
+        self.etag = etag
+        self.last_modified = last_modified
+        self.ranges = OrderedDict()
+        self.lock = threading.Lock()
+
+    def covers(self, start_range, end_range):
+        """Returns whether the parsed window includes the given range."""
+        return self.window[0] <= to_date(start_range) and to_date(end_range) <= self.window[1]
+
+    def get_events(self, start_range, end_range):
+        """Returns events between the given range, expanding recurrences only once per range."""
+        key = (start_range, end_range)
+        with self.lock:
+            if key in self.ranges:
+                self.ranges.move_to_end(key)
+                return self.ranges[key]
+
+        events = recurring_ical_events.of(self.calendar).between(start_range, end_range)
+
+        with self.lock:
+            self.ranges[key] = events
+            while len(self.ranges) > MAX_CACHED_RANGES:
+                self.ranges.popitem(last=False)
+        return events
+
 class Calendar(BasePlugin):
+    def __init__(self, config, **dependencies):
+        super().__init__(config, **dependencies)
+        self.calendar_cache = {}
+        self.cache_lock = threading.Lock()
+
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
         template_params['style_settings'] = True
@@ -73,9 +134,14 @@ class Calendar(BasePlugin):
     def fetch_ics_events(self, calendar_urls, colors, tz, start_range, end_range):
         parsed_events = []
 
-        for calendar_url, color in zip(calendar_urls, colors):
-            cal = self.fetch_calendar(calendar_url)
-            events = recurring_ical_events.of(cal).between(start_range, end_range)
+        calendars = list(zip(calendar_urls, colors))
+        workers = max(1, min(MAX_FETCH_WORKERS, len(calendars)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            cached_calendars = list(executor.map(
+                lambda c: self.fetch_cached_calendar(c[0], start_range, end_range), calendars))
+
+        for cached_calendar, (calendar_url, color) in zip(cached_calendars, calendars):
+            events = cached_calendar.get_events(start_range, end_range)
             contrast_color = self.get_contrast_color(color)
 
             for event in events:
@@ -107,8 +173,9 @@ class Calendar(BasePlugin):
                 start = datetime(start.year, start.month, start.day)
             end = start + timedelta(days=7)
         elif view == "dayGrid":
-            start = current_dt - timedelta(weeks=1)
-            end = current_dt + timedelta(weeks=int(settings.get("displayWeeks") or 4))
+            # whole days so the range, and its memoized expansion, is stable throughout the day
+            end = start + timedelta(weeks=int(settings.get("displayWeeks") or 4), days=1)
+            start = start - timedelta(weeks=1)
         elif view == "dayGridMonth":
             start = datetime(current_dt.year, current_dt.month, 1) - timedelta(weeks=1)
             end = datetime(current_dt.year, current_dt.month, 1) + timedelta(weeks=6)
@@ -137,13 +204,64 @@ class Calendar(BasePlugin):
             end = (dtstart + duration).isoformat()
         return start, end, all_day
 
-    def fetch_calendar(self, calendar_url):
-        try:
-            response = requests.get(calendar_url)
-            response.raise_for_status()
-            return icalendar.Calendar.from_ical(response.text)
-        except Exception as e:
-            raise RuntimeError(f"Failed to fetch iCalendar url: {str(e)}")
+    def fetch_calendar(self, calendar_url, start_range, end_range):
+        return self.fetch_cached_calendar(calendar_url, start_range, end_range).calendar
+
+    def fetch_cached_calendar(self, calendar_url, start_range, end_range):
+        """Fetches and parses the events of a calendar that could fall within the given range.
+
+        The parse is reused while the feed is unchanged and still covers the range: the request
+        is made conditional on the cached ETag/Last-Modified validators, and for servers without
+        them the body is hashed as it downloads and only parsed when the hash differs. The body
+        is spooled to disk past a size limit, and parsed through a range-limited reader, so memory
+        and parse time depend on the view window rather than the calendar's history.
+        """
+        with self.cache_lock:
+            cached = self.calendar_cache.get(calendar_url)
+        if cached and not cached.covers(start_range, end_range):
+            cached = None
+
+        headers = {}
+        if cached and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+        window = (to_date(start_range - PARSE_WINDOW_MARGIN), to_date(end_range + PARSE_WINDOW_MARGIN))
+        body_hash = hashlib.sha256()
+
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as body:
+            try:
+                with requests.get(calendar_url, headers=headers, timeout=FETCH_TIMEOUT_SECONDS, stream=True) as response:
+                    if cached and response.status_code == 304:
+                        logger.debug(f"Calendar not modified, using cached copy: {calendar_url}")
+                        return cached
+                    response.raise_for_status()
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        body_hash.update(chunk)
+                        body.write(chunk)
+                    etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+            except Exception as e:
+                raise RuntimeError(f"Failed to fetch iCalendar url: {str(e)}")
+
+            digest = body_hash.hexdigest()
+            if cached and cached.body_hash == digest:
+                logger.debug(f"Calendar body unchanged, using cached copy: {calendar_url}")
+                cached.etag, cached.last_modified = etag, last_modified
+                return cached
+
+            body.seek(0)
+            try:
+                calendar, window_filter = read_calendar_window(iter(lambda: body.read(DOWNLOAD_CHUNK_SIZE), b""), *window)
+            except Exception as e:
+                raise RuntimeError(f"Failed to parse iCalendar url: {str(e)}")
+
+        logger.debug(f"Parsed {window_filter.events_kept} of {window_filter.events_seen} events "
+                     f"between {window[0]} and {window[1]}: {calendar_url}")
+        cached = CachedCalendar(calendar, digest, window, etag, last_modified)
+        with self.cache_lock:
+            self.calendar_cache[calendar_url] = cached
+        return cached
 
     def get_contrast_color(self, color):
         """
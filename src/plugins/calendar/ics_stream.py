@@ -0,0 +1,201 @@
+"""
+Range-limited streaming reader for iCalendar (ICS) feeds.
+
+Exported calendars often contain years of past events while the plugin only ever shows a
+few weeks. Instead of building the full icalendar object tree, the feed is scanned line by
+line and each VEVENT is inspected with cheap string checks on its DTSTART, DTEND, DURATION,
+RRULE and RECURRENCE-ID properties. Only events that could intersect the requested window
+(including recurring masters that are still active and overrides of their occurrences) are
+kept, and only those are handed to icalendar for full parsing.
+"""
+
+import codecs
+import re
+from datetime import date, datetime, timedelta
+
+import icalendar
+
+# Window padding applied to the cheap date checks. Times are compared by date only and
+# without resolving TZIDs, so one day on each side covers any timezone offset.
+WINDOW_MARGIN = timedelta(days=1)
+
+DURATION_PATTERN = re.compile(r"P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?")
+
+def iter_unfolded_lines(chunks, encoding="utf-8"):
+    """Yields logical content lines from an iterable of byte chunks, unfolding continuations."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending = None
+    remainder = ""
+
+    def split(text):
+        nonlocal pending
+        for raw_line in text:
+            line = raw_line.rstrip("\r")
+            if line[:1] in (" ", "\t") and pending is not None:
+                pending += line[1:]
+                continue
+            if pending:
+                yield pending
+            pending = line
+
+    for chunk in chunks:
+        remainder += decoder.decode(chunk)
+        *lines, remainder = remainder.split("\n")
+        yield from split(lines)
+
+    remainder += decoder.decode(b"", final=True)
+    yield from split([remainder] if remainder else [])
+    if pending:
+        yield pending
+
+def split_property(line):
+    """Splits a content line into its upper-cased name, raw parameters and value."""
+    in_quotes = False
+    name_end = None
+    for index, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ";" and name_end is None and not in_quotes:
+            name_end = index
+        elif char == ":" and not in_quotes:
+            name = line[:name_end if name_end is not None else index]
+            params = line[name_end + 1:index] if name_end is not None else ""
+            return name.upper(), params, line[index + 1:]
+    return line.upper(), "", ""
+
+def parse_ics_date(value):
+    """Returns the date part of an ICS DATE or DATE-TIME value, or None if it can't be parsed."""
+    if not value:
+        return None
+    value = value.split(",")[0].strip()
+    try:
+        return date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+    except (ValueError, IndexError):
+        return None
+
+def parse_duration_days(value):
+    """Returns an ICS DURATION as a whole number of days, rounded up."""
+    match = DURATION_PATTERN.match((value or "").lstrip("+"))
+    if not match:
+        return 0
+    weeks, days, hours, minutes, seconds = (int(group or 0) for group in match.groups())
+    extra_seconds = hours * 3600 + minutes * 60 + seconds
+    return weeks * 7 + days + (1 if extra_seconds else 0)
+
+def rrule_until(rrule):
+    """Returns the UNTIL date of an RRULE value, or None if the rule is unbounded or uses COUNT."""
+    for part in (rrule or "").split(";"):
+        key, _, value = part.partition("=")
+        if key.upper() == "UNTIL":
+            return parse_ics_date(value)
+    return None
+
+def to_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+class IcsWindowFilter:
+    """Collects the calendar header, timezones and the VEVENTs that could intersect a window.
+
+    Attributes:
+        window_start (date): First date of the window, including the margin.
+        window_end (date): Last date of the window, including the margin.
+        header (list): Top-level VCALENDAR property lines.
+        components (list): Content lines of the kept components.
+        events_seen (int): Number of VEVENTs scanned.
+        events_kept (int): Number of VEVENTs kept.
+    """
+
+    def __init__(self, window_start, window_end):
+        self.window_start = to_date(window_start) - WINDOW_MARGIN
+        self.window_end = to_date(window_end) + WINDOW_MARGIN
+        self.header = []
+        self.components = []
+        self.events_seen = 0
+        self.events_kept = 0
+
+        self._component = None
+        self._buffer = []
+        self._depth = 0
+        self._properties = {}
+
+    def feed(self, line):
+        """Processes a single unfolded content line."""
+        if not line:
+            return
+        name, _, value = split_property(line)
+
+        if name == "BEGIN":
+            value = value.strip().upper()
+            if value == "VCALENDAR" and self._component is None:
+                return
+            if self._component is None:
+                self._component = value
+                self._buffer = []
+                self._properties = {}
+                self._depth = 0
+            self._depth += 1
+            self._buffer.append(line)
+            return
+
+        if self._component is None:
+            if name != "END":
+                self.header.append(line)
+            return
+
+        self._buffer.append(line)
+        if name == "END":
+            self._depth -= 1
+            if self._depth == 0:
+                self._finish_component()
+        elif self._depth == 1 and name not in self._properties:
+            # only the component's own properties, not those of nested VALARMs
+            self._properties[name] = value
+
+    def _finish_component(self):
+        component, self._component = self._component, None
+        if component == "VTIMEZONE":
+            self.components.extend(self._buffer)
+        elif component == "VEVENT":
+            self.events_seen += 1
+            if self.intersects(self._properties):
+                self.events_kept += 1
+                self.components.extend(self._buffer)
+        self._buffer = []
+
+    def intersects(self, properties):
+        """Returns whether an event with the given properties could occur within the window."""
+        start = parse_ics_date(properties.get("DTSTART"))
+        if start is None:
+            return True
+
+        if "RRULE" in properties or "RDATE" in properties:
+            if "RDATE" in properties:
+                return True
+            until = rrule_until(properties.get("RRULE"))
+            return start <= self.window_end and (until is None or until >= self.window_start)
+
+        if "RECURRENCE-ID" in properties:
+            # an override that moves an occurrence out of the window must still be kept
+            recurrence_id = parse_ics_date(properties.get("RECURRENCE-ID"))
+            if recurrence_id is not None and self.window_start <= recurrence_id <= self.window_end:
+                return True
+
+        end = parse_ics_date(properties.get("DTEND"))
+        if end is None:
+            end = start + timedelta(days=parse_duration_days(properties.get("DURATION")))
+        return start <= self.window_end and max(start, end) >= self.window_start
+
+    def to_ical(self):
+        """Returns the kept content as an ICS document."""
+        return "\r\n".join(["BEGIN:VCALENDAR", *self.header, *self.components, "END:VCALENDAR"]) + "\r\n"
+
+def read_calendar_window(chunks, window_start, window_end):
+    """Parses an ICS feed from byte chunks, keeping only events that could intersect the window.
+
+    Returns:
+        tuple: The parsed icalendar.Calendar and the IcsWindowFilter with scan statistics.
+    """
+    window_filter = IcsWindowFilter(window_start, window_end)
+    for line in iter_unfolded_lines(chunks):
+        window_filter.feed(line)
+    return icalendar.Calendar.from_ical(window_filter.to_ical()), window_filter
@@ -0,0 +1,167 @@
+"""
+Persistent album index for the Image Album plugin.
+
+Listing an album's assets means paging through the whole album, so the asset ids are kept
+in a persistent store together with the album's `updatedAt`. On each refresh only the album
+itself is fetched; when it changed, just the assets updated since the last sync are
+requested, falling back to a full listing when the asset count shows that assets were
+removed. Assets are shown in shuffled order without repeats until every asset was shown.
+"""
+
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Longest edge of the server-side thumbnail sizes, see Immich's image settings
+THUMBNAIL_SIZE = 250
+PREVIEW_SIZE = 1440
+
+def choose_asset_size(dimensions):
+    """Returns the smallest Immich asset size ("thumbnail", "preview" or "original") covering the dimensions."""
+    longest_edge = max(dimensions)
+    if longest_edge <= THUMBNAIL_SIZE:
+        return "thumbnail"
+    if longest_edge <= PREVIEW_SIZE:
+        return "preview"
+    return "original"
+
+class ShuffleCursor:
+    """Walks a shuffled order of ids, reshuffling only once every id was returned.
+
+    Attributes:
+        order (list): Ids in the order they are returned.
+        position (int): Index of the next id to return.
+    """
+
+    def __init__(self, order=None, position=0, rng=None):
+        self.order = list(order or [])
+        self.position = position
+        self.rng = rng or random.Random()
+
+    def sync(self, ids):
+        """Drops ids that no longer exist and inserts new ids at random unseen positions."""
+        ids = list(dict.fromkeys(ids))
+        existing = set(ids)
+        seen = [i for i in self.order[:self.position] if i in existing]
+        unseen = [i for i in self.order[self.position:] if i in existing]
+
+        known = set(seen) | set(unseen)
+        for new_id in (i for i in ids if i not in known):
+            unseen.insert(self.rng.randint(0, len(unseen)), new_id)
+
+        self.order = seen + unseen
+        self.position = len(seen)
+
+    def next(self):
+        """Returns the next id, or None if there are no ids."""
+        if not self.order:
+            return None
+        if self.position >= len(self.order):
+            last = self.order[-1]
+            self.rng.shuffle(self.order)
+            # don't show the same asset twice in a row across a reshuffle
+            if len(self.order) > 1 and self.order[0] == last:
+                self.order[0], self.order[-1] = self.order[-1], self.order[0]
+            self.position = 0
+        current = self.order[self.position]
+        self.position += 1
+        return current
+
+    def to_dict(self):
+        return {"order": self.order, "position": self.position}
+
+    @classmethod
+    def from_dict(cls, data, rng=None):
+        data = data or {}
+        return cls(data.get("order"), data.get("position", 0), rng)
+
+class AlbumAssetCache:
+    """Caches an album's asset ids in a persistent store and picks assets to show.
+
+    The client must provide `list_albums()`, `get_album(album_id)` returning None for
+    unknown albums, and `search_assets(album_id, page, updated_after=None)` returning
+    the page's asset dicts and the next page number or None.
+
+    Attributes:
+        client: Immich API client.
+        store: PersistentDict (or dict-like with get/set) holding the cached entries.
+        cache_key (str): Key of this album's entry in the store.
+    """
+
+    def __init__(self, client, store, cache_key, rng=None):
+        self.client = client
+        self.store = store
+        self.cache_key = cache_key
+        self.rng = rng
+
+    def next_asset_id(self, album_name):
+        """Refreshes the album's asset ids if it changed and returns the next asset to show."""
+        entry = self.store.get(self.cache_key) or {}
+        album = self.find_album(album_name, entry.get("album_id"))
+
+        if entry.get("album_id") != album["id"]:
+            entry = {"album_id": album["id"]}
+        if entry.get("album_updated_at") != album.get("updatedAt") or "asset_ids" not in entry:
+            self.sync(entry, album)
+
+        cursor = ShuffleCursor.from_dict(entry.get("cursor"), self.rng)
+        cursor.sync(entry["asset_ids"])
+        asset_id = cursor.next()
+        entry["cursor"] = cursor.to_dict()
+        self.store.set(self.cache_key, entry)
+
+        if asset_id is None:
+            raise RuntimeError(f"Album {album_name} has no assets.")
+        return asset_id
+
+    def remove_asset(self, asset_id):
+        """Forgets an asset that no longer exists on the server."""
+        entry = self.store.get(self.cache_key)
+        if entry and asset_id in entry.get("asset_ids", []):
+            entry["asset_ids"].remove(asset_id)
+            self.store.set(self.cache_key, entry)
+
+    def find_album(self, album_name, album_id=None):
+        if album_id:
+            album = self.client.get_album(album_id)
+            if album and album.get("albumName") == album_name:
+                return album
+
+        albums = [a for a in self.client.list_albums() if a.get("albumName") == album_name]
+        if not albums:
+            raise RuntimeError(f"Album {album_name} not found.")
+        return albums[0]
+
+    def sync(self, entry, album):
+        asset_count = album.get("assetCount")
+        synced_at = entry.get("synced_at")
+
+        if "asset_ids" in entry and synced_at:
+            logger.info(f"Fetching assets updated since {synced_at} in album {album['id']}")
+            assets = self.fetch_assets(album["id"], updated_after=synced_at)
+            asset_ids = list(dict.fromkeys(entry["asset_ids"] + [a["id"] for a in assets]))
+            if asset_count is None or len(asset_ids) == asset_count:
+                self.update_entry(entry, album, asset_ids, assets, synced_at)
+                return
+            logger.info(f"Album {album['id']} has {asset_count} assets but {len(asset_ids)} are cached, reloading")
+
+        logger.info(f"Fetching all assets in album {album['id']}")
+        assets = self.fetch_assets(album["id"])
+        self.update_entry(entry, album, [a["id"] for a in assets], assets, None)
+
+    def update_entry(self, entry, album, asset_ids, assets, synced_at):
+        updated = [a["updatedAt"] for a in assets if a.get("updatedAt")]
+        entry["asset_ids"] = asset_ids
+        entry["album_updated_at"] = album.get("updatedAt")
+        entry["synced_at"] = max(updated + ([synced_at] if synced_at else []), default=None)
+
+    def fetch_assets(self, album_id, updated_after=None):
+        all_items = []
+        page = 1
+        while page:
+            items, page = self.client.search_assets(album_id, page, updated_after=updated_after)
+            if not items:
+                break
+            all_items.extend(items)
+        return all_items
@@ -1,5 +1,5 @@
+import os
 import logging
-from random import choice, random
 
 import requests
 from PIL import Image, ImageColor, ImageOps
@@ -7,70 +7,100 @@ from io import BytesIO
 
 from PIL.ImageFile import ImageFile
 from plugins.base_plugin.base_plugin import BasePlugin
+from plugins.image_album.album_cache import AlbumAssetCache, choose_asset_size
 
+from utils.cache_utils import PersistentDict
 from utils.image_utils import pad_image_blur
 
 logger = logging.getLogger(__name__)
 
+REQUEST_TIMEOUT_SECONDS = 30
+SEARCH_PAGE_SIZE = 1000
+# Assets to try when the chosen one was deleted on the server
+MAX_DOWNLOAD_ATTEMPTS = 3
+
+ALBUM_CACHE_FILE = "image_album_immich.json"
+
 
 class ImmichProvider:
-    def __init__(self, base_url: str, key: str, orientation: str):
-        self.base_url = base_url
+    def __init__(self, base_url: str, key: str, orientation: str, cache_store=None):
+        self.base_url = base_url.rstrip("/")
         self.key = key
         self.orientation = orientation
         self.headers = {"x-api-key": self.key}
+        self.cache_store = cache_store if cache_store is not None else {}
 
-    def get_album_id(self, album: str) -> str:
-        r = requests.get(f"{self.base_url}/api/albums", headers=self.headers)
+    def list_albums(self) -> list[dict]:
+        r = requests.get(f"{self.base_url}/api/albums", headers=self.headers, timeout=REQUEST_TIMEOUT_SECONDS)
         r.raise_for_status()
-        albums = r.json()
-        album = [a for a in albums if a["albumName"] == album][0]
-
-        if album is None:
-            raise RuntimeError(f"Album {album} not found.")
-
-        return album["id"]
-
-    def get_asset_ids(self, album_id: str) -> list[str]:
-        all_items = []
-        page_items = [1]
-        page = 1
-
-        while page_items:
-            body = {
-                "albumIds": [album_id],
-                "size": 1000,
-                "page": page
-            }
-            r2 = requests.post(f"{self.base_url}/api/search/metadata", json=body, headers=self.headers)
-            r2.raise_for_status()
-            assets_data = r2.json()
-
-            page_items = assets_data.get("assets", {}).get("items", [])
-            all_items.extend(page_items)
-            page += 1
-
-        return [asset["id"] for asset in all_items]
-
-    def get_image(self, album: str) -> ImageFile | None:
-        try:
-            logger.info(f"Getting id for album {album}")
-            album_id = self.get_album_id(album)
-            logger.info(f"Getting ids from album id {album_id}")
-            asset_ids = self.get_asset_ids(album_id)
-        except Exception as e:
-            logger.error(f"Error grabbing image from {self.base_url}: {e}")
-            return None
+        return r.json()
 
-        asset_id = choice(asset_ids)
+    def get_album(self, album_id: str) -> dict | None:
+        r = requests.get(f"{self.base_url}/api/albums/{album_id}", params={"withoutAssets": "true"},
+                         headers=self.headers, timeout=REQUEST_TIMEOUT_SECONDS)
+        if r.status_code in (400, 404):
+            return None
+        r.raise_for_status()
+        return r.json()
 
-        logger.info(f"Downloading image {asset_id}")
-        r = requests.get(f"{self.base_url}/api/assets/{asset_id}/original", headers=self.headers)
+    def search_assets(self, album_id: str, page: int, updated_after: str | None = None) -> tuple[list[dict], int | None]:
+        body = {
+            "albumIds": [album_id],
+            "size": SEARCH_PAGE_SIZE,
+            "page": page
+        }
+        if updated_after:
+            body["updatedAfter"] = updated_after
+        r = requests.post(f"{self.base_url}/api/search/metadata", json=body, headers=self.headers,
+                          timeout=REQUEST_TIMEOUT_SECONDS)
         r.raise_for_status()
-        return Image.open(BytesIO(r.content))
+        assets = r.json().get("assets", {})
+
+        next_page = assets.get("nextPage")
+        return assets.get("items", []), int(next_page) if next_page else None
+
+    def download_asset(self, asset_id: str, size: str) -> requests.Response:
+        if size == "original":
+            url = f"{self.base_url}/api/assets/{asset_id}/original"
+            params = None
+        else:
+            url = f"{self.base_url}/api/assets/{asset_id}/thumbnail"
+            params = {"size": size}
+        return requests.get(url, params=params, headers=self.headers, timeout=REQUEST_TIMEOUT_SECONDS)
+
+    def get_image(self, album: str, dimensions: tuple[int, int]) -> ImageFile | None:
+        album_cache = AlbumAssetCache(self, self.cache_store, f"{self.base_url}|{album}")
+        size = choose_asset_size(dimensions)
+
+        for _ in range(MAX_DOWNLOAD_ATTEMPTS):
+            try:
+                asset_id = album_cache.next_asset_id(album)
+            except Exception as e:
+                logger.error(f"Error grabbing image from {self.base_url}: {e}")
+                return None
+
+            logger.info(f"Downloading {size} image {asset_id}")
+            r = self.download_asset(asset_id, size)
+            if r.status_code == 404:
+                logger.warning(f"Asset {asset_id} no longer exists, removing it from the cache")
+                album_cache.remove_asset(asset_id)
+                continue
+            r.raise_for_status()
+            return Image.open(BytesIO(r.content))
+
+        return None
 
 
 class ImageAlbum(BasePlugin):
+    def __init__(self, config, **dependencies):
+        super().__init__(config, **dependencies)
+        self.album_cache_store = None
+
+    def get_album_cache_store(self, device_config):
+        if self.album_cache_store is None:
+            self.album_cache_store = PersistentDict(os.path.join(device_config.cache_dir, ALBUM_CACHE_FILE))
+        return self.album_cache_store
+
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
         template_params['api_key'] = {
@@ -82,6 +112,9 @@ class ImageAlbum(BasePlugin):
 
     def generate_image(self, settings, device_config):
         orientation = device_config.get_config("orientation")
+        dimensions = device_config.get_resolution()
+        if orientation == "vertical":
+            dimensions = dimensions[::-1]
         img = None
 
         match settings.get("albumProvider"):
@@ -98,8 +131,8 @@ class ImageAlbum(BasePlugin):
                 if not album:
                     raise RuntimeError("Album is required.")
 
-                provider = ImmichProvider(url, key, orientation)
-                img = provider.get_image(album)
+                provider = ImmichProvider(url, key, orientation, self.get_album_cache_store(device_config))
+                img = provider.get_image(album, dimensions)
                 if not img:
                     raise RuntimeError("Failed to load image, please check logs.")
 
@@ -107,11 +140,6 @@ class ImageAlbum(BasePlugin):
             raise RuntimeError("Failed to load image, please check logs.")
 
         if settings.get('padImage') == "true":
-            dimensions = device_config.get_resolution()
-
-            if orientation == "vertical":
-                dimensions = dimensions[::-1]
-
             if settings.get('backgroundOption') == "blur":
                 return pad_image_blur(img, dimensions)
             else:
@@ -2,7 +2,6 @@ from plugins.base_plugin.base_plugin import BasePlugin
 from PIL import Image
 import logging
 import random
-import os
 
 logger = logging.getLogger(__name__)
 
@@ -41,17 +40,3 @@ class ImageUpload(BasePlugin):
 
         # Image is already resized and rotated on upload
         return image
-
-    def cleanup(self, settings):
-        """Delete all uploaded image files associated with this plugin instance."""
-        image_locations = settings.get("imageFiles[]", [])
-        if not image_locations:
-            return
-
-        for image_path in image_locations:
-            if os.path.exists(image_path):
-                try:
-                    os.remove(image_path)
-                    logger.info(f"Deleted uploaded image: {image_path}")
-                except Exception as e:
-                    logger.warning(f"Failed to delete uploaded image {image_path}: {e}")
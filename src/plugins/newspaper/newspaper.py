@@ -1,6 +1,8 @@
 from plugins.base_plugin.base_plugin import BasePlugin
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from utils.image_utils import get_image
+from utils.cache_utils import TTLCache
+from utils.media_cache import get_media_cache, published_at
 from PIL import Image
 import logging
 from plugins.newspaper.constants import NEWSPAPERS
@@ -8,6 +10,13 @@ from plugins.newspaper.constants import NEWSPAPERS
 logger = logging.getLogger(__name__)
 
 FREEDOM_FORUM_URL = "https://cdn.freedomforum.org/dfp/jpg{}/lg/{}.jpg"
+REQUEST_TIMEOUT = 10
+# Front pages of a day are posted overnight US time, later days are fetched in the background after that
+PUBLISH_DELAY = timedelta(hours=6)
+# Seconds a front page that wasn't found isn't asked for again
+NOT_FOUND_TTL_SECONDS = 30 * 60
+NOT_FOUND = TTLCache()
+
 class Newspaper(BasePlugin):
     def generate_image(self, settings, device_config):
         newspaper_slug = settings.get('newspaperSlug')
@@ -20,15 +29,30 @@ class Newspaper(BasePlugin):
         today = datetime.today()
 
         # check the next day, then today, then prior day
-        days = [today + timedelta(days=diff) for diff in [1,0,-1,-2]]
+        days = [(today + timedelta(days=diff)).date() for diff in [1,0,-1,-2]]
+
+        cache = get_media_cache(device_config.cache_dir)
+        source = f"newspaper/{newspaper_slug}"
+        min_edge = max(device_config.get_resolution())
+        fetch = lambda day: self._fetch_front_page(newspaper_slug, day)
 
+        now = datetime.now(timezone.utc)
         image = None
         for date in days:
-            image_url = FREEDOM_FORUM_URL.format(date.day, newspaper_slug)
-            image = get_image(image_url)
-            if image:
-                logging.info(f"Found {newspaper_slug} front cover for {date.strftime('%Y-%m-%d')}")
-                break
+            if NOT_FOUND.get((source, date)):
+                continue
+            publish_time = published_at(date, PUBLISH_DELAY)
+            if publish_time > now and not cache.contains(source, date, min_edge):
+                # not posted yet, it is fetched in the background once it should be
+                cache.prefetch(source, date, fetch, min_edge, at=publish_time)
+                continue
+            try:
+                image = cache.get_or_fetch(source, date, fetch, min_edge).image
+            except RuntimeError:
+                NOT_FOUND.set((source, date), True, NOT_FOUND_TTL_SECONDS)
+                continue
+            logging.info(f"Found {newspaper_slug} front cover for {date.strftime('%Y-%m-%d')}")
+            break
 
         if image:
             # expand height if newspaper is wider than resolution
@@ -53,6 +77,18 @@ class Newspaper(BasePlugin):
     
         return image
     
+    def _fetch_front_page(self, newspaper_slug, day):
+        """Fetches a front page, raising RuntimeError if the newspaper has none for the day."""
+        image_url = FREEDOM_FORUM_URL.format(day.day, newspaper_slug)
+        try:
+            image = get_image(image_url, timeout=REQUEST_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Failed to fetch {image_url}: {e}")
+            image = None
+        if not image:
+            raise RuntimeError(f"No {newspaper_slug} front cover for {day.isoformat()}.")
+        return {"url": image_url}, image
+
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
         template_params['newspapers'] = sorted(NEWSPAPERS, key=lambda n: n['name'])
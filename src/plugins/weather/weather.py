@@ -8,13 +8,9 @@ from astral import moon
 import pytz
 from io import BytesIO
 import math
-import asyncio
-
-try:
-    from bleak import BleakClient
-    BLEAK_AVAILABLE = True
-except ImportError:
-    BLEAK_AVAILABLE = False
+from concurrent.futures import ThreadPoolExecutor, wait
+from utils.cache_utils import TTLCache, PersistentDict
+from plugins.weather.xiaomi_sensor import get_sensor_listener
 
 logger = logging.getLogger(__name__)
         
@@ -59,6 +55,26 @@ GEOCODING_URL = "http://api.openweathermap.org/geo/1.0/reverse?lat={lat}&lon={lo
 OPEN_METEO_FORECAST_URL = "https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={long}&hourly=temperature_2m,precipitation,precipitation_probability,relative_humidity_2m&daily=weathercode,temperature_2m_max,temperature_2m_min,sunrise,sunset&current_weather=true&timezone=auto&models=best_match&forecast_days={forecast_days}"
 OPEN_METEO_AIR_QUALITY_URL = "https://air-quality-api.open-meteo.com/v1/air-quality?latitude={lat}&longitude={long}&hourly=european_aqi,uv_index,uv_index_clear_sky&timezone=auto"
 ZENQUOTES_API_URL = "https://zenquotes.io/api/today"
+REQUEST_TIMEOUT_SECONDS = 10
+# All requests for a single render must complete within this many seconds
+FETCH_DEADLINE_SECONDS = 20
+
+# Cache lifetimes matching how often each provider updates its data
+OPEN_WEATHER_CACHE_TTL_SECONDS = 10 * 60
+OPEN_WEATHER_AQI_CACHE_TTL_SECONDS = 30 * 60
+OPEN_METEO_CACHE_TTL_SECONDS = 15 * 60
+OPEN_METEO_AQI_CACHE_TTL_SECONDS = 60 * 60
+QUOTE_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+GEOCODING_CACHE_FILE = "weather_geocoding.json"
+
+INDOOR_SENSOR_MAC = "A4:C1:38:47:61:0B"
+# Indoor readings older than this are not shown
+INDOOR_SENSOR_MAX_AGE_SECONDS = 30 * 60
+
+FETCH_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="weather-fetch")
+RESPONSE_CACHE = TTLCache()
+
 OPEN_METEO_UNIT_PARAMS = {
     "standard": "temperature_unit=kelvin&wind_speed_unit=ms&precipitation_unit=mm",
     "metric":   "temperature_unit=celsius&wind_speed_unit=ms&precipitation_unit=mm",
@@ -66,6 +82,10 @@ OPEN_METEO_UNIT_PARAMS = {
 }
 
 class Weather(BasePlugin):
+    def __init__(self, config, **dependencies):
+        super().__init__(config, **dependencies)
+        self.geocoding_cache = None
+
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
         template_params['api_key'] = {
@@ -98,10 +118,17 @@ class Weather(BasePlugin):
                 api_key = device_config.load_env_key("OPEN_WEATHER_MAP_SECRET")
                 if not api_key:
                     raise RuntimeError("Open Weather Map API Key not configured.")
-                weather_data = self.get_weather_data(api_key, units, lat, long)
-                aqi_data = self.get_air_quality(api_key, lat, long)
+                fetchers = {
+                    "weather": lambda: self.get_weather_data(api_key, units, lat, long),
+                    "aqi": lambda: self.get_air_quality(api_key, lat, long),
+                    "quote": lambda: self.get_quote(tz),
+                }
                 if settings.get('titleSelection', 'location') == 'location':
-                    title = self.get_location(api_key, lat, long)
+                    geocoding_cache = self.get_geocoding_cache(device_config)
+                    fetchers["location"] = lambda: self.get_location(api_key, lat, long, geocoding_cache)
+                results = self.fetch_concurrently(fetchers)
+                weather_data, aqi_data, quote_data = results["weather"], results["aqi"], results["quote"]
+                title = results.get("location", title)
                 if settings.get('weatherTimeZone', 'locationTimeZone') == 'locationTimeZone':
                     logger.info("Using location timezone for OpenWeatherMap data.")
                     wtz = self.parse_timezone(weather_data)
@@ -111,8 +138,12 @@ class Weather(BasePlugin):
                     template_params = self.parse_weather_data(weather_data, aqi_data, tz, units, time_format, lat)
             elif weather_provider == "OpenMeteo":
                 forecast_days = 7
-                weather_data = self.get_open_meteo_data(lat, long, units, forecast_days + 1)
-                aqi_data = self.get_open_meteo_air_quality(lat, long)
+                results = self.fetch_concurrently({
+                    "weather": lambda: self.get_open_meteo_data(lat, long, units, forecast_days + 1),
+                    "aqi": lambda: self.get_open_meteo_air_quality(lat, long),
+                    "quote": lambda: self.get_quote(tz),
+                })
+                weather_data, aqi_data, quote_data = results["weather"], results["aqi"], results["quote"]
                 template_params = self.parse_open_meteo_data(weather_data, aqi_data, tz, units, time_format, lat)
             else:
                 raise RuntimeError(f"Unknown weather provider: {weather_provider}")
@@ -120,8 +151,7 @@ class Weather(BasePlugin):
             template_params['title'] = title
 
             # Fetch indoor sensor data from Xiaomi BLE sensor
-            indoor_sensor_mac = "A4:C1:38:47:61:0B"
-            indoor_data = self.get_xiaomi_sensor_data(indoor_sensor_mac)
+            indoor_data = self.get_xiaomi_sensor_data(INDOOR_SENSOR_MAC)
             if indoor_data:
                 indoor_temp = indoor_data.get('temperature')
                 if indoor_temp is not None:
@@ -132,8 +162,6 @@ class Weather(BasePlugin):
                 template_params['indoor_temperature'] = None
                 template_params['indoor_humidity'] = None
 
-            # Fetch quote of the day
-            quote_data = self.get_quote()
             template_params['quote'] = quote_data.get('quote', '')
             template_params['quote_author'] = quote_data.get('author', '')
 
@@ -669,28 +697,64 @@ class Weather(BasePlugin):
         
         return "↑"
 
+    def fetch_concurrently(self, fetchers, deadline=FETCH_DEADLINE_SECONDS):
+        """Runs the given fetch functions in parallel and returns their results keyed by name.
+
+        Raises:
+            RuntimeError: If the fetches don't all complete within the deadline.
+        Exceptions raised by a fetch function are re-raised.
+        """
+        futures = {name: FETCH_EXECUTOR.submit(fetch) for name, fetch in fetchers.items()}
+        _, not_done = wait(futures.values(), timeout=deadline)
+        if not_done:
+            pending = [name for name, future in futures.items() if future in not_done]
+            for future in not_done:
+                future.cancel()
+            raise RuntimeError(f"Timed out after {deadline}s waiting for: {', '.join(pending)}")
+        return {name: future.result() for name, future in futures.items()}
+
+    def get_geocoding_cache(self, device_config):
+        if self.geocoding_cache is None:
+            self.geocoding_cache = PersistentDict(os.path.join(device_config.cache_dir, GEOCODING_CACHE_FILE))
+        return self.geocoding_cache
+
     def get_weather_data(self, api_key, units, lat, long):
-        url = WEATHER_URL.format(lat=lat, long=long, units=units, api_key=api_key)
-        response = requests.get(url)
-        if not 200 <= response.status_code < 300:
-            logging.error(f"Failed to retrieve weather data: {response.content}")
-            raise RuntimeError("Failed to retrieve weather data.")
+        def fetch():
+            url = WEATHER_URL.format(lat=lat, long=long, units=units, api_key=api_key)
+            response = requests.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
+            if not 200 <= response.status_code < 300:
+                logging.error(f"Failed to retrieve weather data: {response.content}")
+                raise RuntimeError("Failed to retrieve weather data.")
+
+            return response.json()
 
-        return response.json()
+        key = ("openweathermap", lat, long, units)
+        return RESPONSE_CACHE.get_or_fetch(key, fetch, OPEN_WEATHER_CACHE_TTL_SECONDS)
 
     def get_air_quality(self, api_key, lat, long):
-        url = AIR_QUALITY_URL.format(lat=lat, long=long, api_key=api_key)
-        response = requests.get(url)
+        def fetch():
+            url = AIR_QUALITY_URL.format(lat=lat, long=long, api_key=api_key)
+            response = requests.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
 
-        if not 200 <= response.status_code < 300:
-            logging.error(f"Failed to get air quality data: {response.content}")
-            raise RuntimeError("Failed to retrieve air quality data.")
+            if not 200 <= response.status_code < 300:
+                logging.error(f"Failed to get air quality data: {response.content}")
+                raise RuntimeError("Failed to retrieve air quality data.")
+
+            return response.json()
 
-        return response.json()
+        key = ("openweathermap_aqi", lat, long)
+        return RESPONSE_CACHE.get_or_fetch(key, fetch, OPEN_WEATHER_AQI_CACHE_TTL_SECONDS)
+
+    def get_location(self, api_key, lat, long, geocoding_cache=None):
+        """Reverse geocodes the coordinates, caching the result permanently when a cache is given."""
+        cache_key = f"{lat:.4f},{long:.4f}"
+        if geocoding_cache is not None:
+            location_str = geocoding_cache.get(cache_key)
+            if location_str:
+                return location_str
 
-    def get_location(self, api_key, lat, long):
         url = GEOCODING_URL.format(lat=lat, long=long, api_key=api_key)
-        response = requests.get(url)
+        response = requests.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
 
         if not 200 <= response.status_code < 300:
             logging.error(f"Failed to get location: {response.content}")
@@ -699,27 +763,37 @@ class Weather(BasePlugin):
         location_data = response.json()[0]
         location_str = f"{location_data.get('name')}, {location_data.get('state', location_data.get('country'))}"
 
+        if geocoding_cache is not None:
+            geocoding_cache.set(cache_key, location_str)
         return location_str
 
     def get_open_meteo_data(self, lat, long, units, forecast_days):
-        unit_params = OPEN_METEO_UNIT_PARAMS[units]
-        url = OPEN_METEO_FORECAST_URL.format(lat=lat, long=long, forecast_days=forecast_days) + f"&{unit_params}"
-        response = requests.get(url)
-        
-        if not 200 <= response.status_code < 300:
-            logging.error(f"Failed to retrieve Open-Meteo weather data: {response.content}")
-            raise RuntimeError("Failed to retrieve Open-Meteo weather data.")
-        
-        return response.json()
+        def fetch():
+            unit_params = OPEN_METEO_UNIT_PARAMS[units]
+            url = OPEN_METEO_FORECAST_URL.format(lat=lat, long=long, forecast_days=forecast_days) + f"&{unit_params}"
+            response = requests.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
+
+            if not 200 <= response.status_code < 300:
+                logging.error(f"Failed to retrieve Open-Meteo weather data: {response.content}")
+                raise RuntimeError("Failed to retrieve Open-Meteo weather data.")
+
+            return response.json()
+
+        key = ("openmeteo", lat, long, units, forecast_days)
+        return RESPONSE_CACHE.get_or_fetch(key, fetch, OPEN_METEO_CACHE_TTL_SECONDS)
 
     def get_open_meteo_air_quality(self, lat, long):
-        url = OPEN_METEO_AIR_QUALITY_URL.format(lat=lat, long=long)
-        response = requests.get(url)
-        if not 200 <= response.status_code < 300:
-            logging.error(f"Failed to retrieve Open-Meteo air quality data: {response.content}")
-            raise RuntimeError("Failed to retrieve Open-Meteo air quality data.")
-        
-        return response.json()
+        def fetch():
+            url = OPEN_METEO_AIR_QUALITY_URL.format(lat=lat, long=long)
+            response = requests.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
+            if not 200 <= response.status_code < 300:
+                logging.error(f"Failed to retrieve Open-Meteo air quality data: {response.content}")
+                raise RuntimeError("Failed to retrieve Open-Meteo air quality data.")
+
+            return response.json()
+
+        key = ("openmeteo_aqi", lat, long)
+        return RESPONSE_CACHE.get_or_fetch(key, fetch, OPEN_METEO_AQI_CACHE_TTL_SECONDS)
     
     def format_time(self, dt, time_format, hour_only=False, include_am_pm=True):
         """Format datetime based on 12h or 24h preference"""
@@ -742,53 +816,36 @@ class Weather(BasePlugin):
             logger.error("Failed to retrieve Timezone from weather data")
             raise RuntimeError("Timezone not found in weather data.")
 
-    def get_xiaomi_sensor_data(self, mac_address, timeout=30.0):
+    def get_xiaomi_sensor_data(self, mac_address, max_age=INDOOR_SENSOR_MAX_AGE_SECONDS, listener=None):
         """
-        Read temperature and humidity from Xiaomi Bluetooth sensor.
-        Connects directly to the sensor via BLE and reads from GATT characteristic.
+        Return the latest temperature and humidity reading of a Xiaomi Bluetooth sensor.
+        Readings are collected by a background listener, so this never waits on Bluetooth.
 
         Args:
             mac_address: The MAC address of the Xiaomi sensor (e.g., "A4:C1:38:XX:XX:XX")
-            timeout: Connection timeout in seconds
+            max_age: Readings older than this many seconds are ignored
+            listener: XiaomiSensorListener to read from, defaults to the shared bleak listener
 
         Returns:
-            dict with 'temperature', 'humidity', and 'voltage' keys, or None if not found
+            dict with 'temperature', 'humidity', 'voltage' and 'timestamp' keys, or None if no recent reading
         """
-        if not BLEAK_AVAILABLE:
-            logger.error("bleak library not available. Install with: pip install bleak")
-            return None
-
         if not mac_address:
             logger.error("No MAC address provided for Xiaomi sensor")
             return None
 
-        mac_address = mac_address.upper().replace("-", ":")
-
-        # GATT characteristic UUID for temperature/humidity on LYWSD03MMC
-        TEMP_HUMIDITY_CHAR = "ebe0ccc1-7a0a-4b0c-8a1a-6ff2997da3a6"
-
-        async def read_sensor():
-            async with BleakClient(mac_address, timeout=timeout) as client:
-                data = await client.read_gatt_char(TEMP_HUMIDITY_CHAR)
-                temp = int.from_bytes(data[0:2], 'little', signed=True) / 100
-                humidity = data[2]
-                voltage = int.from_bytes(data[3:5], 'little') / 1000
-                return {
-                    'temperature': round(temp, 1),
-                    'humidity': humidity,
-                    'voltage': round(voltage, 2)
-                }
-
-        try:
-            result = asyncio.run(read_sensor())
-            if result:
-                logger.info(f"Xiaomi sensor data: temp={result.get('temperature')}°C, humidity={result.get('humidity')}%, voltage={result.get('voltage')}V")
-            return result
-
-        except Exception as e:
-            logger.warning(f"Could not read data from Xiaomi sensor {mac_address}: {type(e).__name__}: {e}")
+        listener = listener or get_sensor_listener()
+        if listener is None:
+            logger.error("bleak library not available. Install with: pip install bleak")
             return None
 
+        listener.watch(mac_address)
+        reading = listener.get_reading(mac_address, max_age=max_age)
+        if reading:
+            logger.info(f"Xiaomi sensor data: temp={reading.get('temperature')}°C, humidity={reading.get('humidity')}%, voltage={reading.get('voltage')}V")
+        else:
+            logger.warning(f"No recent reading from Xiaomi sensor {mac_address}")
+        return reading
+
     def convert_sensor_temperature(self, temp_celsius, units):
         """Convert temperature from Celsius to the specified unit."""
         if units == "imperial":
@@ -797,18 +854,25 @@ class Weather(BasePlugin):
             return round(temp_celsius + 273.15, 1)
         return temp_celsius
 
-    def get_quote(self):
-        """Fetch quote of the day from ZenQuotes API."""
+    def get_quote(self, tz=None):
+        """Fetch quote of the day from ZenQuotes API, cached for the rest of the day."""
+        cache_key = ("quote", datetime.now(tz).date().isoformat())
+        cached_quote = RESPONSE_CACHE.get(cache_key)
+        if cached_quote:
+            return cached_quote
+
         try:
-            response = requests.get(ZENQUOTES_API_URL, timeout=10)
+            response = requests.get(ZENQUOTES_API_URL, timeout=REQUEST_TIMEOUT_SECONDS)
             response.raise_for_status()
             data = response.json()
 
             if data and len(data) > 0:
-                return {
+                quote = {
                     "quote": data[0].get("q", ""),
                     "author": data[0].get("a", "")
                 }
+                RESPONSE_CACHE.set(cache_key, quote, QUOTE_CACHE_TTL_SECONDS)
+                return quote
         except Exception as e:
             logger.error(f"Failed to fetch quote: {str(e)}")
 
@@ -0,0 +1,226 @@
+"""
+Background listener for Xiaomi LYWSD03MMC temperature and humidity sensors.
+
+Sensors running the ATC1441 or pvvx custom firmware broadcast their readings in BLE
+advertisements (Environmental Sensing service data, UUID 0x181A), so they can be read
+passively without connecting. Sensors on the stock firmware only expose their readings
+over GATT, so any watched sensor that hasn't advertised a reading recently is polled
+with a short connection between scan windows. Either way the work happens on a
+background thread and renders only read the latest cached reading.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+
+try:
+    from bleak import BleakClient, BleakScanner
+    BLEAK_AVAILABLE = True
+except ImportError:
+    BLEAK_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ENVIRONMENTAL_SENSING_UUID = "0000181a-0000-1000-8000-00805f9b34fb"
+# GATT characteristic UUID for temperature/humidity on the stock LYWSD03MMC firmware
+TEMP_HUMIDITY_CHAR = "ebe0ccc1-7a0a-4b0c-8a1a-6ff2997da3a6"
+
+SCAN_WINDOW_SECONDS = 60
+GATT_POLL_INTERVAL_SECONDS = 5 * 60
+GATT_CONNECT_TIMEOUT_SECONDS = 30.0
+RESTART_DELAY_SECONDS = 30
+
+def normalize_mac(mac_address):
+    return mac_address.upper().replace("-", ":")
+
+def decode_atc_advertisement(data):
+    """Decodes the 13 byte ATC1441 advertisement format (big endian, 0.1°C)."""
+    return {
+        "temperature": round(int.from_bytes(data[6:8], "big", signed=True) / 10, 1),
+        "humidity": data[8],
+        "battery": data[9],
+        "voltage": round(int.from_bytes(data[10:12], "big") / 1000, 2),
+    }
+
+def decode_pvvx_advertisement(data):
+    """Decodes the 15 byte pvvx custom advertisement format (little endian, 0.01°C)."""
+    return {
+        "temperature": round(int.from_bytes(data[6:8], "little", signed=True) / 100, 1),
+        "humidity": round(int.from_bytes(data[8:10], "little") / 100),
+        "battery": data[12],
+        "voltage": round(int.from_bytes(data[10:12], "little") / 1000, 2),
+    }
+
+def decode_service_data(service_data):
+    """Returns the reading contained in an advertisement's service data, or None."""
+    data = service_data.get(ENVIRONMENTAL_SENSING_UUID)
+    if data is None:
+        return None
+    data = bytes(data)
+    if len(data) == 13:
+        return decode_atc_advertisement(data)
+    if len(data) >= 15:
+        return decode_pvvx_advertisement(data)
+    return None
+
+def decode_gatt_reading(data):
+    """Decodes the stock firmware temperature/humidity characteristic value."""
+    return {
+        "temperature": round(int.from_bytes(data[0:2], "little", signed=True) / 100, 1),
+        "humidity": data[2],
+        "voltage": round(int.from_bytes(data[3:5], "little") / 1000, 2),
+    }
+
+class XiaomiSensorListener:
+    """Collects readings for the watched sensors on a background thread.
+
+    Attributes:
+        source: Advertisement source the thread runs, see BleakAdvertisementSource.
+        readings (dict): Latest reading per MAC address, including a `timestamp`.
+    """
+
+    def __init__(self, source, mac_addresses=()):
+        self.source = source
+        self.addresses = {normalize_mac(mac) for mac in mac_addresses}
+        self.readings = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Starts the background listening thread."""
+        if not self.thread or not self.thread.is_alive():
+            logger.info("Starting Xiaomi sensor listener")
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=None):
+        """Stops the background listening thread."""
+        self.stop_event.set()
+        if self.thread:
+            logger.info("Stopping Xiaomi sensor listener")
+            self.thread.join(timeout)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.source.run(self, self.stop_event)
+            except Exception:
+                logger.exception("Xiaomi sensor listener failed, restarting")
+                self.stop_event.wait(RESTART_DELAY_SECONDS)
+
+    def watch(self, mac_address):
+        """Adds a sensor to the set of watched addresses."""
+        with self.lock:
+            self.addresses.add(normalize_mac(mac_address))
+
+    def watched_addresses(self):
+        with self.lock:
+            return set(self.addresses)
+
+    def handle_advertisement(self, address, service_data, rssi=None):
+        """Decodes an advertisement and stores the reading if it's from a watched sensor."""
+        address = normalize_mac(address)
+        with self.lock:
+            if address not in self.addresses:
+                return
+        reading = decode_service_data(service_data)
+        if reading is not None:
+            self.update(address, reading, source="advertisement", rssi=rssi)
+
+    def update(self, address, reading, source, rssi=None):
+        reading = dict(reading, timestamp=time.time(), source=source, rssi=rssi)
+        with self.lock:
+            self.readings[normalize_mac(address)] = reading
+
+    def get_reading(self, mac_address, max_age=None):
+        """Returns the latest reading for a sensor, or None if missing or older than max_age seconds."""
+        with self.lock:
+            reading = self.readings.get(normalize_mac(mac_address))
+        if reading is None:
+            return None
+        if max_age is not None and time.time() - reading["timestamp"] > max_age:
+            return None
+        return dict(reading)
+
+    def stale_addresses(self, max_age):
+        """Returns the watched addresses without a reading in the last max_age seconds."""
+        now = time.time()
+        with self.lock:
+            return [
+                address for address in self.addresses
+                if address not in self.readings or now - self.readings[address]["timestamp"] > max_age
+            ]
+
+class BleakAdvertisementSource:
+    """Scans for advertisements with bleak, polling stale sensors over GATT between scan windows."""
+
+    def __init__(self, scan_window=SCAN_WINDOW_SECONDS, poll_interval=GATT_POLL_INTERVAL_SECONDS,
+                 connect_timeout=GATT_CONNECT_TIMEOUT_SECONDS):
+        self.scan_window = scan_window
+        self.poll_interval = poll_interval
+        self.connect_timeout = connect_timeout
+
+    def run(self, listener, stop_event):
+        asyncio.run(self._run(listener, stop_event))
+
+    async def _run(self, listener, stop_event):
+        def on_advertisement(device, advertisement_data):
+            listener.handle_advertisement(device.address, advertisement_data.service_data,
+                                          advertisement_data.rssi)
+
+        while not stop_event.is_set():
+            async with BleakScanner(detection_callback=on_advertisement):
+                await wait_for_event(stop_event, self.scan_window)
+
+            # the scanner is stopped while connecting, some adapters can't do both at once
+            for address in listener.stale_addresses(self.poll_interval):
+                if stop_event.is_set():
+                    break
+                try:
+                    async with BleakClient(address, timeout=self.connect_timeout) as client:
+                        data = await client.read_gatt_char(TEMP_HUMIDITY_CHAR)
+                    listener.update(address, decode_gatt_reading(data), source="gatt")
+                except Exception as e:
+                    logger.warning(f"Could not read data from Xiaomi sensor {address}: {type(e).__name__}: {e}")
+
+class SimulatedAdvertisementSource:
+    """Replays recorded advertisements, for tests and development without Bluetooth.
+
+    Args:
+        advertisements (list): (address, service_data) tuples, delivered in order.
+        interval (float): Seconds to wait before each advertisement.
+    """
+
+    def __init__(self, advertisements, interval=0):
+        self.advertisements = list(advertisements)
+        self.interval = interval
+
+    def run(self, listener, stop_event):
+        for address, service_data in self.advertisements:
+            if stop_event.wait(self.interval):
+                return
+            listener.handle_advertisement(address, service_data)
+        stop_event.wait()
+
+async def wait_for_event(event, timeout):
+    """Sleeps until the threading event is set or the timeout elapses, without blocking the loop."""
+    deadline = time.monotonic() + timeout
+    while not event.is_set() and time.monotonic() < deadline:
+        await asyncio.sleep(min(1, max(0, deadline - time.monotonic())))
+
+_listener = None
+_listener_lock = threading.Lock()
+
+def get_sensor_listener():
+    """Returns the shared listener backed by bleak, starting it on first use, or None if bleak is missing."""
+    global _listener
+    if not BLEAK_AVAILABLE:
+        return None
+    with _listener_lock:
+        if _listener is None:
+            _listener = XiaomiSensorListener(BleakAdvertisementSource())
+            _listener.start()
+        return _listener
@@ -19,6 +19,10 @@ Flow:
 4. Make another API request to get the image URL. (_fetch_image_src)
 5. Download the image from the URL. (_download_image)
 6. Optionally resize the image to fit the device dimensions. (_shrink_to_fit))
+
+Steps 2 to 5 are skipped for pictures in the shared media cache. The next day's picture is
+fetched shortly after the day starts in UTC, and a pool of random days is fetched ahead for
+the random mode.
 """
 
 from plugins.base_plugin.base_plugin import BasePlugin
@@ -29,10 +33,16 @@ import logging
 from random import randint
 from datetime import datetime, timedelta, date
 from functools import lru_cache
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
+from utils.media_cache import get_media_cache, published_at
 
 logger = logging.getLogger(__name__)
 
+MEDIA_SOURCE = "wpotd"
+# Pictures of the day are prepared ahead, the next one is fetched once its day starts in UTC
+PUBLISH_DELAY = timedelta(minutes=15)
+RANDOM_POOL_SIZE = 5
+
 class Wpotd(BasePlugin):
     SESSION = requests.Session()
     HEADERS = {'User-Agent': 'InkyPi/0.0 (https://github.com/fatihak/InkyPi/)'}
@@ -45,17 +55,26 @@ class Wpotd(BasePlugin):
 
     def generate_image(self, settings: Dict[str, Any], device_config: Dict[str, Any]) -> Image.Image:
         logger.info(f"WPOTD plugin settings: {settings}")
-        datetofetch = self._determine_date(settings)
-        logger.info(f"WPOTD plugin datetofetch: {datetofetch}")
+        cache = get_media_cache(device_config.cache_dir)
+        min_edge = max(device_config.get_resolution())
 
-        data = self._fetch_potd(datetofetch)
-        picurl = data["image_src"]
-        logger.info(f"WPOTD plugin Picture URL: {picurl}")
-
-        image = self._download_image(picurl)
-        if image is None:
-            logger.error("Failed to download WPOTD image.")
-            raise RuntimeError("Failed to download WPOTD image.")
+        if settings.get("randomizeWpotd") == "true":
+            # random days are taken from a pool fetched in the background
+            item = cache.take_random(MEDIA_SOURCE, min_edge)
+            if item is None:
+                item = cache.get_or_fetch(MEDIA_SOURCE, self._random_date(), self._fetch_item, min_edge)
+            cache.fill_pool(MEDIA_SOURCE, RANDOM_POOL_SIZE, self._random_date, self._fetch_item, min_edge)
+        else:
+            datetofetch = self._determine_date(settings)
+            logger.info(f"WPOTD plugin datetofetch: {datetofetch}")
+            item = cache.get_or_fetch(MEDIA_SOURCE, datetofetch, self._fetch_item, min_edge)
+            if not settings.get("customDate"):
+                next_day = datetofetch + timedelta(days=1)
+                cache.prefetch(MEDIA_SOURCE, next_day, self._fetch_item, min_edge,
+                               at=published_at(next_day, PUBLISH_DELAY))
+        logger.info(f"WPOTD plugin Picture URL: {item.metadata.get('image_src')}")
+
+        image = item.image
         if settings.get("shrinkToFitWpotd") == "true":
             dimensions = device_config.get_resolution()
             if device_config.get_config("orientation") == "vertical":
@@ -68,14 +87,27 @@ class Wpotd(BasePlugin):
 
     def _determine_date(self, settings: Dict[str, Any]) -> date:
         if settings.get("randomizeWpotd") == "true":
-            start = datetime(2015, 1, 1)
-            delta_days = (datetime.today() - start).days
-            return (start + timedelta(days=randint(0, delta_days))).date()
+            return self._random_date()
         elif settings.get("customDate"):
             return datetime.strptime(settings["customDate"], "%Y-%m-%d").date()
         else:
             return datetime.today().date()
 
+    @staticmethod
+    def _random_date() -> date:
+        start = datetime(2015, 1, 1)
+        delta_days = (datetime.today() - start).days
+        return (start + timedelta(days=randint(0, delta_days))).date()
+
+    def _fetch_item(self, cur_date: date) -> Tuple[Dict[str, Any], Image.Image]:
+        """Fetches the picture of a day, returning its metadata and image for the media cache."""
+        data = self._fetch_potd(cur_date)
+        image = self._download_image(data["image_src"])
+        if image is None:
+            logger.error("Failed to download WPOTD image.")
+            raise RuntimeError("Failed to download WPOTD image.")
+        return {**data, "date": cur_date.isoformat()}, image
+
     def _download_image(self, url: str) -> Image.Image:
         try:
             if url.lower().endswith(".svg"):
@@ -84,7 +116,9 @@ class Wpotd(BasePlugin):
 
             response = self.SESSION.get(url, headers=self.HEADERS, timeout=10)
             response.raise_for_status()
-            return Image.open(BytesIO(response.content))
+            image = Image.open(BytesIO(response.content))
+            image.load()
+            return image
         except UnidentifiedImageError as e:
             logger.error(f"Unsupported image format at {url}: {str(e)}")
             raise RuntimeError("Unsupported image format.")
@@ -2,22 +2,28 @@ import threading
 import time
 import os
 import logging
-import psutil
 import pytz
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from plugins.plugin_registry import get_plugin_instance
 from utils.image_utils import compute_image_hash
+from utils import metrics, tracing
+from utils.metrics import REGISTRY
+from utils.render_sharing import frame_size, group_render_jobs, render_key
 from model import RefreshInfo, PlaylistManager
-from PIL import Image
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_TARGET_WORKERS = 2
+DEFAULT_TARGET_CHECK_INTERVAL_SECONDS = 60
+
 class RefreshTask:
     """Handles the logic for refreshing the display using a backgroud thread."""
 
-    def __init__(self, device_config, display_manager):
+    def __init__(self, device_config, display_manager, system_stats=None):
         self.device_config = device_config
         self.display_manager = display_manager
+        self.system_stats = system_stats
 
         self.thread = None
         self.lock = threading.Lock()
@@ -76,7 +82,9 @@ class RefreshTask:
                     sleep_time = self.device_config.get_config("plugin_cycle_interval_seconds", default=60*60)
 
                     # Wait for sleep_time or until notified
+                    wait_start = time.perf_counter()
                     self.condition.wait(timeout=sleep_time)
+                    wait_end = time.perf_counter()
                     self.refresh_result = {}
                     self.refresh_event.clear()
 
@@ -84,50 +92,69 @@ class RefreshTask:
                     if not self.running:
                         break
 
-                    playlist_manager = self.device_config.get_playlist_manager()
-                    latest_refresh = self.device_config.get_refresh_info()
-                    current_dt = self._get_current_datetime()
-
-                    refresh_action = None
-                    if self.manual_update_request:
-                        # handle immediate update request
-                        logger.info("Manual update requested")
-                        refresh_action = self.manual_update_request
-                        self.manual_update_request = ()
-                    else:
-
-                        if self.device_config.get_config("log_system_stats"):
-                            self.log_system_stats()
-
-                        # handle refresh based on playlists
-                        logger.info(f"Running interval refresh check. | current_time: {current_dt.strftime('%Y-%m-%d %H:%M:%S')}")
-                        playlist, plugin_instance = self._determine_next_plugin(playlist_manager, latest_refresh, current_dt)
-                        if plugin_instance:
-                            refresh_action = PlaylistRefresh(playlist, plugin_instance)
-
-                    if refresh_action:
-                        plugin_config = self.device_config.get_plugin(refresh_action.get_plugin_id())
-                        if plugin_config is None:
-                            logger.error(f"Plugin config not found for '{refresh_action.get_plugin_id()}'.")
-                            continue
-                        plugin = get_plugin_instance(plugin_config)
-                        image = refresh_action.execute(plugin, self.device_config, current_dt)
-                        image_hash = compute_image_hash(image)
-
-                        refresh_info = refresh_action.get_refresh_info()
-                        refresh_info.update({"refresh_time": current_dt.isoformat(), "image_hash": image_hash})
-                        # check if image is the same as current image
-                        if image_hash != latest_refresh.image_hash:
-                            logger.info(f"Updating display. | refresh_info: {refresh_info}")
-                            self.display_manager.display_image(image, image_settings=plugin.config.get("image_settings", []))
+                    # the trace covers the refresh, the wait before it is its first span
+                    with tracing.TRACER.trace("refresh") as trace:
+                        tracing.add_span("wait", wait_start, wait_end, timeout=sleep_time)
+
+                        with tracing.span("load_state"):
+                            playlist_manager = self.device_config.get_playlist_manager()
+                            latest_refresh = self.device_config.get_refresh_info()
+                            current_dt = self._get_current_datetime()
+
+                        refresh_action = None
+                        if self.manual_update_request:
+                            # handle immediate update request
+                            logger.info("Manual update requested")
+                            refresh_action = self.manual_update_request
+                            self.manual_update_request = ()
                         else:
-                            logger.info(f"Image already displayed, skipping refresh. | refresh_info: {refresh_info}")
 
-                        # update latest refresh data in the device config
-                        self.device_config.refresh_info = RefreshInfo(**refresh_info)
-                        self.device_config.write_config()
+                            if self.device_config.get_config("log_system_stats"):
+                                self.log_system_stats()
+
+                            # handle refresh based on playlists
+                            logger.info(f"Running interval refresh check. | current_time: {current_dt.strftime('%Y-%m-%d %H:%M:%S')}")
+                            with tracing.span("determine_plugin"):
+                                playlist, plugin_instance = self._determine_next_plugin(playlist_manager, latest_refresh, current_dt)
+                            if plugin_instance:
+                                refresh_action = PlaylistRefresh(playlist, plugin_instance)
+
+                        if not refresh_action:
+                            # checks finding nothing to show aren't kept, they would push out the refreshes
+                            trace.discard()
+                        else:
+                            tracing.annotate(plugin_id=refresh_action.get_plugin_id(),
+                                             refresh_type=refresh_action.get_refresh_info()["refresh_type"])
+                            plugin_config = self.device_config.get_plugin(refresh_action.get_plugin_id())
+                            if plugin_config is None:
+                                logger.error(f"Plugin config not found for '{refresh_action.get_plugin_id()}'.")
+                                continue
+                            plugin = get_plugin_instance(plugin_config)
+                            with metrics.plugin_context(refresh_action.get_plugin_id()), REGISTRY.timer("refresh"):
+                                REGISTRY.inc("refreshes")
+                                image = refresh_action.execute(plugin, self.device_config, current_dt)
+                                with REGISTRY.timer("hash"):
+                                    image_hash = compute_image_hash(image)
+
+                                refresh_info = refresh_action.get_refresh_info()
+                                refresh_info.update({"refresh_time": current_dt.isoformat(), "image_hash": image_hash})
+                                # update latest refresh data first, remote clients told about the new frame read it
+                                self.device_config.refresh_info = RefreshInfo(**refresh_info)
+                                # check if image is the same as current image
+                                if image_hash != latest_refresh.image_hash:
+                                    logger.info(f"Updating display. | refresh_info: {refresh_info}")
+                                    self.display_manager.display_image(image, image_settings=plugin.config.get("image_settings", []))
+                                    REGISTRY.inc("display_updates")
+                                else:
+                                    logger.info(f"Image already displayed, skipping refresh. | refresh_info: {refresh_info}")
+                                    REGISTRY.inc("display_skipped")
+                                tracing.annotate(display_updated=image_hash != latest_refresh.image_hash)
+
+                                # persist latest refresh data in the device config
+                                self.device_config.write_config()
 
             except Exception as e:
+                REGISTRY.inc("refresh_errors")
                 logger.exception('Exception during refresh')
                 self.refresh_result["exception"] = e  # Capture exception
             finally:
@@ -162,46 +189,62 @@ class RefreshTask:
 
     def _determine_next_plugin(self, playlist_manager, latest_refresh_info, current_dt):
         """Determines the next plugin to refresh based on the active playlist, plugin cycle interval, and current time."""
-        playlist = playlist_manager.determine_active_playlist(current_dt)
-        if not playlist:
-            playlist_manager.active_playlist = None
-            logger.info(f"No active playlist determined.")
-            return None, None
-
-        playlist_manager.active_playlist = playlist.name
-        if not playlist.plugins:
-            logger.info(f"Active playlist '{playlist.name}' has no plugins.")
-            return None, None
-
-        latest_refresh_dt = latest_refresh_info.get_refresh_datetime()
-        plugin_cycle_interval = self.device_config.get_config("plugin_cycle_interval_seconds", default=3600)
-        should_refresh = PlaylistManager.should_refresh(latest_refresh_dt, plugin_cycle_interval, current_dt)
-
-        if not should_refresh:
-            latest_refresh_str = latest_refresh_dt.strftime('%Y-%m-%d %H:%M:%S') if latest_refresh_dt else "None"
-            logger.info(f"Not time to update display. | latest_update: {latest_refresh_str} | plugin_cycle_interval: {plugin_cycle_interval}")
-            return None, None
-
-        plugin = playlist.get_next_plugin()
-        logger.info(f"Determined next plugin. | active_playlist: {playlist.name} | plugin_instance: {plugin.name}")
-
-        return playlist, plugin
+        return determine_next_plugin(self.device_config, playlist_manager, latest_refresh_info, current_dt)
     
     def log_system_stats(self):
-        metrics = {
-            'cpu_percent': psutil.cpu_percent(interval=1),
-            'memory_percent': psutil.virtual_memory().percent,
-            'disk_percent': psutil.disk_usage('/').percent,
-            'load_avg_1_5_15': os.getloadavg(),
-            'swap_percent': psutil.swap_memory().percent,
-            'net_io': {
-                'bytes_sent': psutil.net_io_counters().bytes_sent,
-                'bytes_recv': psutil.net_io_counters().bytes_recv
-            }
-        }
+        """Logs the latest sample from the background system stats sampler."""
+        if not self.system_stats:
+            return
+
+        metrics = self.system_stats.latest()
+        if metrics is None:
+            logger.info("System Stats: no samples collected yet")
+            return
 
         logger.info(f"System Stats: {metrics}")
 
+def determine_next_plugin(device_config, playlist_manager, latest_refresh_info, current_dt):
+    """Determines the next plugin to refresh based on the active playlist, plugin cycle interval, and current time."""
+    playlist = playlist_manager.determine_active_playlist(current_dt)
+    if not playlist:
+        playlist_manager.active_playlist = None
+        logger.info(f"No active playlist determined.")
+        return None, None
+
+    playlist_manager.active_playlist = playlist.name
+    if not playlist.plugins:
+        logger.info(f"Active playlist '{playlist.name}' has no plugins.")
+        return None, None
+
+    latest_refresh_dt = latest_refresh_info.get_refresh_datetime()
+    plugin_cycle_interval = device_config.get_config("plugin_cycle_interval_seconds", default=3600)
+    should_refresh = PlaylistManager.should_refresh(latest_refresh_dt, plugin_cycle_interval, current_dt)
+
+    if not should_refresh:
+        latest_refresh_str = latest_refresh_dt.strftime('%Y-%m-%d %H:%M:%S') if latest_refresh_dt else "None"
+        logger.info(f"Not time to update display. | latest_update: {latest_refresh_str} | plugin_cycle_interval: {plugin_cycle_interval}")
+        return None, None
+
+    plugin = playlist.get_next_plugin()
+    logger.info(f"Determined next plugin. | active_playlist: {playlist.name} | plugin_instance: {plugin.name}")
+
+    return playlist, plugin
+
+# Plugins are singletons keeping state between renders (clients, caches, fonts), so the
+# refresh task and the target workers generate with the same plugin one at a time
+_plugin_locks = {}
+_plugin_locks_lock = threading.Lock()
+
+def generate_image(plugin, settings, device_config):
+    """Generates a plugin's image, waiting for any other generation with the same plugin to finish."""
+    with _plugin_locks_lock:
+        lock = _plugin_locks.setdefault(plugin.get_plugin_id(), threading.Lock())
+    wait_start = time.perf_counter()
+    with lock:
+        tracing.add_span("plugin_lock_wait", wait_start, time.perf_counter())
+        with metrics.track_generate():
+            return plugin.generate_image(settings, device_config)
+
 class RefreshAction:
     """Base class for a refresh action. Subclasses should override the methods below."""
     
@@ -231,7 +274,7 @@ class ManualRefresh(RefreshAction):
 
     def execute(self, plugin, device_config, current_dt: datetime):
         """Performs a manual refresh using the stored plugin ID and settings."""
-        return plugin.generate_image(self.plugin_settings, device_config)
+        return generate_image(plugin, self.plugin_settings, device_config)
 
     def get_refresh_info(self):
         """Return refresh metadata as a dictionary."""
@@ -270,19 +313,160 @@ class PlaylistRefresh(RefreshAction):
     def execute(self, plugin, device_config, current_dt: datetime):
         """Performs a refresh for the specified plugin instance within its playlist context."""
         # Determine the file path for the plugin's image
-        plugin_image_path = os.path.join(device_config.plugin_image_dir, self.plugin_instance.get_image_path())
+        frame_store = device_config.get_frame_store()
+        plugin_image_path = frame_store.frame_path(
+            os.path.join(device_config.plugin_image_dir, self.plugin_instance.get_image_path()))
 
         # Check if a refresh is needed based on the plugin instance's criteria
-        if self.plugin_instance.should_refresh(current_dt) or self.force:
+        # (or the latest image is missing, e.g. after changing the frame format)
+        if self.plugin_instance.should_refresh(current_dt) or self.force or not os.path.exists(plugin_image_path):
             logger.info(f"Refreshing plugin instance. | plugin_instance: '{self.plugin_instance.name}'") 
             # Generate a new image
-            image = plugin.generate_image(self.plugin_instance.settings, device_config)
-            image.save(plugin_image_path)
+            image = generate_image(plugin, self.plugin_instance.settings, device_config)
+            with REGISTRY.timer("frame_save"):
+                frame_store.save(image, plugin_image_path)
             self.plugin_instance.latest_refresh_time = current_dt.isoformat()
         else:
             logger.info(f"Not time to refresh plugin instance, using latest image. | plugin_instance: {self.plugin_instance.name}.")
             # Load the existing image from disk
-            with Image.open(plugin_image_path) as img:
-                image = img.copy()
+            image = frame_store.load(plugin_image_path)
+
+        return image
+class TargetRefreshTask:
+    """Refreshes the display targets (see TargetConfig) in a background thread.
+
+    Every check, each target whose plugin cycle is due moves on to the next plugin instance of
+    its active playlist. Instances that need a new image are grouped by what they can share
+    (see utils.render_sharing), and each group is rendered once on a pool of worker threads.
+    The image is then committed to every target of the group, which tells their waiting
+    remote displays.
+    """
+
+    def __init__(self, device_config):
+        self.device_config = device_config
+        self.max_workers = device_config.get_config("target_workers", default=DEFAULT_TARGET_WORKERS)
+        self.executor = None
+        self.thread = None
+        self.condition = threading.Condition()
+        self.running = False
+
+    def start(self):
+        """Starts the background thread and the worker pool, if any targets are configured."""
+        if not self.device_config.get_targets():
+            return
+        if not self.thread or not self.thread.is_alive():
+            logger.info(f"Starting target refresh task for {len(self.device_config.get_targets())} targets")
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="target-render")
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.running = True
+            self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            logger.info("Stopping target refresh task")
+            self.thread.join()
+            self.executor.shutdown(wait=True)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                interval = self.device_config.get_config("target_check_interval_seconds",
+                                                         default=DEFAULT_TARGET_CHECK_INTERVAL_SECONDS)
+                self.condition.wait(timeout=interval)
+                if not self.running:
+                    break
+            try:
+                with tracing.TRACER.trace("target_refresh") as trace:
+                    if not self.refresh_targets():
+                        # checks where no target was due aren't kept, they would push out the refreshes
+                        trace.discard()
+            except Exception:
+                REGISTRY.inc("refresh_errors")
+                logger.exception("Exception during target refresh")
+
+    def refresh_targets(self, current_dt=None):
+        """Refreshes every target that is due and waits until their images are committed.
+
+        Returns:
+            list: Names of the targets that were due.
+        """
+        current_dt = current_dt or datetime.now(pytz.timezone(self.device_config.get_config("timezone", default="UTC")))
+        render_jobs = []
+        due = []
+        for target in self.device_config.get_targets().values():
+            with tracing.span("determine_plugin", target=target.name):
+                playlist, plugin_instance = determine_next_plugin(
+                    target, target.get_playlist_manager(), target.get_refresh_info(), current_dt)
+            if not plugin_instance:
+                continue
+            due.append(target.name)
+            plugin_config = self.device_config.get_plugin(plugin_instance.plugin_id)
+            if plugin_config is None:
+                logger.error(f"Plugin config not found for '{plugin_instance.plugin_id}'. | target: {target.name}")
+                continue
+
+            action = PlaylistRefresh(playlist, plugin_instance)
+            plugin_image_path = self._plugin_image_path(target, plugin_instance)
+            if plugin_instance.should_refresh(current_dt) or not os.path.exists(plugin_image_path):
+                size = frame_size(target.get_resolution(), target.get_config("orientation"))
+                key = render_key(plugin_config, plugin_instance.settings, size)
+                render_jobs.append((key, (target, action, plugin_config)))
+            else:
+                logger.info(f"Not time to refresh plugin instance, using latest image. | target: {target.name} | plugin_instance: {plugin_instance.name}")
+                self._commit(target, action, target.get_frame_store().load(plugin_image_path), current_dt)
+
+        tracing.annotate(targets=due)
+        trace = tracing.current_trace()
+        futures = [self.executor.submit(self._render, lead, jobs, current_dt, trace)
+                   for lead, jobs in group_render_jobs(render_jobs)]
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                REGISTRY.inc("refresh_errors")
+                logger.exception("Exception while rendering for targets")
+        return due
+
+    def _render(self, lead, jobs, current_dt, trace=None):
+        """Renders a plugin instance once for the lead target and commits the image to every target of the group.
 
-        return image
\ No newline at end of file
+        Spans are recorded into the given trace of the check that submitted the render.
+        """
+        with tracing.use_trace(trace):
+            target, action, plugin_config = lead
+            plugin = get_plugin_instance(plugin_config)
+            logger.info(f"Rendering for targets. | plugin_instance: '{action.plugin_instance.name}' | targets: {[job[0].name for job in jobs]}")
+            with metrics.plugin_context(plugin_config.get("id")), REGISTRY.timer("refresh"):
+                REGISTRY.inc("refreshes")
+                image = generate_image(plugin, action.plugin_instance.settings, target)
+
+            for target, action, _ in jobs:
+                with REGISTRY.timer("frame_save"):
+                    target.get_frame_store().save(image, self._plugin_image_path(target, action.plugin_instance))
+                action.plugin_instance.latest_refresh_time = current_dt.isoformat()
+                self._commit(target, action, image, current_dt)
+
+    def _plugin_image_path(self, target, plugin_instance):
+        return target.get_frame_store().frame_path(os.path.join(target.plugin_image_dir, plugin_instance.get_image_path()))
+
+    def _commit(self, target, action, image, current_dt):
+        """Makes the image the target's current image if it changed and records the refresh."""
+        latest_refresh = target.get_refresh_info()
+        with REGISTRY.timer("hash"):
+            image_hash = compute_image_hash(image)
+        refresh_info = action.get_refresh_info()
+        refresh_info.update({"refresh_time": current_dt.isoformat(), "image_hash": image_hash})
+        target.refresh_info = RefreshInfo(**refresh_info)
+        if image_hash != latest_refresh.image_hash:
+            logger.info(f"Updating target. | target: {target.name} | refresh_info: {refresh_info}")
+            frame_store = target.get_frame_store()
+            with REGISTRY.timer("current_image_save"), target.frame_notifier.commit_lock:
+                current_image_path = frame_store.save(image, target.current_image_file, frame_format="png")
+                target.frame_notifier.publish(frame_store.frame_keys([current_image_path]).get(current_image_path))
+            REGISTRY.inc("display_updates")
+        else:
+            REGISTRY.inc("display_skipped")
+        target.write_config()
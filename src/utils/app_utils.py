@@ -6,6 +6,8 @@ import subprocess
 from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 from utils.image_utils import pad_image_blur
+from utils.upload_processor import convert_upload
+from utils.image_store import ImageStore, save_and_hash, staging_file_name
 
 logger = logging.getLogger(__name__)
 
@@ -143,10 +145,28 @@ def parse_form(request_form):
             request_dict[key] = request_form.getlist(key)
     return request_dict
 
-def handle_request_files(request_files, form_data={}, device_config=None):
-    allowed_file_extensions = {'pdf', 'png', 'jpg', 'jpeg', 'gif', 'webp', 'heif', 'heic'}
-    image_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'heif', 'heic'}
+ALLOWED_FILE_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'gif', 'webp', 'heif', 'heic'}
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'heif', 'heic'}
+
+def get_image_store():
+    return ImageStore(resolve_path(os.path.join("static", "images", "saved")))
+
+def stage_request_files(request_files, form_data={}, resize_options=None):
+    """Streams the uploaded files to disk and assigns them their location in the image store.
+
+    Non-image files are moved into the store directly. Images are saved to a staging path
+    and still need to be converted, see UploadProcessor, unless the store already holds the
+    same image processed with the same resize options, in which case it's marked `reused`.
+
+    Returns:
+        tuple: The file location map with existing and non-image files by form key, and
+            the staged images as dicts with their form `key`, `name`, `staged_path`, final `path`
+            and the `raw_path` used if they can't be converted.
+    """
     file_location_map = {}
+    staged_files = []
+    image_store = get_image_store()
+    os.makedirs(image_store.root_dir, exist_ok=True)
     # handle existing file locations being provided as part of the form data
     for key in set(request_files.keys()):
         is_list = key.endswith('[]')
@@ -160,48 +180,111 @@ def handle_request_files(request_files, form_data={}, device_config=None):
             continue
 
         extension = os.path.splitext(file_name)[1].replace('.', '')
-        if not extension or extension.lower() not in allowed_file_extensions:
+        if not extension or extension.lower() not in ALLOWED_FILE_EXTENSIONS:
             continue
 
         file_name = os.path.basename(file_name)
+        is_image = extension.lower() in IMAGE_EXTENSIONS
 
-        file_save_dir = resolve_path(os.path.join("static", "images", "saved"))
-        file_path = os.path.join(file_save_dir, file_name)
-
-        # Open the image and process it
-        if extension.lower() in image_extensions:
-            try:
-                with Image.open(file) as img:
-                    # Apply EXIF transformation
-                    img = ImageOps.exif_transpose(img)
-
-                    # Apply resize and rotation if device_config is provided
-                    if device_config:
-                        border_percent = int(form_data.get("borderPercent", 0))
-                        img = _resize_and_rotate_image(img, device_config, border_percent)
-
-                    img.save(file_path)
-            except Exception as e:
-                logger.warning(f"Image processing error for {file_name}: {e}")
-                file.seek(0)
-                file.save(file_path)
-        else:
-            # Directly save non-image files (e.g., PDF)
-            file.save(file_path)
+        staged_path = os.path.join(image_store.root_dir, staging_file_name(file_name))
+        content_hash = save_and_hash(file, staged_path)
+        file_path, exists = image_store.reserve(content_hash, file_name, resize_options if is_image else None)
+
+        if is_image and not exists:
+            staged_files.append({"key": key, "name": file_name, "staged_path": staged_path, "path": file_path,
+                                 "raw_path": image_store.path_for(content_hash, file_name)})
+            continue
 
-        if is_list:
+        # Non-image files (e.g., PDF) are stored as uploaded, and stored images are reused as is
+        if exists:
+            os.remove(staged_path)
+            logger.info(f"Reusing stored upload for {file_name}")
+        else:
+            os.replace(staged_path, file_path)
+        if is_image:
+            staged_files.append({"key": key, "name": file_name, "path": file_path, "reused": True})
+        elif is_list:
             file_location_map.setdefault(key, [])
             file_location_map[key].append(file_path)
         else:
             file_location_map[key] = file_path
-    return file_location_map
-
-
-def _resize_and_rotate_image(image, device_config, border_percent=0):
-    # Resize and rotate image based on device configuration.
-    orientation = device_config.get_config("orientation")
-    display_size = device_config.get_resolution()
+    return file_location_map, staged_files
 
+def get_upload_resize_options(device_config, form_data={}):
+    """Returns the fit_image_to_display arguments for uploads, or None without a device config."""
+    if not device_config:
+        return None
+    return {
+        "orientation": device_config.get_config("orientation"),
+        "display_size": device_config.get_resolution(),
+        "border_percent": int(form_data.get("borderPercent", 0)),
+    }
+
+def merge_uploaded_files(file_location_map, staged_files, completed_paths):
+    """Adds the converted staged files for each form key to a copy of the file location map.
+
+    Paths already listed for a key aren't added again.
+    """
+    merged = {key: list(value) if key.endswith('[]') else value for key, value in file_location_map.items()}
+    for key in dict.fromkeys(f["key"] for f in staged_files):
+        paths = completed_paths(key)
+        if key.endswith('[]'):
+            existing = merged.get(key, [])
+            merged[key] = existing + [path for path in paths if path not in existing]
+        elif paths:
+            merged[key] = paths[-1]
+    return merged
+
+def handle_request_files(request_files, form_data={}, device_config=None, upload_processor=None):
+    """Saves and converts the uploaded files, returning their locations by form key.
+
+    Blocks until every image is converted. Conversions run in parallel when an
+    UploadProcessor is given and inline otherwise.
+    """
+    resize_options = get_upload_resize_options(device_config, form_data)
+    file_location_map, staged_files = stage_request_files(request_files, form_data, resize_options)
+
+    if upload_processor:
+        job = upload_processor.submit(staged_files, resize_options)
+        upload_processor.wait(job)
+        return merge_uploaded_files(file_location_map, staged_files, job.completed_paths)
+
+    for staged_file in staged_files:
+        if not staged_file.get("reused"):
+            staged_file["path"] = convert_upload(staged_file["staged_path"], staged_file["path"], resize_options,
+                                                 staged_file.get("raw_path"))
+    return merge_uploaded_files(file_location_map, staged_files,
+                                lambda key: [f["path"] for f in staged_files if f["key"] == key])
+
+def process_uploads_in_background(upload_processor, staged_files, device_config, plugin_id, instance_name, resize_options=None):
+    """Converts staged uploads in the background, adding each file to a plugin instance's settings as it finishes.
+
+    After every conversion the instance is looked up again and updated under the config's write
+    lock before the device config is written, so the files become available one by one and
+    edits made to the instance in the meantime are kept.
+
+    Returns:
+        UploadJob: The job tracking the conversions, or None if there was nothing to convert.
+    """
+    if not staged_files:
+        return None
+    keys = list(dict.fromkeys(f["key"] for f in staged_files))
+
+    def on_file_done(job):
+        with device_config.write_lock:
+            plugin_instance = device_config.get_playlist_manager().find_plugin(plugin_id, instance_name)
+            if not plugin_instance:
+                logger.warning(f"Plugin instance {plugin_id}/{instance_name} was removed, not adding its uploads")
+                return
+            settings = plugin_instance.settings
+            file_location_map = {key: settings.get(key, []) if key.endswith('[]') else settings.get(key) for key in keys}
+            settings.update(merge_uploaded_files(file_location_map, staged_files, job.completed_paths))
+            device_config.write_config()
+
+    return upload_processor.submit(staged_files, resize_options, on_file_done)
+
+def fit_image_to_display(image, orientation, display_size, border_percent=0):
+    # Resize and rotate image based on the device orientation and resolution.
     if orientation == "vertical":
         target_size = (display_size[1], display_size[0])
         # For portrait mode: resize then rotate for display
@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Seconds between sweeps of expired entries, which drop keys that are never read again
+PRUNE_INTERVAL_SECONDS = 60
+
+class TTLCache:
+    """Thread-safe in-memory cache whose entries expire after a per-entry time to live.
+
+    Expired entries are dropped when read, and swept out by `set` at most every
+    PRUNE_INTERVAL_SECONDS, so keys that are never read again don't accumulate.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.next_prune = time.monotonic() + PRUNE_INTERVAL_SECONDS
+
+    def get(self, key, default=None):
+        """Returns the cached value for key, or default if missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self.entries[key]
+                return default
+            return value
+
+    def set(self, key, value, ttl_seconds=None):
+        """Caches value under key, forever if ttl_seconds is None."""
+        now = time.monotonic()
+        expires_at = now + ttl_seconds if ttl_seconds is not None else None
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            if now >= self.next_prune:
+                self._prune(now)
+
+    def _prune(self, now):
+        expired = [key for key, (expires_at, _) in self.entries.items() if expires_at is not None and now >= expires_at]
+        for key in expired:
+            del self.entries[key]
+        self.next_prune = now + PRUNE_INTERVAL_SECONDS
+
+    def get_or_fetch(self, key, fetch, ttl_seconds=None):
+        """Returns the cached value for key, calling fetch() and caching its result on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = fetch()
+            self.set(key, value, ttl_seconds)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+class PersistentDict:
+    """Thread-safe dictionary persisted as a JSON file, written atomically on every change.
+
+    Attributes:
+        file_path (str): Path of the backing JSON file.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.data = self._load()
+
+    def _load(self):
+        if not os.path.isfile(self.file_path):
+            return {}
+        try:
+            with open(self.file_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache file {self.file_path}: {e}")
+            return {}
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self.data.get(key, default)
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self._write()
+
+    def delete(self, key):
+        with self.lock:
+            if self.data.pop(key, None) is not None:
+                self._write()
+
+    def items(self):
+        with self.lock:
+            return list(self.data.items())
+
+    def _write(self):
+        directory = os.path.dirname(self.file_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.data, f)
+            os.replace(tmp_path, self.file_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
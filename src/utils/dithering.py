@@ -0,0 +1,177 @@
+"""
+Dithering engines for mapping frames onto a display's fixed palette.
+
+Engines take an RGB image and a Palette (see utils.palette) and return a "P" mode image
+whose pixel values index the palette. Colors are matched against the panel's measured
+colors through the palette's lookup table. Available engines:
+
+    pil               Pillow's Floyd-Steinberg quantizer (the default)
+    none              nearest color per pixel, without dithering
+    bayer             8x8 ordered Bayer dithering, fully vectorized
+    blue-noise        ordered dithering against a 64x64 blue-noise threshold map, vectorized
+    floyd-steinberg   error diffusion with a serpentine scan
+    atkinson          error diffusion spreading 3/4 of the error, with a serpentine scan
+    stucki            error diffusion over three rows, with a serpentine scan
+
+Ordered dithering treats every pixel independently, so it runs as a handful of NumPy
+array operations ending in one table lookup. Error diffusion is inherently serial along a row; the error carried to
+the rows below is applied with array operations once a row is done, so only the
+neighbours to the right are updated pixel by pixel.
+
+Engines can be added with `register_dither_engine`.
+"""
+
+import logging
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+from utils.palette import as_palette
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DITHER_ENGINE = "pil"
+
+# (dx, dy, weight) entries and the divisor of each error diffusion kernel
+ERROR_DIFFUSION_KERNELS = {
+    "floyd-steinberg": ([(1, 0, 7), (-1, 1, 3), (0, 1, 5), (1, 1, 1)], 16),
+    "atkinson": ([(1, 0, 1), (2, 0, 1), (-1, 1, 1), (0, 1, 1), (1, 1, 1), (0, 2, 1)], 8),
+    "stucki": ([(1, 0, 8), (2, 0, 4),
+                (-2, 1, 2), (-1, 1, 4), (0, 1, 8), (1, 1, 4), (2, 1, 2),
+                (-2, 2, 1), (-1, 2, 2), (0, 2, 4), (1, 2, 2), (2, 2, 1)], 42),
+}
+
+BLUE_NOISE_SIZE = 64
+
+def palette_image(palette):
+    """Returns a "P" image carrying the palette, padded to 256 entries with its first color."""
+    image = Image.new("P", (1, 1))
+    entries = [channel for color in palette for channel in color]
+    image.putpalette(entries + list(palette[0]) * (256 - len(palette)))
+    return image
+
+def to_palette_image(indices, palette):
+    """Returns the indices as a "P" image drawn in the palette's nominal colors."""
+    height, width = indices.shape
+    image = Image.frombytes("P", (width, height), np.ascontiguousarray(indices).tobytes())
+    image.putpalette(palette_image(palette.colors).getpalette())
+    return image
+
+def bayer_matrix(size):
+    """Returns the size x size Bayer threshold matrix normalized to [0, 1)."""
+    matrix = np.zeros((1, 1), dtype=np.float32)
+    while matrix.shape[0] < size:
+        matrix = np.block([[4 * matrix, 4 * matrix + 2], [4 * matrix + 3, 4 * matrix + 1]])
+    return (matrix + 0.5) / matrix.size
+
+@lru_cache(maxsize=1)
+def blue_noise_matrix(size=BLUE_NOISE_SIZE, seed=7):
+    """Returns a tileable blue-noise threshold map normalized to [0, 1).
+
+    White noise is high-pass filtered in the frequency domain and rank-ordered, which
+    gives evenly spread thresholds without the cost of void-and-cluster at startup.
+    """
+    rng = np.random.default_rng(seed)
+    noise = rng.random((size, size))
+    frequencies = np.fft.fftfreq(size)
+    radius = np.sqrt(frequencies[:, None] ** 2 + frequencies[None, :] ** 2)
+    high_pass = 1 - np.exp(-(radius / 0.2) ** 2)
+    for _ in range(3):
+        noise = np.real(np.fft.ifft2(np.fft.fft2(noise) * high_pass))
+        # rank-order back to a uniform distribution before the next pass
+        noise = np.argsort(np.argsort(noise, axis=None)).reshape(size, size) / noise.size
+    return (noise + 0.5 / noise.size).astype(np.float32)
+
+def ordered_dither(image, palette, threshold_map):
+    pixels = np.asarray(image.convert("RGB"), dtype=np.float32)
+    height, width = pixels.shape[:2]
+    tile_height, tile_width = threshold_map.shape
+    thresholds = np.tile(threshold_map, (height // tile_height + 1, width // tile_width + 1))[:height, :width]
+    # spread the offsets over the typical distance between palette levels
+    spread = 255 / max(len(palette) ** (1 / 3), 1)
+    pixels += ((thresholds - 0.5) * spread)[..., None]
+    return to_palette_image(palette.map(pixels), palette)
+
+def nearest_dither(image, palette):
+    """Maps every pixel to its nearest palette color without dithering."""
+    return to_palette_image(palette.map(np.asarray(image.convert("RGB"))), palette)
+
+def error_diffusion_dither(image, palette, kernel, divisor, serpentine=True):
+    pixels = np.asarray(image.convert("RGB"), dtype=np.float32).copy()
+    height, width = pixels.shape[:2]
+    # the error is what the panel will actually show, so diffuse against the measured colors
+    colors = [tuple(float(c) for c in color) for color in palette.measured]
+    lut = palette.lut().tobytes()
+    bits = palette.lut_bits
+    shift = 8 - bits
+    row_kernel = [(dx, weight / divisor) for dx, dy, weight in kernel if dy == 0]
+    below_kernel = [(dx, dy, weight / divisor) for dx, dy, weight in kernel if dy > 0]
+    indices = np.zeros((height, width), dtype=np.uint8)
+    errors = np.zeros((width, 3), dtype=np.float32)
+
+    for y in range(height):
+        reverse = serpentine and y % 2 == 1
+        row = pixels[y].tolist()
+        row_indices = [0] * width
+        row_errors = [None] * width
+        xs = range(width - 1, -1, -1) if reverse else range(width)
+        direction = -1 if reverse else 1
+
+        for x in xs:
+            # clamp before taking the error, out of gamut colors would otherwise pile it up
+            r, g, b = (0.0 if c < 0 else 255.0 if c > 255 else c for c in row[x])
+            best = lut[(((int(r) >> shift) << bits | (int(g) >> shift)) << bits) | (int(b) >> shift)]
+            row_indices[x] = best
+            pr, pg, pb = colors[best]
+            er, eg, eb = r - pr, g - pg, b - pb
+            row_errors[x] = (er, eg, eb)
+            for dx, weight in row_kernel:
+                nx = x + dx * direction
+                if 0 <= nx < width:
+                    pixel = row[nx]
+                    row[nx] = [pixel[0] + er * weight, pixel[1] + eg * weight, pixel[2] + eb * weight]
+
+        indices[y] = row_indices
+        # carry the row's error to the rows below in bulk, mirrored on reversed rows
+        errors[:] = row_errors
+        for dx, dy, weight in below_kernel:
+            if y + dy >= height:
+                continue
+            shift_x = -dx if reverse else dx
+            target = pixels[y + dy]
+            if shift_x >= 0:
+                target[shift_x:] += errors[:width - shift_x] * weight
+            else:
+                target[:shift_x] += errors[-shift_x:] * weight
+
+    return to_palette_image(indices, palette)
+
+def pil_dither(image, palette):
+    # Pillow matches colors in RGB, against the measured colors like the other engines
+    quantized = image.convert("RGB").quantize(colors=len(palette), palette=palette_image(palette.measured),
+                                              dither=Image.Dither.FLOYDSTEINBERG)
+    quantized.putpalette(palette_image(palette.colors).getpalette())
+    return quantized
+
+DITHER_ENGINES = {
+    "pil": pil_dither,
+    "none": nearest_dither,
+    "bayer": lambda image, palette: ordered_dither(image, palette, bayer_matrix(8)),
+    "blue-noise": lambda image, palette: ordered_dither(image, palette, blue_noise_matrix()),
+}
+for _name, (_kernel, _divisor) in ERROR_DIFFUSION_KERNELS.items():
+    DITHER_ENGINES[_name] = lambda image, palette, kernel=_kernel, divisor=_divisor: \
+        error_diffusion_dither(image, palette, kernel, divisor)
+
+def register_dither_engine(name, engine):
+    """Adds an engine, a callable taking an image and a Palette and returning a "P" image."""
+    DITHER_ENGINES[name] = engine
+
+def dither_image(image, palette, engine=None):
+    """Maps an image onto a Palette, or a list of colors, with the named engine, falling back to the default."""
+    engine = engine or DEFAULT_DITHER_ENGINE
+    if engine not in DITHER_ENGINES:
+        logger.warning(f"Unknown dither engine '{engine}', using {DEFAULT_DITHER_ENGINE}")
+        engine = DEFAULT_DITHER_ENGINE
+    return DITHER_ENGINES[engine](image, as_palette(palette))
@@ -0,0 +1,119 @@
+"""
+Delta encoding of packed display frames for remote clients.
+
+A client that already holds a frame sends its hash and receives only the rectangles of the
+packed buffer that changed, instead of the whole buffer. Consecutive changed rows are
+grouped into a band and each band is sent as one rectangle spanning the changed bytes.
+
+Format (version 1, little endian):
+
+    header     magic b"IKDL", version u8, reserved u8, row bytes u16, rows u16, rectangle count u16
+    rectangle  x (byte offset in the row) u16, y u16, width in bytes u16, height u16,
+               followed by width * height bytes, row by row
+"""
+
+import struct
+import threading
+from collections import OrderedDict
+
+DELTA_MAGIC = b"IKDL"
+DELTA_VERSION = 1
+DELTA_HEADER = struct.Struct("<4sBBHHH")
+DELTA_RECTANGLE = struct.Struct("<HHHH")
+
+# Send the full frame when the delta would be larger than this share of it
+DEFAULT_MAX_DELTA_RATIO = 0.5
+DEFAULT_HISTORY_FRAMES = 4
+
+def changed_span(old_row, new_row):
+    """Returns the first and last index of the bytes that differ between two rows, or None."""
+    if old_row == new_row:
+        return None
+    diff = int.from_bytes(old_row, "big") ^ int.from_bytes(new_row, "big")
+    first = len(new_row) - (diff.bit_length() + 7) // 8
+    last = len(new_row) - 1 - ((diff & -diff).bit_length() - 1) // 8
+    return first, last
+
+def changed_rectangles(old, new, row_bytes):
+    """Returns (x, y, width, height) rectangles, in bytes and rows, covering every change."""
+    rectangles = []
+    band = None
+    for y in range(len(new) // row_bytes):
+        start = y * row_bytes
+        span = changed_span(old[start:start + row_bytes], new[start:start + row_bytes])
+        if span is None:
+            if band:
+                rectangles.append(band)
+                band = None
+        elif band is None:
+            band = [span[0], y, span[1], y]
+        else:
+            band = [min(band[0], span[0]), band[1], max(band[2], span[1]), y]
+    if band:
+        rectangles.append(band)
+    return [(x0, y0, x1 - x0 + 1, y1 - y0 + 1) for x0, y0, x1, y1 in rectangles]
+
+def encode_delta(old, new, row_bytes):
+    """Returns the delta turning the packed frame old into new, or None if their layouts differ."""
+    if len(old) != len(new) or row_bytes <= 0 or len(new) % row_bytes:
+        return None
+    rectangles = changed_rectangles(old, new, row_bytes)
+    parts = [DELTA_HEADER.pack(DELTA_MAGIC, DELTA_VERSION, 0, row_bytes, len(new) // row_bytes, len(rectangles))]
+    for x, y, width, height in rectangles:
+        parts.append(DELTA_RECTANGLE.pack(x, y, width, height))
+        for row in range(y, y + height):
+            start = row * row_bytes + x
+            parts.append(new[start:start + width])
+    return b"".join(parts)
+
+def apply_delta(base, delta):
+    """Reference decoder: applies a delta to the packed frame it was encoded against."""
+    magic, version, _, row_bytes, rows, count = DELTA_HEADER.unpack_from(delta)
+    if magic != DELTA_MAGIC or version != DELTA_VERSION:
+        raise ValueError("Not a version 1 frame delta")
+    if len(base) != row_bytes * rows:
+        raise ValueError("Delta doesn't match the base frame's size")
+
+    frame = bytearray(base)
+    offset = DELTA_HEADER.size
+    for _ in range(count):
+        x, y, width, height = DELTA_RECTANGLE.unpack_from(delta, offset)
+        offset += DELTA_RECTANGLE.size
+        for row in range(y, y + height):
+            start = row * row_bytes + x
+            frame[start:start + width] = delta[offset:offset + width]
+            offset += width
+    return bytes(frame)
+
+class FrameHistory:
+    """Keeps the packed buffers of the most recently served frames, keyed by frame hash."""
+
+    def __init__(self, max_frames=DEFAULT_HISTORY_FRAMES):
+        self.max_frames = max_frames
+        self.frames = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, frame_key):
+        with self.lock:
+            packed = self.frames.get(frame_key)
+            if packed is not None:
+                self.frames.move_to_end(frame_key)
+            return packed
+
+    def add(self, frame_key, packed):
+        with self.lock:
+            self.frames[frame_key] = packed
+            self.frames.move_to_end(frame_key)
+            while len(self.frames) > self.max_frames:
+                self.frames.popitem(last=False)
+
+    def delta(self, base_key, frame_key, row_bytes, max_ratio=DEFAULT_MAX_DELTA_RATIO):
+        """Returns the delta from a stored base frame to a stored frame, or None if a full frame
+        should be sent because the base is unknown or the delta isn't small enough."""
+        base, packed = self.get(base_key), self.get(frame_key)
+        if base is None or packed is None:
+            return None
+        delta = encode_delta(base, packed, row_bytes)
+        if delta is None or len(delta) > len(packed) * max_ratio:
+            return None
+        return delta
@@ -0,0 +1,75 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Each listener holds a server thread while it waits, so their number is bounded
+DEFAULT_MAX_LISTENERS = 2
+
+class FrameNotifier:
+    """Tells waiting clients when a new frame is committed, keyed by the frame's content hash.
+
+    Remote displays either hold a Server-Sent Events stream or long-poll with the hash of
+    the frame they have, and fetch the frame only once the hash changes.
+
+    Attributes:
+        frame_key (str): Content hash of the current frame, or None before the first frame.
+        max_listeners (int): Number of clients that may wait at the same time.
+        commit_lock (threading.Lock): Held while a frame is written and published, so readers
+            holding it see a file that matches frame_key.
+    """
+
+    def __init__(self, frame_key=None, max_listeners=DEFAULT_MAX_LISTENERS):
+        self.frame_key = frame_key
+        self.max_listeners = max_listeners
+        self.condition = threading.Condition()
+        self.commit_lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_listeners)
+        self.closed = False
+
+    def current(self):
+        with self.condition:
+            return self.frame_key
+
+    def publish(self, frame_key):
+        """Records a newly committed frame and wakes every waiting client if it changed."""
+        with self.condition:
+            if frame_key == self.frame_key:
+                return
+            logger.debug(f"Publishing frame {frame_key}")
+            self.frame_key = frame_key
+            self.condition.notify_all()
+
+    def wait_for_change(self, known_key, timeout):
+        """Blocks until the current frame differs from known_key or the timeout elapses.
+
+        Returns:
+            str: The current frame hash, equal to known_key on timeout.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame_key != known_key or self.closed, timeout)
+            return self.frame_key
+
+    def acquire_listener(self):
+        """Reserves one of the listener slots, returning False if they are all taken."""
+        return self.slots.acquire(blocking=False)
+
+    def release_listener(self):
+        self.slots.release()
+
+    @contextmanager
+    def listener_slot(self):
+        """Reserves a listener slot for the block, yielding False if they are all taken."""
+        acquired = self.acquire_listener()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.release_listener()
+
+    def close(self):
+        """Releases every waiting client, for shutting down the server."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
@@ -0,0 +1,389 @@
+"""
+Storage for rendered frames (plugin instance images and the current display image).
+
+Frames are written once into a blob directory keyed by a hash of their pixels and then
+hard-linked to their destination, so a frame that's saved again, or saved under several
+names (the instance image and the current image), is only encoded once. Where hard links
+aren't possible the blob is copied instead, and the store records which blobs its
+destinations hold so copied blobs aren't pruned while in use. Encoding favours
+speed over size since frames are rewritten on every refresh:
+
+    png  - PNG with a low zlib compression level
+    qoi  - lossless QOI, when the installed Pillow can write it
+    raw  - uncompressed pixels behind a small header, loaded through mmap without decoding
+
+When a thumbnail directory is configured, small WebP (or JPEG) thumbnails are written next
+to each new frame, named after the frame's hash so they can be cached by clients forever.
+"""
+
+import os
+import re
+import mmap
+import uuid
+import time
+import struct
+import shutil
+import hashlib
+import logging
+import threading
+from io import BytesIO
+from collections import OrderedDict
+
+from PIL import Image, features
+
+from utils.cache_utils import PersistentDict
+
+logger = logging.getLogger(__name__)
+
+FRAME_FORMATS = ("png", "qoi", "raw")
+FRAME_EXTENSIONS = {"png": ".png", "qoi": ".qoi", "raw": ".frame"}
+DEFAULT_FRAME_FORMAT = "png"
+DEFAULT_PNG_COMPRESS_LEVEL = 1
+DEFAULT_FRAME_CACHE_MB = 32
+DESTINATIONS_FILE = ".destinations.json"
+
+# Thumbnail widths by size name, the height follows the frame's aspect ratio
+THUMBNAIL_WIDTHS = {"small": 240, "medium": 640}
+THUMBNAIL_QUALITY = 80
+FRAME_KEY_PATTERN = re.compile(r"^[0-9a-f]{40}$")
+
+# magic, header version, width, height, mode (NUL padded)
+RAW_MAGIC = b"IKFR"
+RAW_VERSION = 1
+RAW_HEADER = struct.Struct("<4sHII8s")
+RAW_MODES = ("RGB", "RGBA", "L")
+
+def qoi_supported():
+    Image.init()
+    return "QOI" in Image.SAVE
+
+def write_raw_frame(image, path):
+    if image.mode not in RAW_MODES:
+        image = image.convert("RGB")
+    header = RAW_HEADER.pack(RAW_MAGIC, RAW_VERSION, image.width, image.height, image.mode.encode("ascii"))
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(image.tobytes())
+
+def read_raw_frame(path):
+    """Loads a raw frame by mapping the file instead of decoding it."""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, version, width, height, mode = RAW_HEADER.unpack_from(data)
+            if magic != RAW_MAGIC or version != RAW_VERSION:
+                raise ValueError(f"Not a raw frame file: {path}")
+            mode = mode.rstrip(b"\0").decode("ascii")
+            pixels = memoryview(data)[RAW_HEADER.size:]
+            try:
+                # a single copy out of the mapping, no decoding
+                return Image.frombytes(mode, (width, height), pixels)
+            finally:
+                pixels.release()
+
+def thumbnail_format():
+    """Returns the file extension and Pillow format used for thumbnails."""
+    if features.check("webp"):
+        return "webp", "WEBP"
+    return "jpg", "JPEG"
+
+def is_raw_frame(path):
+    with open(path, "rb") as f:
+        return f.read(len(RAW_MAGIC)) == RAW_MAGIC
+
+def file_signature(path):
+    """Returns a cheap signature of a file that changes when it's replaced, or None if it's missing."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+class FrameCache:
+    """Memory-budgeted LRU of decoded frames, keyed by path and validated by frame hash and file signature.
+
+    Entries also keep the frame's PNG bytes once they were requested, so the web UI can
+    serve instance images without reading them from disk.
+
+    Attributes:
+        max_bytes (int): Memory budget for decoded pixels and PNG bytes.
+        size_bytes (int): Memory used by the cached entries.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_FRAME_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _entry_size(entry):
+        image = entry["image"]
+        return image.width * image.height * len(image.getbands()) + len(entry.get("png") or b"")
+
+    def get(self, path):
+        """Returns the cache entry for path if the file wasn't replaced since it was cached."""
+        signature = file_signature(path)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None:
+                return None
+            if entry["signature"] != signature:
+                self._remove(path)
+                return None
+            self.entries.move_to_end(path)
+            return entry
+
+    def put(self, path, frame_key, image, png=None):
+        entry = {"key": frame_key, "image": image, "png": png, "signature": file_signature(path)}
+        with self.lock:
+            self._remove(path)
+            size = self._entry_size(entry)
+            if size > self.max_bytes:
+                return entry
+            self.entries[path] = entry
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+        return entry
+
+    def set_png(self, path, png):
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None or entry.get("png") is not None:
+                return
+            entry["png"] = png
+            self.size_bytes += len(png)
+            while self.size_bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, path):
+        with self.lock:
+            self._remove(path)
+
+    def _remove(self, path):
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.size_bytes -= self._entry_size(entry)
+
+class FrameStore:
+    """Saves frames in a fast format, sharing identical frames through hard links.
+
+    Attributes:
+        blob_dir (str): Directory holding one encoded file per distinct frame. Must be on
+            the same filesystem as the destinations for hard links to work, otherwise the
+            encoded file is copied.
+        destinations (PersistentDict): The blob each destination holds and when it was saved.
+        frame_format (str): Default format, one of FRAME_FORMATS.
+        png_compress_level (int): zlib level used for PNG frames.
+        cache (FrameCache): Optional cache of decoded frames, filled on save and load.
+        thumbnail_dir (str): Optional directory for thumbnails of every saved frame.
+    """
+
+    def __init__(self, blob_dir, frame_format=DEFAULT_FRAME_FORMAT, png_compress_level=DEFAULT_PNG_COMPRESS_LEVEL,
+                 cache=None, thumbnail_dir=None):
+        if frame_format not in FRAME_FORMATS:
+            raise ValueError(f"Unsupported frame format: {frame_format}")
+        if frame_format == "qoi" and not qoi_supported():
+            logger.warning("Installed Pillow can't write QOI, storing frames as PNG")
+            frame_format = "png"
+        self.blob_dir = blob_dir
+        self.frame_format = frame_format
+        self.png_compress_level = png_compress_level
+        self.cache = cache
+        self.thumbnail_dir = thumbnail_dir
+        self.lock = threading.Lock()
+        os.makedirs(self.blob_dir, exist_ok=True)
+        # the blob, save time and file signature of every destination, by absolute path
+        self.destinations = PersistentDict(os.path.join(self.blob_dir, DESTINATIONS_FILE))
+        if self.thumbnail_dir:
+            os.makedirs(self.thumbnail_dir, exist_ok=True)
+
+    def frame_path(self, path, frame_format=None):
+        """Returns path with the extension of the frame format."""
+        return os.path.splitext(path)[0] + FRAME_EXTENSIONS[frame_format or self.frame_format]
+
+    def frame_paths(self, path):
+        """Returns the path in every frame format, for cleaning up after a format change."""
+        return [self.frame_path(path, frame_format) for frame_format in FRAME_FORMATS]
+
+    def save(self, image, path, frame_format=None):
+        """Saves the frame to path (with the format's extension) and returns the written path.
+
+        Encodes the frame only if an identical frame in the same format isn't stored yet.
+        """
+        frame_format = frame_format or self.frame_format
+        path = self.frame_path(path, frame_format)
+        key = self.frame_key(image, frame_format)
+        blob_path = os.path.join(self.blob_dir, key + FRAME_EXTENSIONS[frame_format])
+
+        with self.lock:
+            if not os.path.exists(blob_path):
+                tmp_path = os.path.join(self.blob_dir, f".{uuid.uuid4().hex}{FRAME_EXTENSIONS[frame_format]}")
+                self.encode(image, tmp_path, frame_format)
+                os.replace(tmp_path, blob_path)
+            else:
+                logger.debug(f"Reusing stored frame for {os.path.basename(path)}")
+            self.link(blob_path, path)
+            if self.thumbnail_dir:
+                self.write_thumbnails(image, key)
+            self.prune()
+        if self.cache is not None:
+            self.cache.put(path, key, image.copy())
+        return path
+
+    def load(self, path):
+        """Loads a frame written by save, in any of the frame formats."""
+        if self.cache is not None:
+            entry = self.cache.get(path)
+            if entry is not None:
+                return entry["image"].copy()
+
+        image = self.decode(path)
+        if self.cache is not None:
+            self.cache.put(path, None, image.copy())
+        return image
+
+    def load_png(self, path):
+        """Returns the frame at path as PNG bytes, from the cache when possible."""
+        entry = self.cache.get(path) if self.cache is not None else None
+        if entry is not None and entry.get("png") is not None:
+            return entry["png"]
+
+        image = entry["image"] if entry is not None else None
+        if path.endswith(FRAME_EXTENSIONS["png"]):
+            with open(path, "rb") as f:
+                png = f.read()
+        else:
+            image = image or self.decode(path)
+            buffer = BytesIO()
+            image.save(buffer, format="PNG", compress_level=self.png_compress_level)
+            png = buffer.getvalue()
+
+        if entry is not None:
+            self.cache.set_png(path, png)
+        elif self.cache is not None:
+            if image is None:
+                with Image.open(BytesIO(png)) as img:
+                    img.load()
+                    image = img.copy()
+            self.cache.put(path, None, image, png)
+        return png
+
+    def invalidate(self, path):
+        if self.cache is not None:
+            for frame_path in self.frame_paths(path):
+                self.cache.invalidate(frame_path)
+
+    def decode(self, path):
+        if is_raw_frame(path):
+            return read_raw_frame(path)
+        with Image.open(path) as img:
+            img.load()
+            return img.copy()
+
+    def frame_key(self, image, frame_format):
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{image.mode}:{image.width}x{image.height}:{frame_format}".encode("ascii"))
+        digest.update(image.tobytes())
+        if image.mode == "P":
+            digest.update(bytes(image.getpalette() or []))
+        return digest.hexdigest()
+
+    def encode(self, image, path, frame_format):
+        if frame_format == "raw":
+            write_raw_frame(image, path)
+        elif frame_format == "qoi":
+            image.save(path, format="QOI")
+        else:
+            image.save(path, format="PNG", compress_level=self.png_compress_level)
+
+    def link(self, blob_path, path):
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f".{uuid.uuid4().hex}.tmp")
+        linked = True
+        try:
+            os.link(blob_path, tmp_path)
+        except OSError:
+            # different filesystem or no hard link support
+            shutil.copyfile(blob_path, tmp_path)
+            linked = False
+        os.replace(tmp_path, path)
+        self.destinations.set(os.path.abspath(path), {"blob": os.path.basename(blob_path), "copied": not linked,
+                                                      "saved_at": time.time(), "signature": file_signature(path)})
+
+    def modified_time(self, path):
+        """Returns when a frame was last saved to path.
+
+        The file's own time can't be used: a hard-linked destination shares the time its blob
+        was first written, which is older than the save when an earlier frame is shown again.
+        """
+        mtime = os.path.getmtime(path)
+        entry = self.destinations.get(os.path.abspath(path))
+        # a file replaced behind the store's back is newer than its last save
+        return max(mtime, entry["saved_at"]) if entry else mtime
+
+    def frame_keys(self, paths):
+        """Returns the hash of the frame stored at each path, skipping paths without a stored frame."""
+        keys, inodes = {}, {}
+        for path in paths:
+            entry = self.cache.get(path) if self.cache is not None else None
+            if entry is not None and entry["key"]:
+                keys[path] = entry["key"]
+                continue
+            # the recorded blob, unless the file was replaced behind the store's back
+            destination = self.destinations.get(os.path.abspath(path))
+            if destination is not None and tuple(destination.get("signature") or ()) == file_signature(path):
+                keys[path] = os.path.splitext(destination["blob"])[0]
+                continue
+            try:
+                inodes[os.stat(path).st_ino] = path
+            except OSError:
+                continue
+        if inodes:
+            # hard-linked destinations share the inode of the blob named after the frame hash
+            for entry in os.scandir(self.blob_dir):
+                if not entry.name.startswith(".") and entry.inode() in inodes:
+                    keys[inodes[entry.inode()]] = os.path.splitext(entry.name)[0]
+        return keys
+
+    def thumbnail_path(self, frame_key, size):
+        """Returns the path of a frame's thumbnail, or None if the key or size is invalid."""
+        if not self.thumbnail_dir or size not in THUMBNAIL_WIDTHS or not FRAME_KEY_PATTERN.match(frame_key):
+            return None
+        extension, _ = thumbnail_format()
+        return os.path.join(self.thumbnail_dir, f"{frame_key}-{size}.{extension}")
+
+    def write_thumbnails(self, image, frame_key):
+        _, image_format = thumbnail_format()
+        for size, width in THUMBNAIL_WIDTHS.items():
+            path = self.thumbnail_path(frame_key, size)
+            if os.path.exists(path):
+                continue
+            thumbnail = image.convert("RGB")
+            thumbnail.thumbnail((width, width * 4), Image.Resampling.LANCZOS, reducing_gap=2.0)
+            tmp_path = os.path.join(self.thumbnail_dir, f".{uuid.uuid4().hex}.tmp")
+            thumbnail.save(tmp_path, format=image_format, quality=THUMBNAIL_QUALITY)
+            os.replace(tmp_path, path)
+
+    def prune(self):
+        """Removes stored frames, and their thumbnails, that are no longer linked from any destination.
+
+        Hard-linked frames are in use while their link count shows a destination; frames copied
+        to their destinations are in use while a recorded destination still exists.
+        """
+        copied = set()
+        for path, entry in self.destinations.items():
+            if not os.path.exists(path):
+                self.destinations.delete(path)
+            elif entry.get("copied"):
+                copied.add(entry["blob"])
+
+        for entry in os.scandir(self.blob_dir):
+            if entry.is_file() and not entry.name.startswith(".") and entry.name not in copied and entry.stat().st_nlink <= 1:
+                os.remove(entry.path)
+                if self.thumbnail_dir:
+                    for size in THUMBNAIL_WIDTHS:
+                        thumbnail = self.thumbnail_path(os.path.splitext(entry.name)[0], size)
+                        if thumbnail and os.path.exists(thumbnail):
+                            os.remove(thumbnail)
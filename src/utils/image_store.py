@@ -0,0 +1,200 @@
+import os
+import re
+import time
+import json
+import shutil
+import hashlib
+import logging
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+BLOB_KEY_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+STAGING_SUFFIX = ".upload"
+
+# Unreferenced files younger than this are kept, they may belong to an upload in progress
+DEFAULT_GRACE_SECONDS = 60 * 60
+DEFAULT_COLLECT_INTERVAL_SECONDS = 6 * 60 * 60
+
+def save_and_hash(file, path):
+    """Streams an uploaded file to path and returns the SHA-256 hex digest of its content."""
+    digest = hashlib.sha256()
+    stream = getattr(file, "stream", file)
+    with open(path, "wb") as out:
+        while chunk := stream.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+class ImageStore:
+    """Content-addressed store for uploaded files.
+
+    Each stored file lives at `<root>/<key>/<file name>`, where the key hashes the uploaded
+    content together with the parameters it was processed with. Uploading the same file with
+    the same parameters again reuses the stored file instead of processing it again. Files
+    are never deleted when a plugin instance goes away since other instances may reference
+    them; `collect_garbage` removes whatever no instance references anymore.
+
+    Attributes:
+        root_dir (str): Directory holding the stored files.
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+
+    @staticmethod
+    def blob_key(content_hash, params=None, extension=""):
+        """Returns the store key for content processed with the given parameters into a file type."""
+        key_data = json.dumps({"content": content_hash, "params": params, "extension": extension.lower()},
+                              sort_keys=True)
+        return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+    def find(self, key):
+        """Returns the path of the stored file for key, or None if it isn't stored."""
+        blob_dir = os.path.join(self.root_dir, key)
+        if not os.path.isdir(blob_dir):
+            return None
+        for name in os.listdir(blob_dir):
+            if not name.startswith("."):
+                return os.path.join(blob_dir, name)
+        return None
+
+    def path_for(self, content_hash, file_name, params=None):
+        """Returns the store path of content processed with the given parameters, without creating it."""
+        key = self.blob_key(content_hash, params, os.path.splitext(file_name)[1])
+        return os.path.join(self.root_dir, key, os.path.basename(file_name))
+
+    def reserve(self, content_hash, file_name, params=None):
+        """Returns the store path for an upload and whether a processed file already exists there.
+
+        An existing file is marked as recently used so it isn't collected before the upload
+        referencing it is saved.
+        """
+        path = self.path_for(content_hash, file_name, params)
+        existing = self.find(os.path.basename(os.path.dirname(path)))
+        if existing:
+            os.utime(os.path.dirname(existing))
+            return existing, True
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path, False
+
+    def collect_garbage(self, referenced_paths, grace_seconds=DEFAULT_GRACE_SECONDS):
+        """Deletes stored files and stale staging files that aren't referenced.
+
+        Only what the store created is deleted: the key directories and the staging files of
+        uploads. Other files in the directory, like uploads saved before the store existed,
+        are left alone.
+
+        Returns:
+            int: Number of bytes reclaimed.
+        """
+        if not os.path.isdir(self.root_dir):
+            return 0
+
+        referenced = {os.path.abspath(path) for path in referenced_paths}
+        referenced_dirs = {os.path.dirname(path) for path in referenced}
+        cutoff = time.time() - grace_seconds
+        reclaimed = 0
+
+        for entry in os.scandir(self.root_dir):
+            path = os.path.abspath(entry.path)
+            if entry.name == ".gitignore" or entry.stat().st_mtime > cutoff:
+                continue
+            if entry.is_dir() and BLOB_KEY_PATTERN.match(entry.name):
+                if path in referenced_dirs:
+                    continue
+                size = sum(f.stat().st_size for f in os.scandir(path) if f.is_file())
+                shutil.rmtree(path, ignore_errors=True)
+            elif entry.is_file() and is_staging_file(entry.name) and path not in referenced:
+                size = entry.stat().st_size
+                os.remove(path)
+            else:
+                continue
+            logger.info(f"Removed unreferenced upload {entry.name}")
+            reclaimed += size
+        return reclaimed
+
+def staging_file_name(file_name):
+    """Returns a unique name for staging an upload in the store directory."""
+    return f".{uuid.uuid4().hex}-{file_name}{STAGING_SUFFIX}"
+
+def is_staging_file(name):
+    return name.startswith(".") and name.endswith(STAGING_SUFFIX)
+
+def iter_setting_paths(value):
+    """Yields every string found in a (nested) plugin settings value."""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from iter_setting_paths(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from iter_setting_paths(item)
+
+def collect_referenced_paths(playlist_manager):
+    """Returns every string in the plugin instance settings, which covers all referenced file paths."""
+    paths = set()
+    for playlist in list(playlist_manager.playlists):
+        for plugin_instance in list(playlist.plugins):
+            paths.update(iter_setting_paths(dict(plugin_instance.settings)))
+    return paths
+
+class ImageStoreCollector:
+    """Periodically reclaims stored uploads that no plugin instance references, on a background thread."""
+
+    def __init__(self, image_store, device_config, interval=DEFAULT_COLLECT_INTERVAL_SECONDS,
+                 grace_seconds=DEFAULT_GRACE_SECONDS):
+        self.image_store = image_store
+        self.device_config = device_config
+        self.interval = interval
+        self.grace_seconds = grace_seconds
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Starts the background collection thread."""
+        if not self.thread or not self.thread.is_alive():
+            logger.info("Starting image store collector")
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stops the background collection thread."""
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread:
+            logger.info("Stopping image store collector")
+            self.thread.join()
+
+    def trigger(self):
+        """Requests a collection without waiting for the next interval."""
+        self.wake_event.set()
+
+    def _run(self):
+        while True:
+            self.wake_event.wait(self.interval)
+            self.wake_event.clear()
+            if self.stop_event.is_set():
+                break
+            try:
+                self.collect()
+            except Exception:
+                logger.exception("Failed to collect unreferenced uploads")
+
+    def collect(self):
+        # targets have playlists of their own, which may reference uploads the main display doesn't
+        playlist_managers = [self.device_config.get_playlist_manager()]
+        playlist_managers += [target.get_playlist_manager() for target in self.device_config.get_targets().values()]
+        referenced = set()
+        for playlist_manager in playlist_managers:
+            referenced |= collect_referenced_paths(playlist_manager)
+        reclaimed = self.image_store.collect_garbage(referenced, self.grace_seconds)
+        if reclaimed:
+            logger.info(f"Reclaimed {reclaimed / (1024 * 1024):.1f} MB of unreferenced uploads")
+        return reclaimed
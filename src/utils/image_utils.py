@@ -6,14 +6,17 @@ import logging
 import hashlib
 import tempfile
 import subprocess
+from utils import tracing
 
 logger = logging.getLogger(__name__)
 
-def get_image(image_url):
-    response = requests.get(image_url)
+def get_image(image_url, timeout=None):
+    response = requests.get(image_url, timeout=timeout)
     img = None
     if 200 <= response.status_code < 300 or response.status_code == 304:
-        img = Image.open(BytesIO(response.content))
+        with tracing.span("image_decode"):
+            img = Image.open(BytesIO(response.content))
+            img.load()
     else:
         logger.error(f"Received non-200 response from {image_url}: status_code: {response.status_code}")
     return img
@@ -133,7 +136,8 @@ def take_screenshot(target, dimensions, timeout_ms=None):
         ]
         if timeout_ms:
             command.append(f"--timeout={timeout_ms}")
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with tracing.span("chromium"):
+            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
         # Check if the process failed or the output file is missing
         if result.returncode != 0 or not os.path.exists(img_file_path):
@@ -142,7 +146,7 @@ def take_screenshot(target, dimensions, timeout_ms=None):
             return None
 
         # Load the image using PIL
-        with Image.open(img_file_path) as img:
+        with tracing.span("screenshot_load"), Image.open(img_file_path) as img:
             image = img.copy()
 
         # Remove image files
@@ -0,0 +1,139 @@
+"""
+Streaming, filtered log output for the log download.
+
+Journal records are formatted, filtered and optionally gzip compressed one at a time by
+generators, so memory use doesn't depend on how many records are read and the first
+bytes can be sent right away.
+
+InkyPi logs to stdout as `HH:MM:SS - LEVEL - logger - message` (see config/logging.conf),
+so the level and logger are read from the message. Lines that don't start a record, like
+the lines of a traceback, belong to the record before them and are kept or dropped with it.
+"""
+
+import logging
+import re
+import zlib
+from datetime import datetime
+
+# Lines written between flushes of the compressed stream, so clients see progress
+GZIP_FLUSH_LINES = 500
+GZIP_LEVEL = 6
+
+RECORD_PATTERN = re.compile(r"^\d{2}:\d{2}:\d{2} - (?P<level>[A-Z]+) - (?P<logger>\S+) - ")
+
+def format_journal_record(record):
+    """Formats a journal record like the journalctl default output."""
+    try:
+        ts = datetime.fromtimestamp(record.get_realtime_usec() / 1_000_000)
+        formatted_ts = ts.strftime("%b %d %H:%M:%S")
+    except Exception:
+        formatted_ts = "??? ?? ??:??:??"
+
+    data = record.data
+    hostname = data.get("_HOSTNAME", "unknown-host")
+    identifier = data.get("SYSLOG_IDENTIFIER") or data.get("_COMM", "?")
+    pid = data.get("_PID", "?")
+    msg = data.get("MESSAGE", "").rstrip()
+    return f"{formatted_ts} {hostname} {identifier}[{pid}]: {msg}", msg
+
+def iter_journal_entries(reader):
+    """Yields the (line, message) entries of a journal reader's records, closing the reader when
+    done or when the consumer stops early."""
+    try:
+        for record in reader:
+            yield format_journal_record(record)
+    finally:
+        reader.close()
+
+def parse_limit(value):
+    """Parses the line limit request argument, raising ValueError unless it's a positive integer."""
+    if value is None or value == "":
+        return None
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid limit: {value}")
+    if limit < 1:
+        raise ValueError(f"Limit must be at least 1: {value}")
+    return limit
+
+class LogFilter:
+    """Selects log records by minimum level, logger of a plugin and substring.
+
+    The substring is looked for in the first line of a record.
+
+    Attributes:
+        level (int): Minimum logging level, or None for all records.
+        plugin (str): Plugin id whose records are kept, or None for all records.
+        contains (str): Case-insensitive substring the line must contain, or None.
+    """
+
+    def __init__(self, level=None, plugin=None, contains=None):
+        self.level = level
+        self.plugin = plugin
+        self.contains = contains.lower() if contains else None
+        # output before the first record is only kept without filters
+        self._keep_following = not self.active
+
+    @classmethod
+    def from_args(cls, level=None, plugin=None, contains=None):
+        """Builds a filter from request arguments, raising ValueError for an unknown level."""
+        level_number = None
+        if level:
+            level_number = logging.getLevelName(level.upper())
+            if not isinstance(level_number, int):
+                raise ValueError(f"Unknown log level: {level}")
+        return cls(level_number, plugin or None, contains or None)
+
+    @property
+    def active(self):
+        return self.level is not None or self.plugin is not None or self.contains is not None
+
+    def matches(self, line, message):
+        """Returns whether to keep a line, given the formatted line and its message."""
+        match = RECORD_PATTERN.match(message)
+        if match is not None:
+            self._keep_following = self._matches_record(match) and (
+                self.contains is None or self.contains in line.lower())
+        # lines that don't start a record, like a traceback's, go with the record before them
+        return self._keep_following
+
+    def _matches_record(self, match):
+        if self.level is not None:
+            level = logging.getLevelName(match.group("level"))
+            if not isinstance(level, int) or level < self.level:
+                return False
+        if self.plugin is not None:
+            logger_name = match.group("logger")
+            if not (logger_name == f"plugins.{self.plugin}" or logger_name.startswith(f"plugins.{self.plugin}.")):
+                return False
+        return True
+
+def iter_log_lines(entries, log_filter=None, limit=None):
+    """Yields the lines of (line, message) entries passing the filter, newline terminated.
+
+    Stops after limit lines and notes that the output was truncated.
+    """
+    count = 0
+    for line, message in entries:
+        if log_filter is not None and not log_filter.matches(line, message):
+            continue
+        if limit is not None and count >= limit:
+            yield f"... truncated after {limit} lines\n"
+            return
+        count += 1
+        yield line + "\n"
+
+def gzip_stream(lines, flush_lines=GZIP_FLUSH_LINES, level=GZIP_LEVEL):
+    """Compresses text lines into a gzip stream, yielding compressed chunks as they are ready."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    pending = 0
+    for line in lines:
+        chunk = compressor.compress(line.encode("utf-8"))
+        pending += 1
+        if pending >= flush_lines:
+            chunk += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if chunk:
+            yield chunk
+    yield compressor.flush()
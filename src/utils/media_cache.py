@@ -0,0 +1,338 @@
+"""
+Persistent cache of dated media, like a picture of the day.
+
+Sources publishing one item a day (APOD, the Wikipedia picture of the day, newspaper front
+pages) are cached by (source, date): the item's metadata and its image, scaled down to what
+a display needs. Images are stored next to a JSON index in the cache directory, so they
+survive restarts.
+
+Two kinds of background fetches keep refreshes from waiting on the network:
+
+- the next day's item is prefetched shortly after it is published
+- a pool of items of random days is kept warm for plugins showing random days
+
+Background fetches run one at a time, and a refresh asking for an item that is being fetched
+waits for that fetch instead of starting another.
+"""
+
+import os
+import re
+import time
+import zlib
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, time as dt_time
+
+from PIL import Image
+
+from utils.cache_utils import PersistentDict, TTLCache
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+MEDIA_CACHE_DIR = "media"
+INDEX_FILE = "index.json"
+# Dated items kept, the least recently used are removed first. Pool items aren't counted.
+DEFAULT_MAX_ENTRIES = 60
+# Seconds before a failed prefetch of an item is tried again
+PREFETCH_RETRY_SECONDS = 30 * 60
+# Random days tried per missing pool item, some days have no usable item (e.g. a video)
+POOL_ATTEMPTS = 3
+JPEG_QUALITY = 90
+# Seconds between updates of an item's last use, each update rewrites the index
+USED_AT_RESOLUTION_SECONDS = 60 * 60
+# Locks serializing fetches of the same item, items are spread over this many locks
+KEY_LOCK_STRIPES = 16
+
+class MediaItem:
+    """A cached item.
+
+    Attributes:
+        source (str): Source of the item, e.g. "apod" or "newspaper/NYT".
+        day (date): Day the item was published for.
+        metadata (dict): JSON-serializable details, like the title.
+        image (PIL.Image): The item's image.
+    """
+
+    def __init__(self, source, day, metadata, image):
+        self.source = source
+        self.day = day
+        self.metadata = metadata
+        self.image = image
+
+class MediaCache:
+    """Cache of dated items of several sources, see the module docstring.
+
+    Fetch functions take a date and return a (metadata, image) tuple, raising an exception
+    when the item can't be fetched.
+
+    Images are scaled down so their shorter edge is the requested `min_edge`, enough to cover
+    a display whose longer edge is `min_edge` in either orientation. An item stored for a
+    smaller display is fetched again.
+
+    Attributes:
+        directory (str): Directory of the index and the images.
+        max_entries (int): Dated items kept.
+    """
+
+    def __init__(self, cache_dir, max_entries=DEFAULT_MAX_ENTRIES):
+        self.directory = os.path.join(cache_dir, MEDIA_CACHE_DIR)
+        self.index = PersistentDict(os.path.join(self.directory, INDEX_FILE))
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.key_locks = [threading.Lock() for _ in range(KEY_LOCK_STRIPES)]
+        self.pending = set()
+        self.failed = TTLCache()
+        self.executor = None
+
+    def get(self, source, day, min_edge=None):
+        """Returns the cached item, or None if it isn't cached or was stored for a smaller display."""
+        key = _key(source, day)
+        entry = self.index.get(key)
+        if entry is None or not _fits(entry, min_edge):
+            return None
+        image = self._load_image(key, entry)
+        if image is None:
+            return None
+        now = time.time()
+        if not entry.get("pool") and now - entry.get("used_at", 0) > USED_AT_RESOLUTION_SECONDS:
+            self.index.set(key, dict(entry, used_at=now))
+        return MediaItem(source, day, entry.get("metadata", {}), image)
+
+    def contains(self, source, day, min_edge=None):
+        """Returns whether the item is cached for displays of the given size."""
+        entry = self.index.get(_key(source, day))
+        return entry is not None and _fits(entry, min_edge)
+
+    def put(self, source, day, metadata, image, min_edge=None, pool=False):
+        """Stores an item, scaling its image down for displays of the given size."""
+        key = _key(source, day)
+        image, full = _scale_to_edge(image, min_edge)
+        if "A" in image.getbands() or image.mode == "P":
+            image_format, extension = "PNG", "png"
+            if image.mode not in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+        else:
+            image_format, extension = "JPEG", "jpg"
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+
+        os.makedirs(self.directory, exist_ok=True)
+        file_name = f"{_safe_name(source)}_{day.isoformat()}.{extension}"
+        tmp_path = os.path.join(self.directory, f".{file_name}.tmp")
+        save_args = {"quality": JPEG_QUALITY} if image_format == "JPEG" else {}
+        image.save(tmp_path, format=image_format, **save_args)
+        os.replace(tmp_path, os.path.join(self.directory, file_name))
+
+        previous = self.index.get(key)
+        if previous and previous.get("file") != file_name:
+            self._remove_file(previous)
+        self.index.set(key, {
+            "source": source,
+            "day": day.isoformat(),
+            "metadata": metadata,
+            "file": file_name,
+            "min_edge": min(image.size),
+            "full": full,
+            "pool": pool,
+            "used_at": time.time(),
+        })
+        if not pool:
+            self._evict()
+        return MediaItem(source, day, metadata, image)
+
+    def get_or_fetch(self, source, day, fetch, min_edge=None):
+        """Returns the cached item, fetching and storing it on a miss."""
+        item = self.get(source, day, min_edge)
+        if item is not None:
+            REGISTRY.inc("media_cache_hits")
+            return item
+        with self._key_lock(_key(source, day)):
+            # another thread may have fetched it while this one waited
+            item = self.get(source, day, min_edge)
+            if item is not None:
+                REGISTRY.inc("media_cache_hits")
+                return item
+            REGISTRY.inc("media_cache_misses")
+            logger.info(f"Fetching media. | source: {source} | day: {day.isoformat()}")
+            metadata, image = fetch(day)
+            return self.put(source, day, metadata, image, min_edge)
+
+    def prefetch(self, source, day, fetch, min_edge=None, at=None):
+        """Fetches an item in the background, at the given aware datetime or right away.
+
+        Returns:
+            The Future of the fetch when it was started, otherwise None, e.g. when the item
+            is cached, already scheduled, or failed recently.
+        """
+        key = _key(source, day)
+        if self.failed.get(key) or self.contains(source, day, min_edge):
+            return None
+        with self.lock:
+            if key in self.pending:
+                return None
+            self.pending.add(key)
+
+        delay = (at - datetime.now(timezone.utc)).total_seconds() if at is not None else 0
+        if delay > 0:
+            logger.info(f"Scheduled media prefetch. | source: {source} | day: {day.isoformat()} | at: {at.isoformat()}")
+            timer = threading.Timer(delay, self._submit, (self._prefetch, key, source, day, fetch, min_edge))
+            timer.daemon = True
+            timer.start()
+            return None
+        return self._submit(self._prefetch, key, source, day, fetch, min_edge)
+
+    def take_random(self, source, min_edge=None):
+        """Takes a random item of the source out of its pool, returning None if the pool is empty.
+
+        The item stays cached as a dated item.
+        """
+        keys = [key for key, entry in self.index.items()
+                if entry.get("pool") and entry.get("source") == source and _fits(entry, min_edge)]
+        while keys:
+            key = keys.pop(random.randrange(len(keys)))
+            entry = self.index.get(key)
+            if entry is None:
+                continue
+            image = self._load_image(key, entry)
+            if image is None:
+                continue
+            self.index.set(key, dict(entry, pool=False, used_at=time.time()))
+            self._evict()
+            REGISTRY.inc("media_cache_hits")
+            return MediaItem(source, datetime.strptime(entry["day"], "%Y-%m-%d").date(), entry.get("metadata", {}), image)
+        return None
+
+    def fill_pool(self, source, size, pick_day, fetch, min_edge=None):
+        """Fetches items of random days from `pick_day()` in the background until the source
+        has `size` pool items. Pool items of the source stored for a smaller display are removed
+        first, as they are never taken.
+
+        Returns:
+            The Future of the background fill, or None if the pool is full or being filled.
+        """
+        self._evict_pool(source, min_edge)
+        if self.pool_size(source, min_edge) >= size:
+            return None
+        pool_key = f"pool:{source}"
+        with self.lock:
+            if pool_key in self.pending:
+                return None
+            self.pending.add(pool_key)
+        return self._submit(self._fill_pool, pool_key, source, size, pick_day, fetch, min_edge)
+
+    def pool_size(self, source, min_edge=None):
+        return sum(1 for _, entry in self.index.items()
+                   if entry.get("pool") and entry.get("source") == source and _fits(entry, min_edge))
+
+    def _prefetch(self, key, source, day, fetch, min_edge):
+        try:
+            self.get_or_fetch(source, day, fetch, min_edge)
+            REGISTRY.inc("media_prefetches")
+        except Exception as e:
+            logger.warning(f"Media prefetch failed, retrying in {PREFETCH_RETRY_SECONDS} seconds. | source: {source} | day: {day.isoformat()} | error: {e}")
+            self.failed.set(key, True, PREFETCH_RETRY_SECONDS)
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+
+    def _fill_pool(self, pool_key, source, size, pick_day, fetch, min_edge):
+        try:
+            attempts = (size - self.pool_size(source, min_edge)) * POOL_ATTEMPTS
+            while attempts > 0 and self.pool_size(source, min_edge) < size:
+                attempts -= 1
+                day = pick_day()
+                key = _key(source, day)
+                if self.contains(source, day, min_edge):
+                    # already cached, as a dated or a pool item
+                    continue
+                try:
+                    with self._key_lock(key):
+                        metadata, image = fetch(day)
+                        self.put(source, day, metadata, image, min_edge, pool=True)
+                    REGISTRY.inc("media_prefetches")
+                except Exception as e:
+                    logger.warning(f"Failed to fetch media for the pool. | source: {source} | day: {day.isoformat()} | error: {e}")
+        finally:
+            with self.lock:
+                self.pending.discard(pool_key)
+
+    def _submit(self, function, *args):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="media-prefetch")
+            executor = self.executor
+        return executor.submit(function, *args)
+
+    def _key_lock(self, key):
+        # a fixed set of locks, so locks of items fetched once don't pile up
+        return self.key_locks[zlib.crc32(key.encode()) % len(self.key_locks)]
+
+    def _load_image(self, key, entry):
+        path = os.path.join(self.directory, entry["file"])
+        try:
+            with Image.open(path) as image:
+                image.load()
+                return image
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable cached media {path}: {e}")
+            self.index.delete(key)
+            return None
+
+    def _evict(self):
+        dated = sorted(((entry.get("used_at", 0), key, entry) for key, entry in self.index.items()
+                        if not entry.get("pool")), key=lambda item: item[0])
+        for _, key, entry in dated[:max(0, len(dated) - self.max_entries)]:
+            self.index.delete(key)
+            self._remove_file(entry)
+
+    def _evict_pool(self, source, min_edge):
+        for key, entry in self.index.items():
+            if entry.get("pool") and entry.get("source") == source and not _fits(entry, min_edge):
+                self.index.delete(key)
+                self._remove_file(entry)
+
+    def _remove_file(self, entry):
+        try:
+            os.remove(os.path.join(self.directory, entry["file"]))
+        except OSError:
+            pass
+
+def published_at(day, delay):
+    """Returns when the item of a day is published, `delay` (a timedelta) after the day starts in UTC."""
+    return datetime.combine(day, dt_time(0), timezone.utc) + delay
+
+def latest_published_day(delay, now=None):
+    """Returns the day of the newest item of a source publishing `delay` after each UTC day starts."""
+    return ((now or datetime.now(timezone.utc)) - delay).date()
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_media_cache(cache_dir):
+    """Returns the shared media cache of a cache directory."""
+    with _caches_lock:
+        cache = _caches.get(cache_dir)
+        if cache is None:
+            cache = _caches[cache_dir] = MediaCache(cache_dir)
+        return cache
+
+def _key(source, day):
+    return f"{source}/{day.isoformat()}"
+
+def _fits(entry, min_edge):
+    return min_edge is None or entry.get("full") or entry.get("min_edge", 0) >= min_edge
+
+def _scale_to_edge(image, min_edge):
+    """Scales the image down so its shorter edge is min_edge. Returns the image and whether it is full size."""
+    shorter = min(image.size)
+    if min_edge is None or shorter <= min_edge:
+        return image, True
+    scale = min_edge / shorter
+    size = (max(min_edge, round(image.width * scale)), max(min_edge, round(image.height * scale)))
+    return image.resize(size, Image.Resampling.LANCZOS), False
+
+def _safe_name(source):
+    return re.sub(r"[^A-Za-z0-9_-]", "_", source)
@@ -0,0 +1,201 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+from utils import tracing
+
+# Upper bounds (in seconds) of the latency histogram buckets. Chosen to cover
+# everything from a sub-millisecond hash up to a slow Chromium screenshot.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Number of recent observations kept per histogram for percentile estimates.
+RECENT_SAMPLES = 200
+
+METRIC_PREFIX = "inkypi"
+
+_context = threading.local()
+
+class Histogram:
+    """Latency histogram with cumulative buckets and a rolling window of recent samples.
+
+    Attributes:
+        buckets (tuple): Bucket upper bounds in seconds.
+        bucket_counts (list): Number of observations per bucket, the last entry is +Inf.
+        count (int): Total number of observations.
+        sum (float): Sum of all observed values.
+        recent (deque): The most recent observations, used for percentiles.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, recent_samples=RECENT_SAMPLES):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=recent_samples)
+
+    def observe(self, value):
+        """Record a single observation."""
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def percentile(self, pct):
+        """Returns the given percentile (0-100) over the recent samples, or None if empty."""
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "last": self.recent[-1] if self.recent else None,
+        }
+
+class MetricsRegistry:
+    """Thread-safe store of per-plugin, per-stage latency histograms and counters.
+
+    Histograms are keyed by (stage, plugin_id) and counters by (name, plugin_id). When no
+    plugin_id is given, the plugin set by `plugin_context` on the current thread is used.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, stage, seconds, plugin_id=None):
+        """Record a duration in seconds for the given stage."""
+        key = (stage, _resolve_plugin(plugin_id))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name, plugin_id=None, amount=1):
+        """Increment the named counter."""
+        key = (name, _resolve_plugin(plugin_id))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, stage, plugin_id=None):
+        """Context manager that records the duration of its block under the given stage.
+
+        The block is also recorded as a span of the current trace, see utils.tracing.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.observe(stage, end - start, plugin_id)
+            tracing.add_span(stage, start, end)
+
+    def reset(self):
+        """Clears all recorded metrics."""
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def snapshot(self):
+        """Returns recorded metrics as plain dictionaries, sorted by stage and plugin."""
+        with self.lock:
+            stages = [
+                {"stage": stage, "plugin_id": plugin_id, **histogram.to_dict()}
+                for (stage, plugin_id), histogram in sorted(self.histograms.items())
+            ]
+            counters = [
+                {"name": name, "plugin_id": plugin_id, "value": value}
+                for (name, plugin_id), value in sorted(self.counters.items())
+            ]
+        return {"stages": stages, "counters": counters}
+
+    def render_prometheus(self):
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            histogram_name = f"{METRIC_PREFIX}_stage_duration_seconds"
+            lines.append(f"# HELP {histogram_name} Duration of refresh pipeline stages.")
+            lines.append(f"# TYPE {histogram_name} histogram")
+            for (stage, plugin_id), histogram in sorted(self.histograms.items()):
+                labels = f'plugin="{_escape(plugin_id)}",stage="{_escape(stage)}"'
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'{histogram_name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{histogram_name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{histogram_name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{histogram_name}_count{{{labels}}} {histogram.count}")
+
+            for name in sorted({name for name, _ in self.counters}):
+                counter_name = f"{METRIC_PREFIX}_{name}_total"
+                lines.append(f"# TYPE {counter_name} counter")
+                for (counter, plugin_id), value in sorted(self.counters.items()):
+                    if counter == name:
+                        lines.append(f'{counter_name}{{plugin="{_escape(plugin_id)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+@contextmanager
+def plugin_context(plugin_id):
+    """Attributes metrics recorded on the current thread to the given plugin."""
+    previous = getattr(_context, "plugin_id", None)
+    _context.plugin_id = plugin_id
+    try:
+        yield
+    finally:
+        _context.plugin_id = previous
+
+@contextmanager
+def track_generate(registry=None):
+    """Records the `generate` and `data_fetch` stages around a plugin's generate_image call.
+
+    Data fetch is measured from the start of the block until the plugin starts rendering
+    (see `mark_render_start`), or the whole block for plugins that don't render HTML.
+    """
+    registry = registry or REGISTRY
+    start = time.perf_counter()
+    _context.render_start = None
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        render_start = getattr(_context, "render_start", None) or end
+        _context.render_start = None
+        registry.observe("data_fetch", render_start - start)
+        registry.observe("generate", end - start)
+        tracing.add_span("data_fetch", start, render_start)
+        tracing.add_span("generate", start, end)
+
+def mark_render_start():
+    """Marks the point where a plugin finished fetching data and started rendering."""
+    if getattr(_context, "render_start", None) is None:
+        _context.render_start = time.perf_counter()
+
+def current_plugin():
+    """Returns the plugin id set by `plugin_context` on the current thread, if any."""
+    return getattr(_context, "plugin_id", None)
+
+def _resolve_plugin(plugin_id):
+    if plugin_id is None:
+        plugin_id = current_plugin()
+    return plugin_id or ""
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# Shared registry used by the refresh pipeline and the web endpoints
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,82 @@
+"""
+Run-length compression for packed display frames (and frame deltas).
+
+E-ink frames are mostly large flat areas, which pack into long runs of one byte. The
+codec is PackBits with a small header, so a microcontroller can decode it in a few lines
+while streaming, without a window or dictionary:
+
+    header   magic b"IKRL", version u8, reserved u8, decoded length u32 (little endian)
+    control  c < 0x80: copy the next c + 1 bytes
+             c >= 0x80: repeat the next byte (c & 0x7F) + 3 times
+
+Decoder sketch:
+
+    while (out < end) {
+        c = *in++;
+        if (c < 0x80) { n = c + 1; memcpy(out, in, n); in += n; }
+        else { n = (c & 0x7F) + 3; memset(out, *in++, n); }
+        out += n;
+    }
+"""
+
+import re
+import struct
+
+RLE_MAGIC = b"IKRL"
+RLE_VERSION = 1
+RLE_HEADER = struct.Struct("<4sBBI")
+RLE_MIMETYPE = "application/x-inkypi-rle"
+
+MIN_RUN = 3
+MAX_RUN = 0x7F + MIN_RUN
+MAX_LITERAL = 0x80
+# runs of MIN_RUN or more identical bytes, found by the regex engine rather than a Python loop
+RUN_PATTERN = re.compile(rb"(.)\1{%d,}" % (MIN_RUN - 1), re.DOTALL)
+
+def _append_literals(out, data):
+    for start in range(0, len(data), MAX_LITERAL):
+        chunk = data[start:start + MAX_LITERAL]
+        out.append(len(chunk) - 1)
+        out += chunk
+
+def rle_encode(data):
+    """Compresses a packed buffer."""
+    out = bytearray(RLE_HEADER.pack(RLE_MAGIC, RLE_VERSION, 0, len(data)))
+    position = 0
+    for match in RUN_PATTERN.finditer(data):
+        start, end = match.span()
+        _append_literals(out, data[position:start])
+        value = data[start]
+        length = end - start
+        while length >= MIN_RUN:
+            run = min(length, MAX_RUN)
+            out += bytes((0x80 | (run - MIN_RUN), value))
+            length -= run
+        # a tail too short for a run is sent as literals
+        position = end - length
+        if length:
+            _append_literals(out, data[position:end])
+            position = end
+    _append_literals(out, data[position:])
+    return bytes(out)
+
+def rle_decode(data):
+    """Reference decoder, returns the packed buffer."""
+    magic, version, _, length = RLE_HEADER.unpack_from(data)
+    if magic != RLE_MAGIC or version != RLE_VERSION:
+        raise ValueError("Not a version 1 RLE frame")
+
+    out = bytearray()
+    position = RLE_HEADER.size
+    while len(out) < length and position < len(data):
+        control = data[position]
+        if control < 0x80:
+            count = control + 1
+            out += data[position + 1:position + 1 + count]
+            position += 1 + count
+        else:
+            out += bytes(data[position + 1:position + 2]) * ((control & 0x7F) + MIN_RUN)
+            position += 2
+    if len(out) != length:
+        raise ValueError("RLE frame is corrupt")
+    return bytes(out)
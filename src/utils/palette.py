@@ -0,0 +1,162 @@
+"""
+Display palettes and cached RGB to palette index lookup tables.
+
+A palette has two sets of colors: the nominal colors the panel is driven with (and that
+previews are drawn in), and the colors the panel actually shows, as measured. Nearest
+colors are found against the measured colors in OKLab, where distances follow perceived
+differences far better than in sRGB.
+
+Finding the nearest color per pixel is replaced by a lookup in a 3D table indexed by the
+top bits of each channel (64x64x64 by default). The table is built once per palette with
+NumPy and stored under the cache directory, so later starts just load it.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LUT_BITS = 6
+# bump when the table layout or color math changes, so stale tables are rebuilt
+LUT_VERSION = 1
+
+class Palette:
+    """A display's colors, in index order.
+
+    Attributes:
+        name (str): Palette name.
+        colors (list): Nominal (r, g, b) colors, used for output images and previews.
+        measured (list): (r, g, b) colors the panel actually shows, used for color matching
+            and error diffusion. Defaults to the nominal colors.
+        cache_dir (str): Directory for the lookup table, or None to build it in memory only.
+    """
+
+    def __init__(self, name, colors, measured=None, cache_dir=None, lut_bits=DEFAULT_LUT_BITS):
+        self.name = name
+        self.colors = [tuple(color) for color in colors]
+        self.measured = [tuple(color) for color in (measured or colors)]
+        if len(self.measured) != len(self.colors):
+            raise ValueError(f"Palette {name} has {len(self.colors)} colors but {len(self.measured)} measured colors")
+        self.cache_dir = cache_dir
+        self.lut_bits = lut_bits
+        self._lut = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.colors)
+
+    def lut_key(self):
+        data = json.dumps({"measured": self.measured, "bits": self.lut_bits, "version": LUT_VERSION})
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
+    def lut(self):
+        """Returns the (2^bits)^3 lookup table from quantized RGB to palette index."""
+        with self._lock:
+            if self._lut is None:
+                self._lut = self._load_or_build_lut()
+            return self._lut
+
+    def _load_or_build_lut(self):
+        path = None
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, f"palette_lut_{self.name}_{self.lut_key()}.npy")
+            if os.path.exists(path):
+                try:
+                    return np.load(path)
+                except (OSError, ValueError):
+                    logger.warning(f"Could not load palette table {path}, rebuilding it")
+
+        lut = build_lut(self.measured, self.lut_bits)
+        if path:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+            np.save(tmp_path, lut)
+            os.replace(tmp_path, path)
+            logger.info(f"Stored palette table for {self.name} at {path}")
+        return lut
+
+    def map(self, pixels):
+        """Returns the nearest palette index for every pixel of an (..., 3) array in [0, 255]."""
+        shift = 8 - self.lut_bits
+        pixels = np.clip(pixels, 0, 255).astype(np.uint8) >> shift
+        return self.lut()[pixels[..., 0], pixels[..., 1], pixels[..., 2]]
+
+def srgb_to_oklab(rgb):
+    """Converts an (..., 3) array of sRGB values in [0, 255] to OKLab."""
+    rgb = np.asarray(rgb, dtype=np.float64) / 255
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    lms = linear @ np.array([
+        [0.4122214708, 0.2119034982, 0.0883024619],
+        [0.5363325363, 0.6806995451, 0.2817188376],
+        [0.0514459929, 0.1073969566, 0.6299787005],
+    ])
+    lms = np.cbrt(lms)
+    return lms @ np.array([
+        [0.2104542553, 1.9779984951, 0.0259040371],
+        [0.7936177850, -2.4285922050, 0.7827717662],
+        [-0.0040720468, 0.4505937099, -0.8086757660],
+    ])
+
+def build_lut(colors, bits=DEFAULT_LUT_BITS):
+    """Builds the lookup table mapping each RGB cell's center to the nearest color in OKLab."""
+    size = 1 << bits
+    step = 256 // size
+    centers = np.arange(size) * step + step / 2
+    grid = np.stack(np.meshgrid(centers, centers, centers, indexing="ij"), axis=-1)
+    grid_lab = srgb_to_oklab(grid).astype(np.float32)
+    palette_lab = srgb_to_oklab(np.asarray(colors)).astype(np.float32)
+
+    lut = np.zeros((size, size, size), dtype=np.uint8)
+    best = np.full((size, size, size), np.inf, dtype=np.float32)
+    for index, color in enumerate(palette_lab):
+        distance = np.sum(np.square(grid_lab - color), axis=-1)
+        closer = distance < best
+        lut[closer] = index
+        best[closer] = distance[closer]
+    return lut
+
+# Nominal colors the panels are driven with, and the colors they show as measured
+PALETTES = {
+    "spectra6": {
+        "colors": [(0, 0, 0), (255, 255, 255), (0, 128, 0), (0, 0, 255), (255, 0, 0), (255, 255, 0)],
+        # black, white, green, blue, red, yellow as photographed on a Spectra 6 panel
+        "measured": [(25, 30, 33), (232, 232, 232), (18, 95, 32), (33, 87, 186), (178, 19, 24), (239, 222, 68)],
+    },
+    "acep7": {
+        "colors": [(0, 0, 0), (255, 255, 255), (0, 255, 0), (0, 0, 255), (255, 0, 0), (255, 255, 0), (255, 128, 0)],
+        # black, white, green, blue, red, yellow, orange as published for the 7 color ACeP panels
+        "measured": [(57, 48, 57), (255, 255, 255), (58, 91, 70), (61, 59, 94), (156, 72, 75), (208, 190, 71),
+                     (177, 106, 73)],
+    },
+    "mono": {
+        "colors": [(0, 0, 0), (255, 255, 255)],
+    },
+}
+
+_palettes = {}
+_palettes_lock = threading.Lock()
+
+def get_palette(name, cache_dir=None):
+    """Returns the shared Palette for a registered palette name."""
+    with _palettes_lock:
+        key = (name, cache_dir)
+        if key not in _palettes:
+            definition = PALETTES[name]
+            _palettes[key] = Palette(name, definition["colors"], definition.get("measured"), cache_dir)
+        return _palettes[key]
+
+def as_palette(palette):
+    """Wraps a plain list of colors in a Palette, leaving Palettes as they are."""
+    if isinstance(palette, Palette):
+        return palette
+    colors = tuple(tuple(color) for color in palette)
+    with _palettes_lock:
+        # keyed by the colors so their lookup table is only built once
+        if colors not in _palettes:
+            _palettes[colors] = Palette("custom", colors)
+        return _palettes[colors]
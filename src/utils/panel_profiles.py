@@ -0,0 +1,170 @@
+"""
+Panel profiles and the encoder producing device-ready frame buffers.
+
+A profile declares everything needed to turn an image into the bytes a panel expects:
+
+    width, height     native resolution, in the order the controller scans pixels out
+    rotation          counter-clockwise degrees (like Image.rotate) turning a frame into native
+                      scan order, 0, 90, 180 or 270
+    palette           name of the palette (see utils.palette) the frame is dithered onto
+    color_codes       the value the controller uses for each palette index, in palette order
+    bits_per_pixel    bits per pixel in each plane, 1, 2, 4 or 8
+    bit_order         "msb" when the first pixel of a byte is in its most significant bits
+    planes            1 for packed pixels, or the number of 1 bit planes the color codes are
+                      split into (bit 0 of each code in the first plane, and so on)
+    fixed_size        False for profiles that encode each frame at its own size and orientation
+                      instead of fitting it to width and height, like the packed frames of
+                      /api/current_image that remote displays unpack at the frame's size
+
+Every step of encoding, from color codes over rotation to bit packing, is a NumPy array
+operation. Multi-plane buffers are the planes one after another.
+
+The web API, the Waveshare driver and the Inky driver all encode through this module.
+"""
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from utils.dithering import dither_image
+from utils.palette import get_palette
+
+DEFAULT_REMOTE_PANEL_PROFILE = "spectra6"
+
+class PanelProfile:
+    """A panel's resolution, palette and frame buffer layout, see the module docstring."""
+
+    def __init__(self, name, width, height, palette, color_codes=None, bits_per_pixel=4, bit_order="msb",
+                 planes=1, rotation=0, fixed_size=True):
+        if bits_per_pixel not in (1, 2, 4, 8):
+            raise ValueError(f"Panel profile {name} has unsupported bits per pixel {bits_per_pixel}")
+        if rotation not in (0, 90, 180, 270):
+            raise ValueError(f"Panel profile {name} has unsupported rotation {rotation}")
+        if bit_order not in ("msb", "lsb"):
+            raise ValueError(f"Panel profile {name} has unknown bit order {bit_order}")
+        if planes > 1 and bits_per_pixel != 1:
+            raise ValueError(f"Panel profile {name} splits into planes, which are 1 bit per pixel")
+        self.name = name
+        self.width = width
+        self.height = height
+        self.palette = palette
+        self.color_codes = list(color_codes) if color_codes is not None else None
+        self.bits_per_pixel = bits_per_pixel
+        self.bit_order = bit_order
+        self.planes = planes
+        self.rotation = rotation
+        self.fixed_size = fixed_size
+
+    @property
+    def frame_size(self):
+        """The (width, height) frames are dithered at, before the native rotation."""
+        if self.rotation in (90, 270):
+            return (self.height, self.width)
+        return (self.width, self.height)
+
+    @property
+    def row_bytes(self):
+        """Bytes per row of each plane, rows are padded to whole bytes."""
+        return (self.width * self.bits_per_pixel + 7) // 8
+
+    def frame_row_bytes(self, frame_size):
+        """Bytes per row of each plane of the buffer encoding a frame of the given (width, height)."""
+        if self.fixed_size:
+            return self.row_bytes
+        width = frame_size[1] if self.rotation in (90, 270) else frame_size[0]
+        return (width * self.bits_per_pixel + 7) // 8
+
+    @property
+    def plane_bytes(self):
+        return self.row_bytes * self.height
+
+    @property
+    def buffer_bytes(self):
+        return self.plane_bytes * self.planes
+
+    def get_palette(self, cache_dir=None):
+        return get_palette(self.palette, cache_dir)
+
+    def fit(self, image):
+        """Returns the image at the frame size, turning frames of the other orientation first and
+        cropping others to the frame's aspect ratio. Profiles without a fixed size keep the image."""
+        if not self.fixed_size:
+            return image
+        width, height = self.frame_size
+        if image.size == (height, width) and width != height:
+            image = image.rotate(90, expand=True)
+        if image.size != (width, height):
+            image = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+        return image
+
+    def dither(self, image, engine=None, cache_dir=None):
+        """Fits the image and maps it onto the profile's palette, returning a "P" image of palette indices."""
+        return dither_image(self.fit(image), self.get_palette(cache_dir), engine)
+
+    def native_codes(self, dithered):
+        """Returns the controller's color codes of a dithered frame as a (height, width) array in scan order."""
+        indices = np.asarray(dithered, dtype=np.uint8)
+        if self.color_codes is not None:
+            codes = np.asarray(self.color_codes + [0] * (256 - len(self.color_codes)), dtype=np.uint8)
+            indices = codes[indices]
+        return np.ascontiguousarray(np.rot90(indices, self.rotation // 90))
+
+    def code_image(self, dithered):
+        """Returns a "P" image of the controller's color codes in scan order, for drivers taking images."""
+        codes = self.native_codes(dithered)
+        return Image.frombytes("P", (codes.shape[1], codes.shape[0]), codes.tobytes())
+
+    def encode(self, dithered):
+        """Returns the device-ready buffer of a dithered frame."""
+        codes = self.native_codes(dithered)
+        if self.fixed_size and codes.shape != (self.height, self.width):
+            raise ValueError(f"Frame of {codes.shape[1]}x{codes.shape[0]} doesn't fit panel profile {self.name}")
+        if self.planes == 1:
+            return pack_pixels(codes, self.bits_per_pixel, self.bit_order)
+        return b"".join(pack_pixels((codes >> plane) & 1, 1, self.bit_order) for plane in range(self.planes))
+
+    def split_planes(self, buffer):
+        """Returns the planes of an encoded buffer."""
+        return [buffer[plane * self.plane_bytes:(plane + 1) * self.plane_bytes] for plane in range(self.planes)]
+
+    def encode_image(self, image, engine=None, cache_dir=None):
+        """Fits, dithers and encodes an image."""
+        return self.encode(self.dither(image, engine, cache_dir))
+
+def pack_pixels(values, bits_per_pixel, bit_order="msb"):
+    """Packs a (height, width) array of values below 2 ** bits_per_pixel into bytes, row by row."""
+    height, width = values.shape
+    per_byte = 8 // bits_per_pixel
+    if per_byte == 1:
+        return values.astype(np.uint8).tobytes()
+    # pad each row to whole bytes
+    padded_width = -(-width // per_byte) * per_byte
+    if padded_width != width:
+        values = np.pad(values, ((0, 0), (0, padded_width - width)))
+    groups = values.astype(np.uint8).reshape(height, padded_width // per_byte, per_byte)
+    shifts = np.arange(per_byte, dtype=np.uint8) * bits_per_pixel
+    if bit_order == "msb":
+        shifts = shifts[::-1]
+    return np.bitwise_or.reduce(groups << shifts, axis=-1).astype(np.uint8).tobytes()
+
+PANEL_PROFILES = {}
+
+def register_panel_profile(profile):
+    """Adds a profile, replacing any profile of the same name."""
+    PANEL_PROFILES[profile.name] = profile
+    return profile
+
+def get_panel_profile(name):
+    """Returns the registered profile, or None."""
+    return PANEL_PROFILES.get(name)
+
+# the packed frame served to remote displays by /api/current_image, at the frame's own size
+register_panel_profile(PanelProfile("spectra6", 800, 480, "spectra6", fixed_size=False))
+# Waveshare 7.3" Spectra 6 (E), its controller skips code 4
+register_panel_profile(PanelProfile("epd7in3e", 800, 480, "spectra6", color_codes=[0, 1, 6, 5, 3, 2]))
+# Waveshare 7.3" 7 color ACeP (F)
+register_panel_profile(PanelProfile("epd7in3f", 800, 480, "acep7"))
+# Waveshare 7.5" black and white (V2), black pixels are set bits
+register_panel_profile(PanelProfile("epd7in5_V2", 800, 480, "mono", color_codes=[1, 0], bits_per_pixel=1))
+# Pimoroni Inky Impression 7.3", the 7 color and the Spectra 6 (2025) editions
+register_panel_profile(PanelProfile("inky-impression-7.3", 800, 480, "acep7"))
+register_panel_profile(PanelProfile("inky-impression-7.3-spectra", 800, 480, "spectra6", color_codes=[0, 1, 6, 5, 3, 2]))
@@ -0,0 +1,288 @@
+"""
+Sampling profiler of all threads of the running process.
+
+The thread running a profile reads the Python stack of every other thread with
+`sys._current_frames()` at a fixed interval, so the refresh thread, the waitress workers and the render workers are
+all profiled without restarting the service or instrumenting code. Each sample costs a walk
+of the stacks and nothing is done between samples, which keeps the overhead low enough for
+a running device.
+
+Identical stacks are counted rather than stored, and the result is written as collapsed
+stacks (one `thread;outer;...;inner count` line per stack, for flamegraph.pl and speedscope)
+or as a speedscope document with a profile per thread.
+
+Threads waiting for work, on a lock, condition or socket, are left out unless asked for,
+since they would otherwise fill most of the samples of an idle pool.
+
+Profiles requested over HTTP run on their own thread (see start_profile) and are fetched
+once finished, so a long profile doesn't hold one of the web server's few threads.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 0.01
+MAX_STACK_DEPTH = 128
+
+# Innermost frames of threads that are waiting, as (file name, function) pairs
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("socket.py", "accept"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("wasyncore.py", "poll"),
+}
+
+class SamplingProfiler:
+    """Samples the stacks of all threads but its own.
+
+    Attributes:
+        interval (float): Seconds between samples.
+        include_idle (bool): Whether to keep samples of waiting threads.
+        stacks (Counter): Number of samples per (thread name, stack) pair.
+        samples (int): Number of times the threads were sampled.
+        duration (float): Seconds spent sampling.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, include_idle=False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks = Counter()
+        self.samples = 0
+        self.duration = 0.0
+        self._labels = {}
+        self._thread_names = {}
+
+    def sample(self):
+        """Records the current stack of every thread."""
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            if not self.include_idle and _is_idle(frame):
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[(self._thread_name(thread_id), tuple(stack))] += 1
+        self.samples += 1
+
+    def run(self, seconds=None, until=None):
+        """Samples on the current thread for the given seconds, or until `until()` returns True.
+
+        Samples are taken on a fixed schedule, samples due while running late are skipped.
+        """
+        start = time.perf_counter()
+        deadline = start + seconds if seconds is not None else None
+        next_sample = start
+        while True:
+            now = time.perf_counter()
+            if (deadline is not None and now >= deadline) or (until is not None and until()):
+                break
+            if now < next_sample:
+                time.sleep(next_sample - now)
+                continue
+            self.sample()
+            next_sample += self.interval
+            if next_sample < now:
+                next_sample = now + self.interval
+        self.duration += time.perf_counter() - start
+
+    def to_collapsed(self):
+        """Returns the samples as collapsed stacks, the most frequent first."""
+        return "".join(f"{';'.join((thread_name,) + stack)} {count}\n"
+                       for (thread_name, stack), count in self.stacks.most_common())
+
+    def to_speedscope(self, name="InkyPi"):
+        """Returns the samples as a speedscope document, with a profile per thread."""
+        frames = []
+        frame_index = {}
+        profiles = {}
+        for (thread_name, stack), count in sorted(self.stacks.items()):
+            indices = []
+            for label in stack:
+                if label not in frame_index:
+                    frame_index[label] = len(frames)
+                    frames.append(_speedscope_frame(label))
+                indices.append(frame_index[label])
+            profile = profiles.setdefault(thread_name, {"samples": [], "weights": []})
+            profile["samples"].append(indices)
+            profile["weights"].append(count * self.interval)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "inkypi",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": thread_name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(profile["weights"]),
+                "samples": profile["samples"],
+                "weights": profile["weights"],
+            } for thread_name, profile in sorted(profiles.items())],
+        }
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _thread_name(self, thread_id):
+        name = self._thread_names.get(thread_id)
+        if name is None:
+            # names of new threads are looked up once
+            self._thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            name = self._thread_names.setdefault(thread_id, f"thread {thread_id}")
+        return name
+
+def profile_next_refresh(profiler, tracer, timeout, max_seconds):
+    """Samples from the start of the next traced refresh until it and any refresh running
+    alongside it have finished (see utils.tracing).
+
+    Args:
+        profiler (SamplingProfiler): The profiler to sample with.
+        tracer (Tracer): The tracer the refresh tasks trace into.
+        timeout (float): Seconds to wait for a refresh to start.
+        max_seconds (float): Seconds to sample at most.
+
+    Returns:
+        list: The traces of the profiled refreshes, empty if none started within the timeout.
+    """
+    traced = {}
+
+    def refresh_started():
+        for trace in tracer.get_active():
+            traced[trace.id] = trace
+        return bool(traced)
+
+    deadline = time.perf_counter() + timeout
+    while not refresh_started() and time.perf_counter() < deadline:
+        time.sleep(profiler.interval)
+    if not traced:
+        return []
+
+    def refreshes_finished():
+        active = tracer.get_active()
+        for trace in active:
+            traced[trace.id] = trace
+        return not active
+
+    profiler.run(max_seconds, until=refreshes_finished)
+    return [trace for _, trace in sorted(traced.items())]
+
+def _is_idle(frame):
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+def _short_path(path):
+    """Shortens a path to the part after site-packages or the source directory, or to the file name."""
+    for marker in ("site-packages" + os.sep, "dist-packages" + os.sep, os.sep + "src" + os.sep):
+        index = path.rfind(marker)
+        if index != -1:
+            return path[index + len(marker):]
+    return os.path.basename(path)
+
+def _speedscope_frame(label):
+    name, _, location = label.rpartition(" (")
+    file, _, line = location.rstrip(")").rpartition(":")
+    return {"name": name, "file": file, "line": int(line)}
+
+# Only one profile runs at a time
+PROFILE_LOCK = threading.Lock()
+# Finished profiles kept for download, the oldest are dropped first
+MAX_KEPT_PROFILES = 4
+
+class ProfileJob:
+    """A profile running on its own thread, so no request thread waits for it.
+
+    Attributes:
+        id (str): Identifier clients use to poll for the result.
+        profiler (SamplingProfiler): The profiler sampling the threads.
+        seconds (float): Seconds to sample, at most when profiling a refresh.
+        tracer (Tracer): Tracer of the refresh to profile, or None to profile for `seconds`.
+        timeout (float): Seconds to wait for a refresh to start.
+        status (str): "running", "done", "timeout" (no refresh started) or "failed".
+        traces (list): Traces of the profiled refreshes.
+    """
+
+    def __init__(self, profiler, seconds, tracer=None, timeout=None):
+        self.id = uuid.uuid4().hex
+        self.profiler = profiler
+        self.seconds = seconds
+        self.tracer = tracer
+        self.timeout = timeout
+        self.status = "running"
+        self.traces = []
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+        self.done_event = threading.Event()
+
+    def run(self):
+        try:
+            if self.tracer is not None:
+                self.traces = profile_next_refresh(self.profiler, self.tracer, self.timeout, self.seconds)
+                self.status = "done" if self.traces else "timeout"
+            else:
+                self.profiler.run(self.seconds)
+                self.status = "done"
+            logger.info(f"Profile {self.id} {self.status} | samples: {self.profiler.samples} "
+                        f"| traces: {[trace.id for trace in self.traces]}")
+        except Exception as e:
+            logger.exception(f"Profile {self.id} failed")
+            self.status, self.error = "failed", str(e)
+        finally:
+            self.finished = time.time()
+            PROFILE_LOCK.release()
+            self.done_event.set()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "refresh": self.tracer is not None,
+            "samples": self.profiler.samples,
+            "elapsed": round((self.finished or time.time()) - self.started, 3),
+            "traces": [trace.id for trace in self.traces],
+            "error": self.error,
+        }
+
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+def start_profile(profiler, seconds, tracer=None, timeout=None):
+    """Starts a profile on a background thread, see ProfileJob.
+
+    Returns:
+        ProfileJob: The started profile, or None while another profile is running.
+    """
+    if not PROFILE_LOCK.acquire(blocking=False):
+        return None
+    job = ProfileJob(profiler, seconds, tracer, timeout)
+    with _jobs_lock:
+        _jobs[job.id] = job
+        finished = [job_id for job_id, kept in _jobs.items() if kept.finished is not None]
+        for job_id in finished[:max(0, len(_jobs) - MAX_KEPT_PROFILES)]:
+            del _jobs[job_id]
+    threading.Thread(target=job.run, name="profiler", daemon=True).start()
+    return job
+
+def get_profile_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
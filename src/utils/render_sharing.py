@@ -0,0 +1,35 @@
+"""
+Sharing plugin renders between display targets.
+
+A render depends on the plugin, the instance settings and the frame size it is drawn at.
+Targets showing the same settings at the same frame size get the same image, so it is
+generated once.
+"""
+
+import json
+
+def frame_size(resolution, orientation):
+    """Returns the (width, height) plugins draw at for a resolution and orientation."""
+    width, height = resolution
+    if orientation == "vertical":
+        return (int(height), int(width))
+    return (int(width), int(height))
+
+def render_key(plugin_config, settings, size):
+    """Returns the key of renders that can be shared, equal for interchangeable renders."""
+    return (plugin_config.get("id"), json.dumps(settings, sort_keys=True, default=str), size)
+
+def group_render_jobs(jobs):
+    """Groups jobs that can share one render.
+
+    Args:
+        jobs (list): (render key, job) tuples.
+
+    Returns:
+        list: (lead job, jobs) tuples, the lead being the first job of the group, which the
+            render is generated for.
+    """
+    groups = {}
+    for key, job in jobs:
+        groups.setdefault(key, []).append(job)
+    return [(members[0], members) for members in groups.values()]
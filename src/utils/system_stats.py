@@ -0,0 +1,123 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Seconds between samples and number of samples kept (one hour by default)
+DEFAULT_INTERVAL_SECONDS = 10
+DEFAULT_MAX_SAMPLES = 360
+
+THERMAL_ZONE_FILE = "/sys/class/thermal/thermal_zone0/temp"
+
+class SystemStatsSampler:
+    """Samples system statistics on a background thread into a fixed-size ring buffer.
+
+    Sampling never blocks callers: CPU usage is measured as the utilisation since the
+    previous sample rather than over a blocking probe window, and readers only copy
+    already collected samples.
+
+    Attributes:
+        interval (int): Seconds between samples.
+        samples (deque): Ring buffer of the most recent samples, oldest first.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL_SECONDS, max_samples=DEFAULT_MAX_SAMPLES):
+        self.interval = interval
+        self.samples = deque(maxlen=max_samples)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self._last_net = None
+
+    def start(self):
+        """Starts the background sampling thread."""
+        if not self.thread or not self.thread.is_alive():
+            logger.info("Starting system stats sampler")
+            self.stop_event.clear()
+            # prime psutil so the first real sample reports usage since now
+            psutil.cpu_percent(interval=None)
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stops the background sampling thread."""
+        self.stop_event.set()
+        if self.thread:
+            logger.info("Stopping system stats sampler")
+            self.thread.join()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.sample()
+            except Exception:
+                logger.exception("Failed to sample system stats")
+
+    def sample(self):
+        """Collects a single sample, appends it to the buffer and returns it."""
+        now = time.time()
+        net = psutil.net_io_counters()
+
+        sent_rate, recv_rate = None, None
+        if self._last_net:
+            last_time, last_sent, last_recv = self._last_net
+            elapsed = now - last_time
+            if elapsed > 0:
+                sent_rate = max(0, net.bytes_sent - last_sent) / elapsed
+                recv_rate = max(0, net.bytes_recv - last_recv) / elapsed
+        self._last_net = (now, net.bytes_sent, net.bytes_recv)
+
+        sample = {
+            "timestamp": now,
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "memory_percent": psutil.virtual_memory().percent,
+            "swap_percent": psutil.swap_memory().percent,
+            "disk_percent": psutil.disk_usage('/').percent,
+            "load_avg_1_5_15": list(os.getloadavg()) if hasattr(os, "getloadavg") else None,
+            "temperature_c": get_cpu_temperature(),
+            "net_bytes_sent": net.bytes_sent,
+            "net_bytes_recv": net.bytes_recv,
+            "net_sent_bytes_per_sec": sent_rate,
+            "net_recv_bytes_per_sec": recv_rate,
+        }
+        with self.lock:
+            self.samples.append(sample)
+        return sample
+
+    def latest(self):
+        """Returns the most recent sample, or None if nothing has been sampled yet."""
+        with self.lock:
+            return self.samples[-1] if self.samples else None
+
+    def get_samples(self, since=None):
+        """Returns a copy of the buffered samples, optionally only those newer than `since`."""
+        with self.lock:
+            samples = list(self.samples)
+        if since is not None:
+            samples = [s for s in samples if s["timestamp"] > since]
+        return samples
+
+def get_cpu_temperature():
+    """Returns the CPU temperature in degrees Celsius, or None if unavailable."""
+    if hasattr(psutil, "sensors_temperatures"):
+        try:
+            temperatures = psutil.sensors_temperatures()
+        except Exception:
+            temperatures = {}
+        for name in ("cpu_thermal", "coretemp", "k10temp"):
+            if temperatures.get(name):
+                return temperatures[name][0].current
+        for entries in temperatures.values():
+            if entries:
+                return entries[0].current
+
+    try:
+        with open(THERMAL_ZONE_FILE) as f:
+            return int(f.read().strip()) / 1000
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,246 @@
+"""
+Tracing of single refresh cycles.
+
+Metrics (see utils.metrics) show how long stages take on average. A trace shows one
+refresh end to end: each span is a stage of that refresh, with the thread it ran on.
+The last traces are kept in a ring buffer and exported in the Chrome trace event format,
+which chrome://tracing, Perfetto (ui.perfetto.dev) and speedscope open.
+
+A trace is started on a thread with `Tracer.trace` and spans are recorded with `span`.
+Outside a trace `span` only checks a thread-local, so instrumented code costs next to
+nothing when nothing is traced. Work handed to another thread joins the trace with
+`use_trace`. Every `REGISTRY.timer` stage is also recorded as a span.
+"""
+
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# Number of refresh traces kept
+DEFAULT_TRACE_CAPACITY = 20
+# Spans recorded per trace at most, so a runaway loop can't grow a trace without bound
+MAX_SPANS = 2000
+
+_context = threading.local()
+
+class Trace:
+    """The spans of one traced operation.
+
+    Attributes:
+        id (int): Increasing trace number.
+        name (str): What was traced, e.g. "refresh".
+        args (dict): Details added while tracing, like the plugin that was refreshed.
+        start (float): `time.perf_counter()` when the trace started.
+        wall_start (float): `time.time()` when the trace started.
+        thread (int): Id of the thread that started the trace.
+        end (float): `time.perf_counter()` when it ended, None while running.
+        spans (list): (name, start, end, thread id, args) tuples in order of completion.
+    """
+
+    def __init__(self, id, name, args=None):
+        self.id = id
+        self.name = name
+        self.args = dict(args or {})
+        self.start = time.perf_counter()
+        self.wall_start = time.time()
+        self.thread = threading.get_ident()
+        self.end = None
+        self.spans = []
+        self.dropped = 0
+        self.discarded = False
+        self.lock = threading.Lock()
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def add_span(self, name, start, end, args=None):
+        """Records a span from `time.perf_counter()` values on the current thread."""
+        with self.lock:
+            if len(self.spans) >= MAX_SPANS:
+                self.dropped += 1
+                return
+            self.spans.append((name, start, end, threading.get_ident(), args))
+
+    def discard(self):
+        """Drops the trace instead of keeping it when it ends, e.g. for a cycle that did nothing."""
+        self.discarded = True
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "start": self.wall_start,
+            "duration": self.duration,
+            "spans": len(self.spans),
+            **self.args,
+        }
+
+class Tracer:
+    """Starts traces and keeps the last finished ones.
+
+    Attributes:
+        traces (deque): The last finished traces, oldest first.
+        active (dict): Running traces by id.
+    """
+
+    def __init__(self, capacity=DEFAULT_TRACE_CAPACITY):
+        self.lock = threading.Lock()
+        self.traces = deque(maxlen=capacity)
+        self.active = {}
+        self._ids = itertools.count(1)
+
+    @contextmanager
+    def trace(self, name, **args):
+        """Traces the block on the current thread, yielding the Trace."""
+        trace = Trace(next(self._ids), name, args)
+        previous = getattr(_context, "trace", None)
+        _context.trace = trace
+        with self.lock:
+            self.active[trace.id] = trace
+        try:
+            yield trace
+        except BaseException as e:
+            trace.args["error"] = repr(e)
+            raise
+        finally:
+            _context.trace = previous
+            trace.end = time.perf_counter()
+            with self.lock:
+                del self.active[trace.id]
+                if not trace.discarded:
+                    self.traces.append(trace)
+
+    def get_active(self):
+        """Returns the running traces."""
+        with self.lock:
+            return list(self.active.values())
+
+    def resize(self, capacity):
+        """Changes how many traces are kept, keeping the most recent."""
+        with self.lock:
+            self.traces = deque(self.traces, maxlen=capacity)
+
+    def get_traces(self, last=None):
+        """Returns the finished traces, oldest first, optionally only the last few."""
+        with self.lock:
+            traces = list(self.traces)
+        return traces[-last:] if last else traces
+
+    def clear(self):
+        with self.lock:
+            self.traces.clear()
+
+def current_trace():
+    """Returns the trace running on the current thread, if any."""
+    return getattr(_context, "trace", None)
+
+@contextmanager
+def use_trace(trace):
+    """Records spans of the block on the current thread into the given trace, if not None."""
+    previous = getattr(_context, "trace", None)
+    _context.trace = trace
+    try:
+        yield trace
+    finally:
+        _context.trace = previous
+
+@contextmanager
+def span(name, **args):
+    """Records the block as a span of the current trace."""
+    trace = getattr(_context, "trace", None)
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, start, time.perf_counter(), args or None)
+
+def add_span(name, start, end, **args):
+    """Records a span measured by the caller with `time.perf_counter()` values."""
+    trace = getattr(_context, "trace", None)
+    if trace is not None:
+        trace.add_span(name, start, end, args or None)
+
+def annotate(**args):
+    """Adds details to the current trace."""
+    trace = getattr(_context, "trace", None)
+    if trace is not None:
+        trace.args.update(args)
+
+def to_chrome_trace(traces):
+    """Returns traces in the Chrome trace event format.
+
+    Each trace is shown as its own process, named after the trace, with a row per thread.
+    Times are microseconds since the start of the first trace, or of a span recorded before
+    it started, like the wait for a refresh.
+    """
+    events = []
+    if not traces:
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+    origin = min(min([trace.start] + [start for _, start, _, _, _ in trace.spans]) for trace in traces)
+    pid = os.getpid()
+    thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+    def micros(value):
+        return round((value - origin) * 1_000_000, 1)
+
+    for trace in traces:
+        end = trace.end if trace.end is not None else time.perf_counter()
+        label = " ".join(str(value) for value in (trace.name, trace.args.get("plugin_id"),
+                                                  trace.args.get("target")) if value)
+        events.append({"name": "process_name", "ph": "M", "pid": trace.id, "tid": 0,
+                       "args": {"name": f"#{trace.id} {label}"}})
+        events.append({"name": "process_sort_index", "ph": "M", "pid": trace.id, "tid": 0,
+                       "args": {"sort_index": trace.id}})
+        threads = {trace.thread}
+        threads.update(tid for _, _, _, tid, _ in trace.spans)
+        for tid in threads:
+            events.append({"name": "thread_name", "ph": "M", "pid": trace.id, "tid": tid,
+                           "args": {"name": thread_names.get(tid, f"thread {tid}")}})
+        # the whole trace, on the thread that started it
+        events.append({"name": trace.name, "cat": "trace", "ph": "X", "pid": trace.id, "tid": trace.thread,
+                       "ts": micros(trace.start), "dur": round((end - trace.start) * 1_000_000, 1),
+                       "args": {**trace.args, "os_pid": pid, "wall_start": trace.wall_start,
+                                "dropped_spans": trace.dropped}})
+        for name, start, span_end, tid, args in trace.spans:
+            event = {"name": name, "cat": "span", "ph": "X", "pid": trace.id, "tid": tid,
+                     "ts": micros(start), "dur": round((span_end - start) * 1_000_000, 1)}
+            if args:
+                event["args"] = args
+            events.append(event)
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+def instrument_requests():
+    """Records every HTTP request made with `requests` during a trace as an "http" span.
+
+    Plugins call `requests` directly, so the span is added where all of its calls end up,
+    `Session.send`. Does nothing if `requests` isn't installed or was already instrumented.
+    """
+    try:
+        from requests import Session
+    except ImportError:
+        return False
+    send = Session.send
+    if getattr(send, "_traced", False):
+        return True
+
+    def traced_send(session, request, **kwargs):
+        if getattr(_context, "trace", None) is None:
+            return send(session, request, **kwargs)
+        url = urlsplit(request.url)
+        with span("http", method=request.method, host=url.netloc, path=url.path):
+            return send(session, request, **kwargs)
+
+    traced_send._traced = True
+    Session.send = traced_send
+    return True
+
+# Shared tracer of the refresh tasks
+TRACER = Tracer()
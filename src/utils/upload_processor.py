@@ -0,0 +1,210 @@
+import os
+import time
+import uuid
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 2
+# Finished jobs are kept this long so clients can read their final status
+JOB_RETENTION_SECONDS = 60 * 60
+
+def convert_upload(staged_path, file_path, resize_options=None, raw_path=None):
+    """Converts a staged upload into the image saved at file_path. Runs in a worker process.
+
+    Applies the EXIF orientation and, when resize_options are given, fits the image to the
+    display. If the image can't be processed the staged file is kept as is, matching how
+    uploads were handled before processing moved off the request thread. It is then stored
+    at raw_path, the store path of the unprocessed upload, so file_path only ever holds a
+    processed image.
+
+    Images in a format Pillow can't write are stored as PNG next to file_path.
+
+    Returns:
+        str: The path the upload was stored at.
+    """
+    from PIL import Image, ImageOps
+    from utils.app_utils import fit_image_to_display
+
+    Image.init()
+    if Image.EXTENSION.get(os.path.splitext(file_path)[1].lower()) not in Image.SAVE:
+        # formats Pillow can only read, like HEIF, are stored as PNG once processed
+        file_path = os.path.splitext(file_path)[0] + ".png"
+
+    # write next to the destination and rename, so readers never see a partial file
+    tmp_path = os.path.join(os.path.dirname(file_path), f".{uuid.uuid4().hex}-{os.path.basename(file_path)}")
+    try:
+        with Image.open(staged_path) as img:
+            img = ImageOps.exif_transpose(img)
+            if resize_options:
+                img = fit_image_to_display(img, **resize_options)
+            img.save(tmp_path)
+        os.replace(tmp_path, file_path)
+    except Exception as e:
+        logger.warning(f"Image processing error for {os.path.basename(file_path)}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        stored_path = raw_path or file_path
+        os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+        os.replace(staged_path, stored_path)
+        return stored_path
+
+    os.remove(staged_path)
+    return file_path
+
+def init_worker():
+    """Prepares a worker process, registering the image openers the server registers at startup."""
+    from pi_heif import register_heif_opener
+    register_heif_opener()
+
+class UploadJob:
+    """Tracks the conversion of the files uploaded in a single request.
+
+    Attributes:
+        id (str): Identifier clients use to poll the job's progress.
+        files (list): One dict per file with its form key, name, final path and status
+            ("queued", "processing", "done" or "failed").
+    """
+
+    def __init__(self, files, on_file_done=None):
+        self.id = uuid.uuid4().hex
+        self.files = files
+        self.on_file_done = on_file_done
+        self.created = time.time()
+        self.finished = None
+        self.lock = threading.Lock()
+        self.done_event = threading.Event()
+
+    def is_done(self):
+        return self.done_event.is_set()
+
+    def completed_paths(self, key):
+        """Returns the paths of the converted files for a form key, in upload order."""
+        with self.lock:
+            return [f["path"] for f in self.files if f["key"] == key and f["status"] == "done"]
+
+    @staticmethod
+    def _status(file):
+        future = file.get("future")
+        if file["status"] == "queued" and future is not None and future.running():
+            return "processing"
+        return file["status"]
+
+    def to_dict(self):
+        with self.lock:
+            files = [{"name": f["name"], "status": self._status(f), "error": f.get("error")} for f in self.files]
+        return {
+            "id": self.id,
+            "done": self.is_done(),
+            "completed": sum(1 for f in files if f["status"] in ("done", "failed")),
+            "total": len(files),
+            "files": files,
+        }
+
+class UploadProcessor:
+    """Converts uploaded images in a bounded process pool so requests return immediately.
+
+    Requests stream the uploads to disk and submit them as a job; each file is converted in a
+    worker process and the job's `on_file_done` callback runs as each conversion finishes.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self.executor = None
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def _get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                # workers are forked from a single-threaded server process rather than from this
+                # multi-threaded one, and preload only this module instead of the server's main module
+                mp_context = multiprocessing.get_context("forkserver")
+                mp_context.set_forkserver_preload([__name__])
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp_context,
+                                                    initializer=init_worker)
+            return self.executor
+
+    def submit(self, staged_files, resize_options=None, on_file_done=None):
+        """Queues staged uploads for conversion and returns the UploadJob tracking them.
+
+        Args:
+            staged_files (list): Dicts with the form `key`, file `name`, `staged_path` and final `path`,
+                and the `raw_path` to store the upload at if it can't be processed.
+            resize_options (dict): Keyword arguments for fit_image_to_display, or None to only
+                apply the EXIF orientation.
+            on_file_done (callable): Called with the job after each file finishes, from a
+                background thread.
+        """
+        files = [dict(f, status="queued") for f in staged_files]
+        job = UploadJob(files, on_file_done)
+        self._prune_jobs()
+        with self.lock:
+            self.jobs[job.id] = job
+
+        # files the image store already holds in processed form need no conversion
+        for file in files:
+            if file.get("reused"):
+                file["status"] = "done"
+        pending = [file for file in files if not file.get("reused")]
+
+        if not pending:
+            if files and on_file_done:
+                on_file_done(job)
+            job.finished = time.time()
+            job.done_event.set()
+            return job
+
+        executor = self._get_executor()
+        for file in pending:
+            future = executor.submit(convert_upload, file["staged_path"], file["path"], resize_options,
+                                     file.get("raw_path"))
+            file["future"] = future
+            future.add_done_callback(lambda future, file=file: self._file_done(job, file, future))
+        logger.info(f"Queued {len(pending)} uploaded files for processing, job {job.id}")
+        return job
+
+    def _file_done(self, job, file, future):
+        with job.lock:
+            error = future.exception()
+            if error:
+                logger.error(f"Failed to process upload {file['name']}: {error}")
+                file["status"], file["error"] = "failed", str(error)
+            else:
+                # uploads that couldn't be processed are stored elsewhere, see convert_upload
+                file["path"], file["status"] = future.result(), "done"
+            all_done = all(f["status"] in ("done", "failed") for f in job.files)
+
+        if job.on_file_done:
+            try:
+                job.on_file_done(job)
+            except Exception:
+                logger.exception(f"Upload job {job.id} callback failed")
+
+        if all_done:
+            job.finished = time.time()
+            job.done_event.set()
+            logger.info(f"Finished processing uploads for job {job.id}")
+
+    def get_job(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def wait(self, job, timeout=None):
+        """Blocks until every file in the job finished processing."""
+        return job.done_event.wait(timeout)
+
+    def _prune_jobs(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        with self.lock:
+            for job_id in [job_id for job_id, job in self.jobs.items() if job.finished and job.finished < cutoff]:
+                del self.jobs[job_id]
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,141 @@
+import random
+
+import pytest
+
+from src.plugins.image_album.album_cache import AlbumAssetCache, ShuffleCursor, choose_asset_size
+
+class LocalImmich:
+    """In-memory stand-in for the Immich album and search endpoints."""
+
+    def __init__(self, page_size=2):
+        self.page_size = page_size
+        self.albums = {}
+        self.clock = 0
+        self.calls = []
+
+    def tick(self):
+        self.clock += 1
+        return f"2025-01-01T00:00:{self.clock:02d}.000Z"
+
+    def create_album(self, album_id, name, asset_ids):
+        now = self.tick()
+        self.albums[album_id] = {"id": album_id, "albumName": name, "updatedAt": now,
+                                 "assets": {asset_id: now for asset_id in asset_ids}}
+
+    def add_assets(self, album_id, asset_ids):
+        album = self.albums[album_id]
+        now = self.tick()
+        album["updatedAt"] = now
+        album["assets"].update({asset_id: now for asset_id in asset_ids})
+
+    def remove_asset(self, album_id, asset_id):
+        album = self.albums[album_id]
+        album["updatedAt"] = self.tick()
+        del album["assets"][asset_id]
+
+    def album_dto(self, album):
+        return {"id": album["id"], "albumName": album["albumName"], "updatedAt": album["updatedAt"],
+                "assetCount": len(album["assets"])}
+
+    def list_albums(self):
+        self.calls.append("list_albums")
+        return [self.album_dto(album) for album in self.albums.values()]
+
+    def get_album(self, album_id):
+        self.calls.append("get_album")
+        album = self.albums.get(album_id)
+        return self.album_dto(album) if album else None
+
+    def search_assets(self, album_id, page, updated_after=None):
+        self.calls.append(("search", updated_after))
+        items = [{"id": asset_id, "updatedAt": updated_at}
+                 for asset_id, updated_at in self.albums[album_id]["assets"].items()
+                 if updated_after is None or updated_at > updated_after]
+        start = (page - 1) * self.page_size
+        next_page = page + 1 if start + self.page_size < len(items) else None
+        return items[start:start + self.page_size], next_page
+
+class DictStore(dict):
+    def set(self, key, value):
+        self[key] = value
+
+def make_cache(server, store):
+    return AlbumAssetCache(server, store, "local|Family", rng=random.Random(1))
+
+class TestAlbumAssetCache:
+
+    def test_assets_are_cached_until_the_album_changes(self):
+        server, store = LocalImmich(), DictStore()
+        server.create_album("a1", "Family", ["p1", "p2", "p3", "p4", "p5"])
+
+        cache = make_cache(server, store)
+        cache.next_asset_id("Family")
+        assert store["local|Family"]["asset_ids"] == ["p1", "p2", "p3", "p4", "p5"]
+        assert server.calls.count(("search", None)) == 3
+
+        server.calls.clear()
+        cache.next_asset_id("Family")
+        assert server.calls == ["get_album"]
+
+    def test_new_assets_are_fetched_incrementally(self):
+        server, store = LocalImmich(), DictStore()
+        server.create_album("a1", "Family", ["p1", "p2", "p3"])
+        cache = make_cache(server, store)
+        cache.next_asset_id("Family")
+        synced_at = store["local|Family"]["synced_at"]
+
+        server.add_assets("a1", ["p4"])
+        server.calls.clear()
+        cache.next_asset_id("Family")
+
+        assert server.calls == ["get_album", ("search", synced_at)]
+        assert sorted(store["local|Family"]["asset_ids"]) == ["p1", "p2", "p3", "p4"]
+
+    def test_removed_assets_trigger_a_full_reload(self):
+        server, store = LocalImmich(), DictStore()
+        server.create_album("a1", "Family", ["p1", "p2", "p3"])
+        cache = make_cache(server, store)
+        cache.next_asset_id("Family")
+
+        server.remove_asset("a1", "p2")
+        cache.next_asset_id("Family")
+
+        assert store["local|Family"]["asset_ids"] == ["p1", "p3"]
+        assert "p2" not in store["local|Family"]["cursor"]["order"]
+
+    def test_each_asset_is_shown_once_per_cycle(self):
+        server, store = LocalImmich(), DictStore()
+        server.create_album("a1", "Family", ["p1", "p2", "p3", "p4"])
+        cache = make_cache(server, store)
+
+        first_cycle = [cache.next_asset_id("Family") for _ in range(4)]
+        second_cycle = [cache.next_asset_id("Family") for _ in range(4)]
+
+        assert sorted(first_cycle) == sorted(second_cycle) == ["p1", "p2", "p3", "p4"]
+        assert second_cycle[0] != first_cycle[-1]
+
+    def test_unknown_album(self):
+        server = LocalImmich()
+        server.create_album("a1", "Family", ["p1"])
+        cache = AlbumAssetCache(server, DictStore(), "local|Pets")
+        with pytest.raises(RuntimeError, match="Pets"):
+            cache.next_asset_id("Pets")
+
+class TestShuffleCursor:
+
+    def test_sync_keeps_seen_ids_and_adds_new_ones_to_the_unseen_part(self):
+        cursor = ShuffleCursor(["a", "b", "c"], position=2, rng=random.Random(0))
+        cursor.sync(["a", "c", "d", "e"])
+
+        assert cursor.order[:1] == ["a"]
+        assert cursor.position == 1
+        assert sorted(cursor.order[1:]) == ["c", "d", "e"]
+
+    def test_empty(self):
+        assert ShuffleCursor().next() is None
+
+def test_choose_asset_size():
+    assert choose_asset_size((200, 150)) == "thumbnail"
+    assert choose_asset_size((800, 480)) == "preview"
+    assert choose_asset_size((1440, 1080)) == "preview"
+    assert choose_asset_size((1600, 1200)) == "original"
@@ -0,0 +1,60 @@
+import json
+
+from src.utils import cache_utils
+from src.utils.cache_utils import TTLCache, PersistentDict
+
+class TestTTLCache:
+
+    def test_entries_expire(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr(cache_utils.time, "monotonic", lambda: now[0])
+        cache = TTLCache()
+        cache.set("forecast", {"temp": 12}, ttl_seconds=60)
+
+        assert cache.get("forecast") == {"temp": 12}
+        now[0] += 61
+        assert cache.get("forecast") is None
+
+    def test_expired_entries_are_swept_on_set(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr(cache_utils.time, "monotonic", lambda: now[0])
+        cache = TTLCache()
+        for day in range(5):
+            cache.set(("NYT", day), True, ttl_seconds=30)
+        cache.set("forever", True)
+
+        # entries that are never read again are dropped by a later set
+        now[0] += cache_utils.PRUNE_INTERVAL_SECONDS
+        cache.set("fresh", True, ttl_seconds=30)
+        assert set(cache.entries) == {"forever", "fresh"}
+
+    def test_get_or_fetch_only_fetches_on_miss(self):
+        cache = TTLCache()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return "value"
+
+        assert cache.get_or_fetch("key", fetch, 60) == "value"
+        assert cache.get_or_fetch("key", fetch, 60) == "value"
+        assert len(calls) == 1
+
+class TestPersistentDict:
+
+    def test_values_survive_reload(self, tmp_path):
+        path = tmp_path / "nested" / "geocoding.json"
+        store = PersistentDict(str(path))
+        store.set("40.7128,-74.0060", "New York, NY")
+
+        assert json.loads(path.read_text()) == {"40.7128,-74.0060": "New York, NY"}
+        assert PersistentDict(str(path)).get("40.7128,-74.0060") == "New York, NY"
+
+    def test_corrupt_file_is_ignored(self, tmp_path):
+        path = tmp_path / "geocoding.json"
+        path.write_text("{not json")
+
+        store = PersistentDict(str(path))
+        assert store.get("key") is None
+        store.set("key", "value")
+        assert PersistentDict(str(path)).items() == [("key", "value")]
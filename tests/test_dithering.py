@@ -0,0 +1,49 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from src.utils.dithering import (DITHER_ENGINES, bayer_matrix, blue_noise_matrix, dither_image,
+                                 register_dither_engine)
+
+PALETTE = [(0, 0, 0), (255, 255, 255), (0, 128, 0), (0, 0, 255), (255, 0, 0), (255, 255, 0)]
+
+def gradient(width=64, height=40):
+    x = np.linspace(0, 255, width, dtype=np.uint8)
+    pixels = np.stack([np.tile(x, (height, 1))] * 3, axis=-1)
+    return Image.fromarray(pixels)
+
+class TestDithering:
+
+    @pytest.mark.parametrize("engine", list(DITHER_ENGINES))
+    def test_engines_return_palette_indices(self, engine):
+        dithered = dither_image(gradient(), PALETTE, engine)
+
+        assert dithered.mode == "P"
+        assert dithered.size == (64, 40)
+        assert np.asarray(dithered).max() < len(PALETTE)
+
+    @pytest.mark.parametrize("engine", list(DITHER_ENGINES))
+    def test_palette_colors_map_exactly(self, engine):
+        image = Image.new("RGB", (16, 16), PALETTE[4])
+        assert set(np.asarray(dither_image(image, PALETTE, engine)).ravel()) == {4}
+
+    @pytest.mark.parametrize("engine", ["bayer", "blue-noise", "floyd-steinberg", "stucki"])
+    def test_mid_gray_mixes_black_and_white(self, engine):
+        image = Image.new("RGB", (32, 32), (128, 128, 128))
+        indices = np.asarray(dither_image(image, [(0, 0, 0), (255, 255, 255)], engine))
+        assert 0.35 < indices.mean() < 0.65
+
+    def test_threshold_maps_are_uniform(self):
+        assert sorted(bayer_matrix(8).ravel() * 64 - 0.5) == list(range(64))
+        assert len(np.unique(blue_noise_matrix())) == 64 * 64
+
+    def test_unknown_engine_falls_back_to_default(self):
+        assert dither_image(gradient(), PALETTE, "nope").mode == "P"
+
+    def test_register_engine(self):
+        register_dither_engine("first-color", lambda image, palette: Image.new("P", image.size, 0))
+        try:
+            assert dither_image(gradient(), PALETTE, "first-color").getpixel((0, 0)) == 0
+        finally:
+            del DITHER_ENGINES["first-color"]
@@ -0,0 +1,76 @@
+import random
+
+from src.utils.frame_delta import (FrameHistory, apply_delta, changed_rectangles, changed_span, encode_delta,
+                                   DELTA_HEADER)
+
+ROW_BYTES = 400
+ROWS = 480
+
+def make_frame(seed=0):
+    rng = random.Random(seed)
+    return bytes(rng.randrange(0x66) for _ in range(ROW_BYTES * ROWS))
+
+def change(frame, x, y, width, height, value=0x55):
+    frame = bytearray(frame)
+    for row in range(y, y + height):
+        start = row * ROW_BYTES + x
+        frame[start:start + width] = bytes([value]) * width
+    return bytes(frame)
+
+class TestDeltaEncoding:
+
+    def test_changed_span(self):
+        assert changed_span(b"abcd", b"abcd") is None
+        assert changed_span(b"abcd", b"aXcY") == (1, 3)
+        assert changed_span(b"abcd", b"Xbcd") == (0, 0)
+
+    def test_clock_digit_change_sends_one_small_rectangle(self):
+        old = make_frame()
+        new = change(old, x=120, y=200, width=24, height=60)
+
+        assert changed_rectangles(old, new, ROW_BYTES) == [(120, 200, 24, 60)]
+        delta = encode_delta(old, new, ROW_BYTES)
+        assert len(delta) < 24 * 60 + 64
+        assert apply_delta(old, delta) == new
+
+    def test_round_trip_with_several_bands(self):
+        old = make_frame()
+        new = change(change(old, 0, 0, 1, 1), 390, 470, 10, 10)
+        new = change(new, 5, 100, 300, 2)
+
+        delta = encode_delta(old, new, ROW_BYTES)
+
+        assert DELTA_HEADER.unpack_from(delta)[-1] == 3
+        assert apply_delta(old, delta) == new
+
+    def test_identical_frames(self):
+        frame = make_frame()
+        delta = encode_delta(frame, frame, ROW_BYTES)
+        assert len(delta) == DELTA_HEADER.size
+        assert apply_delta(frame, delta) == frame
+
+    def test_layout_mismatch(self):
+        assert encode_delta(b"\0" * 10, b"\0" * 12, 2) is None
+
+class TestFrameHistory:
+
+    def test_falls_back_to_full_frame(self):
+        history = FrameHistory(max_frames=2)
+        old, new = make_frame(1), make_frame(2)
+        small_change = change(old, 0, 0, 8, 8)
+        history.add("old", old)
+        history.add("small", small_change)
+
+        assert apply_delta(old, history.delta("old", "small", ROW_BYTES)) == small_change
+        assert history.delta("unknown", "small", ROW_BYTES) is None
+
+        # a completely different frame isn't worth a delta
+        history.add("new", new)
+        assert history.delta("small", "new", ROW_BYTES) is None
+
+    def test_keeps_only_recent_frames(self):
+        history = FrameHistory(max_frames=2)
+        for key in ("a", "b", "c"):
+            history.add(key, key.encode())
+        assert history.get("a") is None
+        assert history.get("c") == b"c"
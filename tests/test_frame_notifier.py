@@ -0,0 +1,38 @@
+import threading
+
+from src.utils.frame_notifier import FrameNotifier
+
+class TestFrameNotifier:
+
+    def test_outdated_hash_returns_immediately(self):
+        notifier = FrameNotifier("abc")
+        assert notifier.wait_for_change("old", timeout=5) == "abc"
+
+    def test_waiters_are_woken_by_a_new_frame(self):
+        notifier = FrameNotifier("abc")
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(notifier.wait_for_change("abc", timeout=5)))
+        waiter.start()
+
+        notifier.publish("def")
+        waiter.join(timeout=5)
+
+        assert results == ["def"]
+        assert notifier.current() == "def"
+
+    def test_timeout_returns_the_known_hash(self):
+        notifier = FrameNotifier("abc")
+        notifier.publish("abc")
+        assert notifier.wait_for_change("abc", timeout=0.01) == "abc"
+
+    def test_listener_slots_are_bounded(self):
+        notifier = FrameNotifier(max_listeners=1)
+        with notifier.listener_slot() as first:
+            with notifier.listener_slot() as second:
+                assert first and not second
+        assert notifier.acquire_listener()
+
+    def test_close_releases_waiters(self):
+        notifier = FrameNotifier("abc")
+        notifier.close()
+        assert notifier.wait_for_change("abc", timeout=5) == "abc"
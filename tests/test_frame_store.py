@@ -0,0 +1,176 @@
+import os
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from src.utils.frame_store import FrameCache, FrameStore, read_raw_frame
+
+def make_frame(color=(200, 30, 30), size=(80, 48)):
+    image = Image.new("RGB", size, color)
+    image.putpixel((3, 4), (0, 0, 255))
+    return image
+
+def stored_frames(directory):
+    return [name for name in os.listdir(directory) if not name.startswith(".")]
+
+class TestFrameStore:
+
+    @pytest.mark.parametrize("frame_format", ["png", "raw"])
+    def test_round_trip(self, tmp_path, frame_format):
+        store = FrameStore(str(tmp_path / "frames"), frame_format)
+        frame = make_frame()
+
+        path = store.save(frame, str(tmp_path / "plugins" / "clock_Clock.png"))
+
+        assert os.path.splitext(path)[1] == {"png": ".png", "raw": ".frame"}[frame_format]
+        loaded = store.load(path)
+        assert loaded.size == frame.size
+        assert loaded.tobytes() == frame.tobytes()
+
+    def test_identical_frames_share_one_encoded_file(self, tmp_path):
+        store = FrameStore(str(tmp_path / "frames"))
+        plugin_image = store.save(make_frame(), str(tmp_path / "plugins" / "weather_Home.png"))
+        current_image = store.save(make_frame(), str(tmp_path / "current_image.png"))
+
+        assert os.path.samefile(plugin_image, current_image)
+        assert len(stored_frames(tmp_path / "frames")) == 1
+
+    def test_replaced_frames_are_pruned(self, tmp_path):
+        store = FrameStore(str(tmp_path / "frames"))
+        path = str(tmp_path / "current_image.png")
+        store.save(make_frame((10, 10, 10)), path)
+        store.save(make_frame((250, 250, 250)), path)
+
+        assert len(stored_frames(tmp_path / "frames")) == 1
+        assert store.load(path).getpixel((0, 0)) == (250, 250, 250)
+
+    def test_copied_frames_are_kept_while_in_use(self, tmp_path, monkeypatch):
+        def no_links(src, dst):
+            raise OSError("Invalid cross-device link")
+        monkeypatch.setattr(os, "link", no_links)
+        store = FrameStore(str(tmp_path / "frames"), thumbnail_dir=str(tmp_path / "thumbnails"))
+        plugin_image = store.save(make_frame(), str(tmp_path / "plugins" / "weather_Home.png"))
+        current_image = store.save(make_frame((0, 0, 200)), str(tmp_path / "current_image.png"))
+
+        assert not os.path.samefile(plugin_image, current_image)
+        assert len(stored_frames(tmp_path / "frames")) == 2
+        assert len(os.listdir(tmp_path / "thumbnails")) == 4
+
+        # replaced and removed destinations release their frames
+        store.save(make_frame(), current_image)
+        assert len(stored_frames(tmp_path / "frames")) == 1
+        os.remove(plugin_image)
+        os.remove(current_image)
+        store.prune()
+        assert stored_frames(tmp_path / "frames") == []
+        assert os.listdir(tmp_path / "thumbnails") == []
+
+    def test_frame_keys_of_copied_frames(self, tmp_path, monkeypatch):
+        def no_links(src, dst):
+            raise OSError("Invalid cross-device link")
+        monkeypatch.setattr(os, "link", no_links)
+        store = FrameStore(str(tmp_path / "frames"))
+        path = store.save(make_frame(), str(tmp_path / "current_image.png"))
+
+        assert store.frame_keys([path]) == {path: store.frame_key(make_frame(), "png")}
+        # a file replaced behind the store's back has no known frame
+        make_frame((0, 255, 0)).save(path)
+        assert store.frame_keys([path]) == {}
+
+    def test_removed_destinations_are_forgotten(self, tmp_path):
+        store = FrameStore(str(tmp_path / "frames"))
+        old = store.save(make_frame(), str(tmp_path / "display_1.png"))
+        os.remove(old)
+        store.save(make_frame(), str(tmp_path / "display_2.png"))
+
+        assert [path for path, _ in store.destinations.items()] == [str(tmp_path / "display_2.png")]
+
+    def test_modified_time_is_per_destination(self, tmp_path):
+        store = FrameStore(str(tmp_path / "frames"))
+        first = store.save(make_frame(), str(tmp_path / "plugins" / "weather_Home.png"))
+        past = os.path.getmtime(first) - 600
+        os.utime(first, (past, past))
+
+        # the current image links the older blob, without touching its time
+        current = store.save(make_frame(), str(tmp_path / "current_image.png"))
+        assert os.path.getmtime(current) == past
+        assert store.modified_time(current) > past
+
+    def test_raw_frames_keep_alpha(self, tmp_path):
+        store = FrameStore(str(tmp_path / "frames"), "raw")
+        frame = Image.new("RGBA", (4, 2), (1, 2, 3, 4))
+
+        path = store.save(frame, str(tmp_path / "frame.png"))
+
+        assert read_raw_frame(path).getpixel((0, 0)) == (1, 2, 3, 4)
+
+    def test_unknown_format(self, tmp_path):
+        with pytest.raises(ValueError):
+            FrameStore(str(tmp_path), "bmp")
+
+class TestFrameCache:
+
+    def test_loads_are_served_from_memory_until_the_file_changes(self, tmp_path, monkeypatch):
+        store = FrameStore(str(tmp_path / "frames"), cache=FrameCache())
+        path = store.save(make_frame(), str(tmp_path / "clock_Clock.png"))
+
+        decodes = []
+        monkeypatch.setattr(store, "decode", lambda p: decodes.append(p) or make_frame())
+        assert store.load(path).tobytes() == make_frame().tobytes()
+        assert decodes == []
+
+        # a file replaced behind the store's back is decoded again
+        make_frame((0, 255, 0)).save(path)
+        store.load(path)
+        assert decodes == [path]
+
+    def test_png_bytes_are_cached(self, tmp_path):
+        store = FrameStore(str(tmp_path / "frames"), "raw", cache=FrameCache())
+        path = store.save(make_frame(), str(tmp_path / "clock_Clock.png"))
+
+        png = store.load_png(path)
+        assert png.startswith(b"\x89PNG")
+        assert store.load_png(path) is png
+
+    def test_memory_budget_evicts_least_recently_used(self, tmp_path):
+        frame_bytes = 80 * 48 * 3
+        cache = FrameCache(max_bytes=frame_bytes * 2)
+        store = FrameStore(str(tmp_path / "frames"), cache=cache)
+        paths = [store.save(make_frame((i, 0, 0)), str(tmp_path / f"frame{i}.png")) for i in range(3)]
+
+        assert list(cache.entries) == paths[1:]
+        assert cache.size_bytes == frame_bytes * 2
+
+        store.invalidate(paths[1])
+        assert list(cache.entries) == paths[2:]
+
+class TestThumbnails:
+
+    def test_thumbnails_are_written_and_pruned_with_their_frame(self, tmp_path):
+        store = FrameStore(str(tmp_path / "frames"), thumbnail_dir=str(tmp_path / "thumbnails"))
+        path = store.save(make_frame(size=(800, 480)), str(tmp_path / "current_image.png"))
+        key = store.frame_keys([path])[path]
+
+        small = store.thumbnail_path(key, "small")
+        with Image.open(small) as thumbnail:
+            assert thumbnail.size == (240, 144)
+        assert os.path.exists(store.thumbnail_path(key, "medium"))
+
+        store.save(make_frame((0, 90, 0), size=(800, 480)), path)
+        assert not os.path.exists(small)
+        assert len(os.listdir(tmp_path / "thumbnails")) == 2
+
+    def test_frame_keys_without_cache(self, tmp_path):
+        store = FrameStore(str(tmp_path / "frames"), "raw")
+        path = store.save(make_frame(), str(tmp_path / "clock_Clock.png"))
+        missing = str(tmp_path / "weather_Home.frame")
+
+        keys = store.frame_keys([path, missing])
+
+        assert keys == {path: store.frame_key(make_frame(), "raw")}
+
+    def test_invalid_thumbnail_requests(self, tmp_path):
+        store = FrameStore(str(tmp_path / "frames"), thumbnail_dir=str(tmp_path / "thumbnails"))
+        assert store.thumbnail_path("../../config", "small") is None
+        assert store.thumbnail_path("a" * 40, "huge") is None
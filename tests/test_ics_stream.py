@@ -0,0 +1,67 @@
+import pytest
+
+pytest.importorskip("icalendar")
+
+from datetime import date, datetime
+
+from src.plugins.calendar.ics_stream import IcsWindowFilter, iter_unfolded_lines, split_property
+
+def build_ics(*events):
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//test//EN"]
+    for event in events:
+        lines += ["BEGIN:VEVENT", *event, "END:VEVENT"]
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(lines) + "\r\n").encode()
+
+def kept_uids(ics, start, end, chunk_size=7):
+    chunks = [ics[i:i + chunk_size] for i in range(0, len(ics), chunk_size)]
+    window_filter = IcsWindowFilter(start, end)
+    for line in iter_unfolded_lines(chunks):
+        window_filter.feed(line)
+    return [line.split(":", 1)[1] for line in window_filter.components if line.startswith("UID:")]
+
+class TestIcsWindowFilter:
+
+    WINDOW = (datetime(2025, 6, 1), datetime(2025, 6, 30))
+
+    @pytest.mark.parametrize(
+        "event,expected",
+        [
+            (["UID:past", "DTSTART:20190101T090000Z", "DTEND:20190101T100000Z"], False),
+            (["UID:inside", "DTSTART:20250610T090000Z", "DTEND:20250610T100000Z"], True),
+            (["UID:spanning", "DTSTART;VALUE=DATE:20250501", "DTEND;VALUE=DATE:20250701"], True),
+            (["UID:duration", "DTSTART:20250525T090000Z", "DURATION:P8D"], True),
+            (["UID:future", "DTSTART:20250901T090000Z", "DTEND:20250901T100000Z"], False),
+            (["UID:weekly", "DTSTART:20200106T080000Z", "RRULE:FREQ=WEEKLY;BYDAY=MO"], True),
+            (["UID:ended", "DTSTART:20200106T080000Z", "RRULE:FREQ=WEEKLY;UNTIL=20210101T000000Z"], False),
+            (["UID:override-moved-out", "RECURRENCE-ID:20250602T080000Z", "DTSTART:20250801T080000Z"], True),
+            (["UID:override-past", "RECURRENCE-ID:20240602T080000Z", "DTSTART:20240603T080000Z"], False),
+            (["UID:no-start", "SUMMARY:Floating"], True),
+        ]
+    )
+    def test_event_selection(self, event, expected):
+        assert (kept_uids(build_ics(event), *self.WINDOW) != []) == expected
+
+    def test_keeps_timezones_and_nested_alarms(self):
+        ics = (
+            "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n"
+            "BEGIN:VTIMEZONE\r\nTZID:Europe/Ljubljana\r\nEND:VTIMEZONE\r\n"
+            "BEGIN:VEVENT\r\nUID:alarm\r\nDTSTART:20250610T090000Z\r\n"
+            "BEGIN:VALARM\r\nTRIGGER:-PT15M\r\nEND:VALARM\r\nEND:VEVENT\r\n"
+            "END:VCALENDAR\r\n"
+        ).encode()
+        window_filter = IcsWindowFilter(*self.WINDOW)
+        for line in iter_unfolded_lines([ics]):
+            window_filter.feed(line)
+
+        assert window_filter.events_seen == window_filter.events_kept == 1
+        assert "TZID:Europe/Ljubljana" in window_filter.components
+        assert "TRIGGER:-PT15M" in window_filter.components
+        assert window_filter.header == ["VERSION:2.0"]
+
+def test_unfolds_lines_across_chunks():
+    ics = "SUMMARY:A long\r\n  summary\r\nUID:x\r\n".encode()
+    assert list(iter_unfolded_lines([ics[:10], ics[10:17], ics[17:]])) == ["SUMMARY:A long summary", "UID:x"]
+
+def test_split_property_with_quoted_params():
+    assert split_property('DTSTART;TZID="Europe/A:B":20250610T090000') == ("DTSTART", 'TZID="Europe/A:B"', "20250610T090000")
@@ -0,0 +1,103 @@
+import io
+import os
+import time
+from types import SimpleNamespace
+
+from src.utils.image_store import ImageStore, ImageStoreCollector, collect_referenced_paths, save_and_hash
+
+RESIZE_OPTIONS = {"orientation": "horizontal", "display_size": [800, 480], "border_percent": 0}
+
+def store_upload(store, content, file_name, params=None):
+    staged_path = os.path.join(store.root_dir, f".{file_name}.upload")
+    content_hash = save_and_hash(io.BytesIO(content), staged_path)
+    path, exists = store.reserve(content_hash, file_name, params)
+    if exists:
+        os.remove(staged_path)
+    else:
+        os.replace(staged_path, path)
+    return path, exists
+
+def age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+class TestImageStore:
+
+    def test_identical_uploads_are_deduplicated(self, tmp_path):
+        store = ImageStore(str(tmp_path))
+        first, first_exists = store_upload(store, b"photo", "beach.jpg", RESIZE_OPTIONS)
+        second, second_exists = store_upload(store, b"photo", "copy of beach.jpg", RESIZE_OPTIONS)
+
+        assert (first_exists, second_exists) == (False, True)
+        assert second == first
+        assert os.path.basename(first) == "beach.jpg"
+
+    def test_processing_parameters_are_part_of_the_key(self, tmp_path):
+        store = ImageStore(str(tmp_path))
+        horizontal, _ = store_upload(store, b"photo", "beach.jpg", RESIZE_OPTIONS)
+        vertical, exists = store_upload(store, b"photo", "beach.jpg", dict(RESIZE_OPTIONS, orientation="vertical"))
+
+        assert not exists
+        assert vertical != horizontal
+
+    def test_collect_garbage_keeps_referenced_and_recent_files(self, tmp_path):
+        store = ImageStore(str(tmp_path))
+        referenced, _ = store_upload(store, b"kept", "kept.jpg")
+        orphan, _ = store_upload(store, b"orphan", "orphan.jpg")
+        recent, _ = store_upload(store, b"recent", "recent.jpg")
+        staging = tmp_path / ".abc-upload.jpg.upload"
+        staging.write_bytes(b"staging")
+        for path in (os.path.dirname(referenced), os.path.dirname(orphan), str(staging)):
+            age(path, 7200)
+
+        reclaimed = store.collect_garbage([referenced], grace_seconds=3600)
+
+        assert reclaimed == len(b"orphan") + len(b"staging")
+        assert os.path.exists(referenced)
+        assert os.path.exists(recent)
+        assert not os.path.exists(os.path.dirname(orphan))
+        assert not staging.exists()
+
+    def test_collect_garbage_leaves_files_it_did_not_create(self, tmp_path):
+        store = ImageStore(str(tmp_path))
+        legacy = tmp_path / "legacy.jpg"
+        legacy.write_bytes(b"legacy")
+        other_dir = tmp_path / "albums"
+        other_dir.mkdir()
+        for path in (str(legacy), str(other_dir)):
+            age(path, 7200)
+
+        assert store.collect_garbage([], grace_seconds=3600) == 0
+        assert legacy.exists()
+        assert other_dir.exists()
+
+    def test_collector_keeps_files_referenced_by_targets(self, tmp_path):
+        store = ImageStore(str(tmp_path))
+        main_file, _ = store_upload(store, b"main", "main.jpg")
+        target_file, _ = store_upload(store, b"target", "target.jpg")
+        orphan, _ = store_upload(store, b"orphan", "orphan.jpg")
+        for path in (main_file, target_file, orphan):
+            age(os.path.dirname(path), 7200)
+        device_config = SimpleNamespace(
+            get_playlist_manager=lambda: playlists_referencing(main_file),
+            get_targets=lambda: {"kitchen": SimpleNamespace(get_playlist_manager=lambda: playlists_referencing(target_file))},
+        )
+
+        reclaimed = ImageStoreCollector(store, device_config, grace_seconds=3600).collect()
+
+        assert reclaimed == len(b"orphan")
+        assert os.path.exists(main_file)
+        assert os.path.exists(target_file)
+
+def playlists_referencing(path):
+    return SimpleNamespace(playlists=[SimpleNamespace(plugins=[SimpleNamespace(settings={"imageFiles[]": [path]})])])
+
+def test_collect_referenced_paths():
+    playlist_manager = SimpleNamespace(playlists=[
+        SimpleNamespace(plugins=[
+            SimpleNamespace(settings={"imageFiles[]": ["/saved/a/one.jpg", "/saved/b/two.jpg"], "randomize": "true"}),
+            SimpleNamespace(settings={"nested": {"file": "/saved/c/three.pdf"}}),
+        ]),
+    ])
+    paths = collect_referenced_paths(playlist_manager)
+    assert {"/saved/a/one.jpg", "/saved/b/two.jpg", "/saved/c/three.pdf"} <= paths
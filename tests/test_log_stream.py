@@ -0,0 +1,90 @@
+import gzip
+
+import pytest
+
+from src.utils.log_stream import LogFilter, format_journal_record, gzip_stream, iter_journal_entries, iter_log_lines, parse_limit
+
+MESSAGES = [
+    "12:00:00 - INFO - refresh_task - Running interval refresh check.",
+    "12:00:01 - INFO - plugins.weather.weather - Getting weather for 52.5, 13.4",
+    "12:00:02 - ERROR - plugins.weather.weather - Failed to fetch weather",
+    "Traceback (most recent call last):",
+    "requests.exceptions.Timeout: timed out",
+    "12:00:03 - WARNING - plugins.weather_extra.extra - Slow response",
+    "12:00:04 - ERROR - refresh_task - Exception during refresh",
+]
+
+def entries():
+    return [(f"Oct 19 12:00:00 inkypi python[1]: {message}", message) for message in MESSAGES]
+
+def kept(log_filter, limit=None):
+    return [line.split("python[1]: ", 1)[-1].rstrip("\n") for line in iter_log_lines(entries(), log_filter, limit)]
+
+class FakeRecord:
+    data = {"_HOSTNAME": "inkypi", "SYSLOG_IDENTIFIER": "python", "_PID": "7", "MESSAGE": "hello\n"}
+
+    def get_realtime_usec(self):
+        raise OverflowError
+
+class FakeReader:
+    def __init__(self, records):
+        self.records = records
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def close(self):
+        self.closed = True
+
+class TestLogStream:
+
+    def test_no_filter(self):
+        assert kept(None) == MESSAGES
+
+    def test_level_keeps_continuation_lines(self):
+        assert kept(LogFilter.from_args(level="error")) == [MESSAGES[2], MESSAGES[3], MESSAGES[4], MESSAGES[6]]
+
+    def test_plugin(self):
+        assert kept(LogFilter.from_args(plugin="weather")) == MESSAGES[1:5]
+
+    def test_substring(self):
+        assert kept(LogFilter.from_args(contains="REFRESH")) == [MESSAGES[0], MESSAGES[6]]
+
+    def test_limit(self):
+        assert kept(None, limit=2) == MESSAGES[:2] + ["... truncated after 2 lines"]
+
+    @pytest.mark.parametrize("value, expected", [(None, None), ("", None), ("20", 20)])
+    def test_parse_limit(self, value, expected):
+        assert parse_limit(value) == expected
+
+    @pytest.mark.parametrize("value", ["ten", "0", "-5", "1.5"])
+    def test_invalid_limit(self, value):
+        with pytest.raises(ValueError):
+            parse_limit(value)
+
+    def test_journal_reader_is_closed(self):
+        reader = FakeReader([FakeRecord(), FakeRecord()])
+        assert len(list(iter_journal_entries(reader))) == 2
+        assert reader.closed
+
+        # also when the download stops early, e.g. at the limit
+        reader = FakeReader([FakeRecord(), FakeRecord()])
+        lines = iter_log_lines(iter_journal_entries(reader), limit=1)
+        next(lines)
+        lines.close()
+        assert reader.closed
+
+    def test_unknown_level(self):
+        with pytest.raises(ValueError):
+            LogFilter.from_args(level="loud")
+
+    def test_gzip_stream(self):
+        lines = [f"line {number}\n" for number in range(2000)]
+        chunks = list(gzip_stream(iter(lines), flush_lines=100))
+
+        assert len(chunks) > 1
+        assert gzip.decompress(b"".join(chunks)).decode() == "".join(lines)
+
+    def test_format_journal_record(self):
+        assert format_journal_record(FakeRecord()) == ("??? ?? ??:??:?? inkypi python[7]: hello", "hello")
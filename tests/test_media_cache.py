@@ -0,0 +1,159 @@
+import os
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from PIL import Image
+
+from src.utils.media_cache import KEY_LOCK_STRIPES, MediaCache, latest_published_day, published_at
+
+DAY = date(2026, 10, 19)
+
+class CountingFetch:
+    """Fetch function returning a solid image per day and counting its calls."""
+
+    def __init__(self, size=(1600, 1200), missing=()):
+        self.size = size
+        self.missing = set(missing)
+        self.calls = []
+
+    def __call__(self, day):
+        self.calls.append(day)
+        if day in self.missing:
+            raise RuntimeError(f"Nothing published on {day}")
+        return {"title": f"Picture of {day.isoformat()}"}, Image.new("RGB", self.size, (day.day * 8, 0, 0))
+
+@pytest.fixture
+def cache(tmp_path):
+    return MediaCache(str(tmp_path))
+
+class TestMediaCache:
+
+    def test_fetches_once_and_scales_for_the_display(self, cache):
+        fetch = CountingFetch()
+        item = cache.get_or_fetch("apod", DAY, fetch, min_edge=800)
+        again = cache.get_or_fetch("apod", DAY, fetch, min_edge=800)
+
+        assert fetch.calls == [DAY]
+        assert item.metadata == {"title": "Picture of 2026-10-19"}
+        assert again.image.size == item.image.size == (1067, 800)
+        assert again.day == DAY
+
+    def test_persists_across_instances(self, tmp_path):
+        fetch = CountingFetch()
+        MediaCache(str(tmp_path)).get_or_fetch("newspaper/NYT", DAY, fetch, min_edge=480)
+
+        item = MediaCache(str(tmp_path)).get("newspaper/NYT", DAY, min_edge=480)
+        assert item is not None
+        assert item.metadata["title"] == "Picture of 2026-10-19"
+        assert len(fetch.calls) == 1
+
+    def test_refetches_for_a_larger_display(self, cache):
+        fetch = CountingFetch()
+        cache.get_or_fetch("apod", DAY, fetch, min_edge=480)
+        assert cache.get("apod", DAY, min_edge=1080) is None
+
+        item = cache.get_or_fetch("apod", DAY, fetch, min_edge=1080)
+        assert len(fetch.calls) == 2
+        assert min(item.image.size) == 1080
+        assert len(os.listdir(cache.directory)) == 2  # the image and the index
+
+    def test_small_images_are_kept_whole(self, cache):
+        fetch = CountingFetch(size=(300, 200))
+        cache.get_or_fetch("apod", DAY, fetch, min_edge=480)
+        assert cache.get("apod", DAY, min_edge=1080).image.size == (300, 200)
+
+    def test_images_with_transparency_stay_png(self, cache):
+        item = cache.put("wpotd", DAY, {}, Image.new("RGBA", (100, 100), (0, 0, 0, 0)))
+        assert item.image.mode == "RGBA"
+        assert cache.get("wpotd", DAY).image.mode == "RGBA"
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = MediaCache(str(tmp_path), max_entries=2)
+        fetch = CountingFetch(size=(10, 10))
+        for offset in range(3):
+            cache.get_or_fetch("apod", DAY + timedelta(days=offset), fetch)
+
+        assert cache.get("apod", DAY) is None
+        assert cache.get("apod", DAY + timedelta(days=2)) is not None
+        assert len([name for name in os.listdir(cache.directory) if name.endswith(".jpg")]) == 2
+
+    def test_fetch_errors_propagate(self, cache):
+        with pytest.raises(RuntimeError):
+            cache.get_or_fetch("apod", DAY, CountingFetch(missing={DAY}))
+        assert cache.get("apod", DAY) is None
+
+    def test_key_locks_are_bounded(self, cache):
+        for offset in range(100):
+            cache.get_or_fetch("apod", DAY - timedelta(days=offset), CountingFetch(size=(10, 10)))
+
+        assert len(cache.key_locks) == KEY_LOCK_STRIPES
+        assert cache._key_lock("apod/2026-10-19") is cache._key_lock("apod/2026-10-19")
+
+class TestPrefetch:
+
+    def test_prefetch_now(self, cache):
+        fetch = CountingFetch()
+        cache.prefetch("apod", DAY, fetch, min_edge=800).result()
+
+        assert cache.contains("apod", DAY, min_edge=800)
+        # cached items aren't prefetched again
+        assert cache.prefetch("apod", DAY, fetch, min_edge=800) is None
+        assert fetch.calls == [DAY]
+
+    def test_prefetch_later_is_scheduled(self, cache):
+        at = datetime.now(timezone.utc) + timedelta(hours=1)
+        assert cache.prefetch("apod", DAY, CountingFetch(), at=at) is None
+        assert cache.pending == {"apod/2026-10-19"}
+
+    def test_failed_prefetch_waits_before_retrying(self, cache):
+        fetch = CountingFetch(missing={DAY})
+        cache.prefetch("newspaper/NYT", DAY, fetch).result()
+
+        assert cache.prefetch("newspaper/NYT", DAY, fetch) is None
+        assert fetch.calls == [DAY]
+        assert not cache.pending
+
+class TestRandomPool:
+
+    def test_fill_and_take(self, cache):
+        days = iter(DAY - timedelta(days=offset) for offset in range(100))
+        fetch = CountingFetch(size=(10, 10))
+        cache.fill_pool("wpotd", 3, lambda: next(days), fetch).result()
+        assert cache.pool_size("wpotd") == 3
+
+        item = cache.take_random("wpotd")
+        assert item.day in fetch.calls
+        assert cache.pool_size("wpotd") == 2
+        # a taken item stays cached for its day
+        assert cache.get("wpotd", item.day) is not None
+
+    def test_fill_skips_failing_days(self, cache):
+        days = iter([DAY, DAY - timedelta(days=1), DAY - timedelta(days=2)])
+        fetch = CountingFetch(size=(10, 10), missing={DAY})
+        cache.fill_pool("apod", 2, lambda: next(days), fetch).result()
+        assert cache.pool_size("apod") == 2
+
+    def test_refill_removes_items_for_smaller_displays(self, cache):
+        days = iter(DAY - timedelta(days=offset) for offset in range(100))
+        fetch = CountingFetch()
+        cache.fill_pool("apod", 2, lambda: next(days), fetch, min_edge=480).result()
+        small_files = set(os.listdir(cache.directory))
+
+        cache.fill_pool("apod", 2, lambda: next(days), fetch, min_edge=800).result()
+
+        assert cache.pool_size("apod") == cache.pool_size("apod", 800) == 2
+        assert not small_files & set(os.listdir(cache.directory)) - {"index.json"}
+
+    def test_empty_pool(self, cache):
+        assert cache.take_random("apod") is None
+        assert cache.fill_pool("apod", 0, lambda: DAY, CountingFetch()) is None
+
+class TestPublication:
+
+    def test_published_at(self):
+        assert published_at(DAY, timedelta(hours=5)) == datetime(2026, 10, 19, 5, tzinfo=timezone.utc)
+
+    def test_latest_published_day(self):
+        delay = timedelta(hours=5)
+        assert latest_published_day(delay, datetime(2026, 10, 19, 4, tzinfo=timezone.utc)) == date(2026, 10, 18)
+        assert latest_published_day(delay, datetime(2026, 10, 19, 6, tzinfo=timezone.utc)) == DAY
@@ -0,0 +1,69 @@
+import pytest
+
+from src.utils.metrics import Histogram, MetricsRegistry, plugin_context, track_generate, mark_render_start
+
+class TestHistogram:
+
+    def test_observe_buckets_and_percentiles(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 2.0):
+            histogram.observe(value)
+
+        assert histogram.bucket_counts == [1, 2, 1]
+        assert histogram.count == 4
+        assert histogram.sum == pytest.approx(3.05)
+        assert histogram.max == 2.0
+        assert histogram.percentile(50) == 0.5
+        assert histogram.percentile(100) == 2.0
+
+    def test_empty_percentile(self):
+        assert Histogram().percentile(95) is None
+
+class TestMetricsRegistry:
+
+    def test_plugin_context_labels_metrics(self):
+        registry = MetricsRegistry()
+        with plugin_context("clock"):
+            registry.observe("hash", 0.01)
+            registry.inc("refreshes")
+        registry.observe("hash", 0.02, plugin_id="weather")
+
+        snapshot = registry.snapshot()
+        assert [(s["stage"], s["plugin_id"]) for s in snapshot["stages"]] == [("hash", "clock"), ("hash", "weather")]
+        assert snapshot["counters"] == [{"name": "refreshes", "plugin_id": "clock", "value": 1}]
+
+    def test_render_prometheus(self):
+        registry = MetricsRegistry(buckets=(0.1, 1.0))
+        registry.observe("screenshot", 0.5, plugin_id="clock")
+        registry.inc("refreshes", plugin_id="clock")
+
+        text = registry.render_prometheus()
+        assert 'inkypi_stage_duration_seconds_bucket{plugin="clock",stage="screenshot",le="0.1"} 0' in text
+        assert 'inkypi_stage_duration_seconds_bucket{plugin="clock",stage="screenshot",le="1.0"} 1' in text
+        assert 'inkypi_stage_duration_seconds_bucket{plugin="clock",stage="screenshot",le="+Inf"} 1' in text
+        assert 'inkypi_stage_duration_seconds_count{plugin="clock",stage="screenshot"} 1' in text
+        assert 'inkypi_refreshes_total{plugin="clock"} 1' in text
+
+    def test_track_generate_splits_data_fetch(self):
+        registry = MetricsRegistry()
+        with track_generate(registry):
+            mark_render_start()
+        with track_generate(registry):
+            pass
+
+        stages = {s["stage"]: s for s in registry.snapshot()["stages"]}
+        assert stages["generate"]["count"] == 2
+        assert stages["data_fetch"]["count"] == 2
+        assert stages["data_fetch"]["sum"] <= stages["generate"]["sum"]
+
+    def test_timers_are_recorded_as_trace_spans(self):
+        from src.utils import metrics
+        registry = MetricsRegistry()
+        tracer = metrics.tracing.Tracer()
+        with tracer.trace("refresh") as trace:
+            with registry.timer("hash"):
+                pass
+            with track_generate(registry):
+                pass
+
+        assert sorted(name for name, *_ in trace.spans) == ["data_fetch", "generate", "hash"]
@@ -1,6 +1,8 @@
 import pytest
 
-from src.model import Playlist
+from datetime import datetime, timezone
+
+from src.model import Playlist, PlaylistManager
 
 class TestPlaylist:
 
@@ -49,4 +51,70 @@ class TestPlaylist:
         playlist = Playlist("Test Playlist", start, end)
         assert playlist.is_active(current) == expected
         assert playlist.get_priority() == priority
-        
\ No newline at end of file
+        
+def plugin_data(plugin_id, name, refresh=None, latest_refresh_time=None):
+    return {"plugin_id": plugin_id, "name": name, "plugin_settings": {"key": name},
+            "refresh": refresh or {"interval": 3600}, "latest_refresh_time": latest_refresh_time}
+
+class TestPlaylistManager:
+
+    CONFIG = {
+        "playlists": [
+            {"name": "Default", "start_time": "00:00", "end_time": "24:00", "current_plugin_index": 1,
+             "plugins": [plugin_data("clock", "Clock"),
+                         plugin_data("apod", "Space", {"scheduled": "07:30"}, "2026-10-18T08:00:00+00:00")]},
+            {"name": "Night", "start_time": "21:00", "end_time": "03:00", "current_plugin_index": None,
+             "plugins": [plugin_data("clock", "Night Clock", latest_refresh_time="2026-10-19T01:00:00+00:00")]},
+        ],
+        "active_playlist": "Default",
+    }
+
+    def test_round_trip(self):
+        assert PlaylistManager.from_dict(self.CONFIG).to_dict() == self.CONFIG
+
+    def test_find_plugin(self):
+        manager = PlaylistManager.from_dict(self.CONFIG)
+        default = manager.get_playlist("Default")
+
+        assert manager.find_plugin("clock", "Night Clock").name == "Night Clock"
+        assert manager.find_plugin("clock", "Space") is None
+
+        assert default.add_plugin(plugin_data("rss", "News"))
+        assert not default.add_plugin(plugin_data("rss", "News"))
+        assert manager.find_plugin("rss", "News") is default.plugins[-1]
+
+        assert default.update_plugin("rss", "News", {"name": "Headlines"})
+        assert manager.find_plugin("rss", "News") is None
+        assert manager.find_plugin("rss", "Headlines").name == "Headlines"
+
+        assert default.delete_plugin("rss", "Headlines")
+        assert manager.find_plugin("rss", "Headlines") is None
+
+    def test_active_playlist(self):
+        manager = PlaylistManager.from_dict(self.CONFIG)
+
+        assert manager.determine_active_playlist(datetime(2026, 10, 19, 12, 0)).name == "Default"
+        assert manager.determine_active_playlist(datetime(2026, 10, 19, 22, 0)).name == "Night"
+
+        manager.update_playlist("Night", "Night", "10:00", "14:00")
+        assert manager.determine_active_playlist(datetime(2026, 10, 19, 12, 0)).name == "Night"
+
+    def test_should_refresh_follows_updates(self):
+        manager = PlaylistManager.from_dict(self.CONFIG)
+        clock = manager.find_plugin("clock", "Night Clock")
+        space = manager.find_plugin("apod", "Space")
+        current_dt = datetime(2026, 10, 19, 8, 0, tzinfo=timezone.utc)
+
+        assert clock.should_refresh(current_dt)
+        clock.latest_refresh_time = "2026-10-19T07:30:00+00:00"
+        assert not clock.should_refresh(current_dt)
+        assert clock.get_latest_refresh_dt() == datetime(2026, 10, 19, 7, 30, tzinfo=timezone.utc)
+
+        # refreshed yesterday after the scheduled time, due again after it today
+        assert space.should_refresh(current_dt)
+        assert not space.should_refresh(datetime(2026, 10, 19, 7, 0, tzinfo=timezone.utc))
+
+    def test_slots(self):
+        manager = PlaylistManager.from_dict(self.CONFIG)
+        for obj in (manager, manager.playlists[0], manager.playlists[0].plugins[0]):
+            assert not hasattr(obj, "__dict__")
@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+from src.utils.packed_rle import rle_decode, rle_encode, RLE_HEADER
+
+def make_frame():
+    """A white 800x480 frame with a black bar and some noisy text-like rows."""
+    rng = random.Random(3)
+    rows = []
+    for y in range(480):
+        if 100 <= y < 140:
+            rows.append(b"\x11" * 50 + b"\x00" * 300 + b"\x11" * 50)
+        elif 300 <= y < 320:
+            rows.append(bytes(rng.choice((0x00, 0x01, 0x10, 0x11)) for _ in range(400)))
+        else:
+            rows.append(b"\x11" * 400)
+    return b"".join(rows)
+
+class TestPackedRle:
+
+    def test_round_trip(self):
+        frame = make_frame()
+        encoded = rle_encode(frame)
+
+        assert rle_decode(encoded) == frame
+        assert len(encoded) < len(frame) / 10
+
+    @pytest.mark.parametrize("data", [
+        b"",
+        b"\x42",
+        b"\x01\x02",
+        b"\x07" * 3,
+        b"\x07" * 130,
+        b"\x07" * 131,
+        b"\x07" * 132,
+        bytes(range(256)) * 3,
+        b"ab" + b"\x00" * 1000 + b"cd",
+    ])
+    def test_edge_cases_round_trip(self, data):
+        assert rle_decode(rle_encode(data)) == data
+
+    def test_incompressible_data_grows_little(self):
+        data = bytes(random.Random(1).randrange(256) for _ in range(10_000))
+        assert len(rle_encode(data)) <= len(data) + len(data) // 128 + RLE_HEADER.size + 1
+
+    def test_corrupt_data(self):
+        encoded = rle_encode(make_frame())
+        with pytest.raises(ValueError):
+            rle_decode(encoded[:len(encoded) // 2])
+        with pytest.raises(ValueError):
+            rle_decode(b"XXXX" + encoded[4:])
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.utils.palette import Palette, PALETTES, build_lut, get_palette, srgb_to_oklab
+
+SPECTRA6 = PALETTES["spectra6"]
+
+class TestPalette:
+
+    def test_lut_shape(self):
+        lut = build_lut(SPECTRA6["measured"])
+
+        assert lut.shape == (64, 64, 64)
+        assert lut.dtype == np.uint8
+        assert set(np.unique(lut)) == set(range(6))
+
+    def test_colors_map_to_their_own_index(self):
+        palette = Palette("test", SPECTRA6["colors"], SPECTRA6["measured"])
+
+        assert palette.map(np.array(SPECTRA6["measured"])).tolist() == list(range(6))
+        assert palette.map(np.array(SPECTRA6["colors"])).tolist() == list(range(6))
+
+    def test_lut_is_stored_and_reloaded(self, tmp_path):
+        palette = Palette("test", SPECTRA6["colors"], SPECTRA6["measured"], cache_dir=str(tmp_path))
+        lut = palette.lut()
+        path = tmp_path / f"palette_lut_test_{palette.lut_key()}.npy"
+        assert path.exists()
+
+        reloaded = Palette("test", SPECTRA6["colors"], SPECTRA6["measured"], cache_dir=str(tmp_path))
+        assert np.array_equal(reloaded.lut(), lut)
+        assert os.listdir(tmp_path) == [path.name]
+
+    def test_lut_key_follows_measured_colors(self):
+        first = Palette("test", SPECTRA6["colors"])
+        second = Palette("test", SPECTRA6["colors"], SPECTRA6["measured"])
+        assert first.lut_key() != second.lut_key()
+
+    def test_mismatched_measured_colors(self):
+        with pytest.raises(ValueError):
+            Palette("test", SPECTRA6["colors"], SPECTRA6["measured"][:5])
+
+    def test_oklab(self):
+        assert np.allclose(srgb_to_oklab([255, 255, 255]), [1, 0, 0], atol=1e-4)
+        assert np.allclose(srgb_to_oklab([0, 0, 0]), [0, 0, 0], atol=1e-6)
+
+    def test_get_palette_is_shared(self):
+        assert get_palette("spectra6") is get_palette("spectra6")
@@ -0,0 +1,87 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from src.utils.panel_profiles import PANEL_PROFILES, PanelProfile, get_panel_profile, pack_pixels
+
+def indices_image(indices):
+    indices = np.asarray(indices, dtype=np.uint8)
+    return Image.frombytes("P", (indices.shape[1], indices.shape[0]), indices.tobytes())
+
+class TestPanelProfiles:
+
+    def test_pack_pixels(self):
+        values = np.array([[1, 2, 3, 4], [5, 6, 7, 0]], dtype=np.uint8)
+
+        assert pack_pixels(values, 4) == bytes([0x12, 0x34, 0x56, 0x70])
+        assert pack_pixels(values, 4, "lsb") == bytes([0x21, 0x43, 0x65, 0x07])
+        assert pack_pixels(values, 8) == bytes([1, 2, 3, 4, 5, 6, 7, 0])
+
+    def test_pack_pixels_pads_rows(self):
+        values = np.array([[1] * 10, [0] * 9 + [1]], dtype=np.uint8)
+        assert pack_pixels(values, 1) == bytes([0xFF, 0xC0, 0x00, 0x40])
+
+    def test_spectra6_matches_nibble_packing(self):
+        indices = np.random.default_rng(1).integers(0, 6, (480, 800), dtype=np.uint8)
+        flat = indices.ravel()
+
+        assert PANEL_PROFILES["spectra6"].encode(indices_image(indices)) == bytes((flat[0::2] << 4) | flat[1::2])
+
+    def test_color_codes(self):
+        profile = get_panel_profile("epd7in3e")
+        indices = np.array([[0, 1, 2, 3, 4, 5] * 2], dtype=np.uint8)
+        small = PanelProfile("small", 12, 1, "spectra6", color_codes=profile.color_codes)
+
+        assert small.encode(indices_image(indices)) == bytes([0x01, 0x65, 0x32] * 2)
+
+    def test_rotation(self):
+        profile = PanelProfile("rotated", 2, 4, "spectra6", bits_per_pixel=8, rotation=90)
+        frame = np.array([[0, 1, 2, 3], [4, 5, 0, 1]], dtype=np.uint8)
+
+        assert profile.frame_size == (4, 2)
+        # turned counter-clockwise, the last column becomes the first row
+        assert profile.encode(indices_image(frame)) == bytes([3, 1, 2, 0, 1, 5, 0, 4])
+
+    def test_planes(self):
+        profile = PanelProfile("bicolor", 8, 1, "spectra6", color_codes=[2, 3, 0, 0, 1, 0], bits_per_pixel=1, planes=2)
+        buffer = profile.encode(indices_image([[0, 1, 4, 1, 1, 1, 1, 0]]))
+
+        assert len(buffer) == profile.buffer_bytes == 2
+        assert profile.split_planes(buffer) == [bytes([0b01111110]), bytes([0b11011111])]
+
+    def test_fit_turns_portrait_frames(self):
+        profile = PANEL_PROFILES["epd7in3f"]
+        portrait = Image.new("RGB", (480, 800), (255, 255, 255))
+
+        assert profile.fit(portrait).size == (800, 480)
+        assert profile.fit(Image.new("RGB", (1600, 960))).size == (800, 480)
+
+    def test_remote_profile_keeps_portrait_frames(self):
+        profile = PANEL_PROFILES["spectra6"]
+        portrait = Image.new("RGB", (480, 800), (255, 255, 255))
+        portrait.paste((0, 0, 0), (0, 0, 2, 1))
+        buffer = profile.encode_image(portrait, "none")
+
+        # packed at the frame's own size and row order, like before panel profiles
+        assert profile.fit(portrait) is portrait
+        assert len(buffer) == 480 * 800 // 2
+        assert buffer[:2] == bytes([0x00, 0x11])
+        assert set(buffer[1:]) == {0x11}
+        assert profile.frame_row_bytes(portrait.size) == 240
+        assert PANEL_PROFILES["epd7in3f"].frame_row_bytes(portrait.size) == 400
+
+    def test_encode_image(self):
+        profile = PANEL_PROFILES["epd7in5_V2"]
+        buffer = profile.encode_image(Image.new("RGB", (800, 480), (0, 0, 0)), "none")
+
+        assert len(buffer) == profile.buffer_bytes == 48000
+        assert set(buffer) == {0xFF}
+
+    def test_invalid_profiles(self):
+        with pytest.raises(ValueError):
+            PanelProfile("bad", 8, 8, "mono", bits_per_pixel=3)
+        with pytest.raises(ValueError):
+            PanelProfile("bad", 8, 8, "mono", rotation=45)
+        with pytest.raises(ValueError):
+            PanelProfile("bad", 8, 8, "mono", bits_per_pixel=4, planes=2)
@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+
+from src.utils.profiler import SamplingProfiler, get_profile_job, profile_next_refresh, start_profile
+from src.utils.tracing import Tracer
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+def run_thread(target, *args, name):
+    thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+    thread.start()
+    return thread
+
+class TestSamplingProfiler:
+
+    def test_samples_other_threads(self):
+        stop = threading.Event()
+        worker = run_thread(busy_loop, stop, name="refresh-worker")
+        profiler = SamplingProfiler(interval=0.001)
+        try:
+            profiler.run(0.05)
+        finally:
+            stop.set()
+            worker.join()
+
+        assert profiler.samples > 0
+        assert profiler.duration >= 0.05
+        threads = {thread_name for thread_name, _ in profiler.stacks}
+        assert "refresh-worker" in threads
+        # the profiling thread leaves itself out
+        assert threading.current_thread().name not in threads
+        stacks = [stack for thread_name, stack in profiler.stacks if thread_name == "refresh-worker"]
+        assert any(stack[-1].startswith("busy_loop (") for stack in stacks)
+
+    def test_idle_threads_are_left_out(self):
+        stop = threading.Event()
+        waiter = run_thread(stop.wait, name="idle-worker")
+        try:
+            profiler = SamplingProfiler(interval=0.001)
+            profiler.sample()
+            with_idle = SamplingProfiler(interval=0.001, include_idle=True)
+            with_idle.sample()
+        finally:
+            stop.set()
+            waiter.join()
+
+        assert "idle-worker" not in {thread_name for thread_name, _ in profiler.stacks}
+        assert "idle-worker" in {thread_name for thread_name, _ in with_idle.stacks}
+
+    def test_outputs(self):
+        profiler = SamplingProfiler(interval=0.01)
+        profiler.stacks.update({
+            ("MainThread", ("main (inkypi.py:1)", "serve (waitress/server.py:10)")): 3,
+            ("Thread-1", ("_run (refresh_task.py:50)",)): 1,
+        })
+
+        assert profiler.to_collapsed() == (
+            "MainThread;main (inkypi.py:1);serve (waitress/server.py:10) 3\n"
+            "Thread-1;_run (refresh_task.py:50) 1\n"
+        )
+
+        document = json.loads(json.dumps(profiler.to_speedscope()))
+        frames = document["shared"]["frames"]
+        assert frames[0] == {"name": "main", "file": "inkypi.py", "line": 1}
+        profiles = {profile["name"]: profile for profile in document["profiles"]}
+        assert profiles["MainThread"]["samples"] == [[0, 1]]
+        assert profiles["MainThread"]["weights"] == [0.03]
+        assert profiles["Thread-1"]["endValue"] == 0.01
+
+class TestProfileNextRefresh:
+
+    def test_profiles_only_the_refresh(self):
+        tracer = Tracer()
+
+        def refresh(stop):
+            time.sleep(0.02)
+            with tracer.trace("refresh"):
+                end = time.perf_counter() + 0.05
+                while time.perf_counter() < end:
+                    sum(range(1000))
+            stop.wait()
+
+        stop = threading.Event()
+        worker = run_thread(refresh, stop, name="refresh")
+        profiler = SamplingProfiler(interval=0.001)
+        try:
+            traces = profile_next_refresh(profiler, tracer, timeout=5, max_seconds=5)
+        finally:
+            stop.set()
+            worker.join()
+
+        assert [trace.name for trace in traces] == ["refresh"]
+        assert profiler.samples > 0
+        assert profiler.duration < 1
+
+    def test_no_refresh_within_timeout(self):
+        profiler = SamplingProfiler(interval=0.001)
+        assert profile_next_refresh(profiler, Tracer(), timeout=0.01, max_seconds=1) == []
+        assert profiler.samples == 0
+
+class TestStartProfile:
+
+    def test_runs_on_its_own_thread(self):
+        job = start_profile(SamplingProfiler(interval=0.001), 0.05)
+        assert job is not None
+        # one profile at a time
+        assert start_profile(SamplingProfiler(interval=0.001), 0.05) is None
+
+        assert job.done_event.wait(5)
+        assert get_profile_job(job.id) is job
+        assert job.status == "done"
+        assert job.to_dict()["samples"] > 0
+        # the profiling thread leaves itself out, and the caller isn't blocked or sampled as waiting
+        assert "profiler" not in {thread_name for thread_name, _ in job.profiler.stacks}
+
+        second = start_profile(SamplingProfiler(interval=0.001), 0.01)
+        assert second is not None and second.done_event.wait(5)
+
+    def test_no_refresh_within_timeout(self):
+        job = start_profile(SamplingProfiler(interval=0.001), 1, Tracer(), timeout=0.01)
+        assert job.done_event.wait(5)
+        assert job.status == "timeout"
+        assert job.traces == []
@@ -0,0 +1,26 @@
+from src.utils.render_sharing import frame_size, group_render_jobs, render_key
+
+IMAGE_URL = {"id": "image_url"}
+APOD = {"id": "apod"}
+
+class TestRenderSharing:
+
+    def test_frame_size(self):
+        assert frame_size([800, 480], "horizontal") == (800, 480)
+        assert frame_size([800, 480], "vertical") == (480, 800)
+
+    def test_same_settings_and_size_share(self):
+        first = render_key(IMAGE_URL, {"url": "a", "fit": True}, (800, 480))
+        assert first == render_key(IMAGE_URL, {"fit": True, "url": "a"}, (800, 480))
+        assert first != render_key(IMAGE_URL, {"url": "a", "fit": True}, (480, 800))
+        assert first != render_key(IMAGE_URL, {"url": "b", "fit": True}, (800, 480))
+
+    def test_groups_jobs_sharing_a_render(self):
+        jobs = [
+            (render_key(APOD, {}, (800, 480)), "kitchen"),
+            (render_key(APOD, {}, (1600, 1200)), "hall"),
+            (render_key(APOD, {}, (800, 480)), "office"),
+        ]
+        groups = group_render_jobs(jobs)
+
+        assert groups == [("kitchen", ["kitchen", "office"]), ("hall", ["hall"])]
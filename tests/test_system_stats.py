@@ -0,0 +1,68 @@
+import types
+
+import pytest
+
+pytest.importorskip("psutil")
+
+from src.utils import system_stats
+from src.utils.system_stats import SystemStatsSampler
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the sampler's clock with one advanced by the test."""
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(system_stats, "time", types.SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+def take_samples(sampler, clock, count, step=10):
+    for _ in range(count):
+        sampler.sample()
+        clock.now += step
+
+class TestSystemStatsSampler:
+
+    def test_ring_buffer_keeps_the_newest_samples(self, clock):
+        sampler = SystemStatsSampler(max_samples=3)
+        take_samples(sampler, clock, 5)
+
+        timestamps = [sample["timestamp"] for sample in sampler.get_samples()]
+        assert timestamps == [1020.0, 1030.0, 1040.0]
+        assert sampler.latest()["timestamp"] == 1040.0
+
+    def test_since_returns_only_newer_samples(self, clock):
+        sampler = SystemStatsSampler(max_samples=10)
+        take_samples(sampler, clock, 4)
+
+        assert [sample["timestamp"] for sample in sampler.get_samples(since=1010.0)] == [1020.0, 1030.0]
+        assert sampler.get_samples(since=1030.0) == []
+        assert len(sampler.get_samples(since=0)) == 4
+
+    def test_since_after_wraparound(self, clock):
+        sampler = SystemStatsSampler(max_samples=2)
+        take_samples(sampler, clock, 4)
+
+        # samples dropped from the buffer aren't returned even if newer than `since`
+        assert [sample["timestamp"] for sample in sampler.get_samples(since=1000.0)] == [1020.0, 1030.0]
+
+    def test_samples_are_copies(self, clock):
+        sampler = SystemStatsSampler(max_samples=2)
+        take_samples(sampler, clock, 1)
+        samples = sampler.get_samples()
+        take_samples(sampler, clock, 2)
+
+        assert len(samples) == 1
+        assert len(sampler.get_samples()) == 2
+
+    def test_network_rates_need_a_previous_sample(self, clock):
+        sampler = SystemStatsSampler()
+        first = sampler.sample()
+        clock.now += 10
+        second = sampler.sample()
+
+        assert first["net_sent_bytes_per_sec"] is None
+        assert second["net_sent_bytes_per_sec"] is not None and second["net_sent_bytes_per_sec"] >= 0
+
+    def test_empty(self):
+        sampler = SystemStatsSampler()
+        assert sampler.latest() is None
+        assert sampler.get_samples() == []
@@ -0,0 +1,99 @@
+import json
+import threading
+
+from src.utils.tracing import Tracer, add_span, annotate, current_trace, span, to_chrome_trace, use_trace
+
+class TestTracer:
+
+    def test_records_spans_of_the_current_trace(self):
+        tracer = Tracer()
+        with tracer.trace("refresh") as trace:
+            assert tracer.get_active() == [trace]
+            with span("hash", size=3):
+                pass
+            annotate(plugin_id="clock")
+
+        assert current_trace() is None
+        assert tracer.get_traces() == [trace]
+        assert tracer.get_active() == []
+        assert [(name, args) for name, _, _, _, args in trace.spans] == [("hash", {"size": 3})]
+        assert trace.args == {"plugin_id": "clock"}
+        assert trace.end >= trace.start
+
+    def test_spans_outside_a_trace_are_ignored(self):
+        with span("hash"):
+            pass
+        add_span("generate", 0.0, 1.0)
+        annotate(plugin_id="clock")
+        assert current_trace() is None
+
+    def test_ring_buffer_keeps_the_last_traces(self):
+        tracer = Tracer(capacity=3)
+        for _ in range(5):
+            with tracer.trace("refresh"):
+                pass
+        assert [trace.id for trace in tracer.get_traces()] == [3, 4, 5]
+        assert [trace.id for trace in tracer.get_traces(last=2)] == [4, 5]
+
+        tracer.resize(2)
+        assert [trace.id for trace in tracer.get_traces()] == [4, 5]
+
+    def test_discarded_and_failed_traces(self):
+        tracer = Tracer()
+        with tracer.trace("refresh") as trace:
+            trace.discard()
+        try:
+            with tracer.trace("refresh"):
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+
+        traces = tracer.get_traces()
+        assert len(traces) == 1
+        assert traces[0].args["error"] == "RuntimeError('boom')"
+
+    def test_work_on_other_threads_joins_the_trace(self):
+        tracer = Tracer()
+        with tracer.trace("target_refresh") as trace:
+            def render():
+                with use_trace(trace), span("generate"):
+                    pass
+            worker = threading.Thread(target=render)
+            worker.start()
+            worker.join()
+
+        assert [name for name, *_ in trace.spans] == ["generate"]
+        assert trace.spans[0][3] == worker.ident
+
+class TestChromeTrace:
+
+    def test_trace_events(self):
+        tracer = Tracer()
+        with tracer.trace("refresh", plugin_id="clock") as trace:
+            with span("wait"):
+                pass
+            with span("display_write"):
+                pass
+
+        document = json.loads(json.dumps(to_chrome_trace(tracer.get_traces())))
+        events = document["traceEvents"]
+        complete = [event for event in events if event["ph"] == "X"]
+        assert [event["name"] for event in complete] == ["refresh", "wait", "display_write"]
+        assert all(event["pid"] == trace.id and event["dur"] >= 0 for event in complete)
+        assert complete[0]["ts"] == 0
+        assert complete[0]["args"]["plugin_id"] == "clock"
+        assert complete[1]["ts"] <= complete[2]["ts"]
+
+        names = {event["name"]: event["args"]["name"] for event in events if event["ph"] == "M" and "name" in event["args"]}
+        assert names["process_name"] == f"#{trace.id} refresh clock"
+
+    def test_empty(self):
+        assert to_chrome_trace([]) == {"traceEvents": [], "displayTimeUnit": "ms"}
+
+    def test_spans_before_the_trace_start_the_timeline(self):
+        tracer = Tracer()
+        with tracer.trace("refresh") as trace:
+            add_span("wait", trace.start - 1.0, trace.start)
+
+        complete = [event for event in to_chrome_trace(tracer.get_traces())["traceEvents"] if event["ph"] == "X"]
+        assert [(event["name"], event["ts"]) for event in complete] == [("refresh", 1_000_000), ("wait", 0)]
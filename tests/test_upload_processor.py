@@ -0,0 +1,112 @@
+import os
+from concurrent.futures import Future
+
+import pytest
+
+from src.utils.upload_processor import UploadJob, UploadProcessor
+
+def staged(key, name):
+    return {"key": key, "name": name, "staged_path": f"/tmp/.{name}.upload", "path": f"/saved/{name}",
+            "status": "queued"}
+
+class TestUploadJob:
+
+    def test_completed_paths_keep_upload_order(self):
+        job = UploadJob([staged("imageFiles[]", "a.jpg"), staged("imageFiles[]", "b.jpg"),
+                         staged("other", "c.jpg")])
+        job.files[1]["status"] = "done"
+        job.files[2]["status"] = "done"
+        assert job.completed_paths("imageFiles[]") == ["/saved/b.jpg"]
+
+        job.files[0]["status"] = "done"
+        assert job.completed_paths("imageFiles[]") == ["/saved/a.jpg", "/saved/b.jpg"]
+
+    def test_progress(self):
+        job = UploadJob([staged("imageFiles[]", "a.jpg"), staged("imageFiles[]", "b.jpg")])
+        running = Future()
+        running.set_running_or_notify_cancel()
+        job.files[0]["future"] = running
+        job.files[1].update(status="failed", error="broken")
+
+        progress = job.to_dict()
+        assert progress["done"] is False
+        assert progress["completed"] == 1
+        assert progress["total"] == 2
+        assert [f["status"] for f in progress["files"]] == ["processing", "failed"]
+
+class TestUploadProcessor:
+
+    def test_file_callbacks_and_completion(self):
+        processor = UploadProcessor()
+        updates = []
+        job = UploadJob([staged("imageFiles[]", "a.jpg"), staged("imageFiles[]", "b.jpg")],
+                        on_file_done=lambda job: updates.append(job.completed_paths("imageFiles[]")))
+
+        succeeded, failed = Future(), Future()
+        succeeded.set_result("/saved/a.jpg")
+        failed.set_exception(OSError("disk full"))
+
+        processor._file_done(job, job.files[0], succeeded)
+        assert not job.is_done()
+        processor._file_done(job, job.files[1], failed)
+
+        assert updates == [["/saved/a.jpg"], ["/saved/a.jpg"]]
+        assert job.files[1]["error"] == "disk full"
+        assert processor.wait(job, timeout=0)
+
+    def test_empty_job_is_done_immediately(self):
+        processor = UploadProcessor()
+        job = processor.submit([])
+        assert job.is_done()
+        assert processor.get_job(job.id) is job
+        assert processor.executor is None
+
+    def test_converts_in_worker_processes(self, tmp_path):
+        # the workers import utils.app_utils, which needs the image utilities' dependencies
+        pytest.importorskip("requests")
+        Image = pytest.importorskip("PIL.Image")
+        Image.new("RGB", (40, 20), (255, 0, 0)).save(tmp_path / ".a.upload", format="PNG")
+        (tmp_path / ".b.upload").write_bytes(b"not an image")
+
+        processor = UploadProcessor(max_workers=1)
+        try:
+            job = processor.submit([
+                {"key": "imageFiles[]", "name": "a.png", "staged_path": str(tmp_path / ".a.upload"), "path": str(tmp_path / "a.png")},
+                {"key": "imageFiles[]", "name": "b.png", "staged_path": str(tmp_path / ".b.upload"), "path": str(tmp_path / "b.png"),
+                 "raw_path": str(tmp_path / "raw" / "b.png")},
+            ], resize_options={"orientation": "horizontal", "display_size": (10, 10)})
+            assert processor.wait(job, timeout=60)
+        finally:
+            processor.shutdown()
+
+        assert [f["status"] for f in job.to_dict()["files"]] == ["done", "done"]
+        with Image.open(tmp_path / "a.png") as image:
+            assert image.size == (10, 10)
+        # files that can't be processed are kept as uploaded, away from the processed path
+        assert job.completed_paths("imageFiles[]") == [str(tmp_path / "a.png"), str(tmp_path / "raw" / "b.png")]
+        assert (tmp_path / "raw" / "b.png").read_bytes() == b"not an image"
+        assert sorted(os.listdir(tmp_path)) == ["a.png", "raw"]
+
+    def test_converts_heif_in_worker_processes(self, tmp_path):
+        pytest.importorskip("requests")
+        pytest.importorskip("pi_heif")
+        # pi_heif only decodes, the upload is encoded with pillow_heif
+        pillow_heif = pytest.importorskip("pillow_heif")
+        Image = pytest.importorskip("PIL.Image")
+        pillow_heif.from_pillow(Image.new("RGB", (40, 20), (255, 0, 0))).save(str(tmp_path / ".photo.upload"))
+
+        processor = UploadProcessor(max_workers=1)
+        try:
+            job = processor.submit([
+                {"key": "imageFiles[]", "name": "photo.heic", "staged_path": str(tmp_path / ".photo.upload"),
+                 "path": str(tmp_path / "photo.heic"), "raw_path": str(tmp_path / "raw" / "photo.heic")},
+            ], resize_options={"orientation": "horizontal", "display_size": (10, 10)})
+            assert processor.wait(job, timeout=60)
+        finally:
+            processor.shutdown()
+
+        # the workers open HEIF uploads, so they are processed rather than stored raw, as PNG
+        assert job.completed_paths("imageFiles[]") == [str(tmp_path / "photo.png")]
+        with Image.open(tmp_path / "photo.png") as image:
+            assert image.size == (10, 10)
+        assert not (tmp_path / "raw").exists()
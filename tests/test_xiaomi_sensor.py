@@ -0,0 +1,85 @@
+import time
+
+from src.plugins.weather.xiaomi_sensor import (
+    ENVIRONMENTAL_SENSING_UUID, SimulatedAdvertisementSource, XiaomiSensorListener,
+    decode_gatt_reading, decode_service_data,
+)
+
+SENSOR_MAC = "A4:C1:38:47:61:0B"
+
+def atc_advertisement(temperature, humidity, battery=87, millivolts=2950):
+    data = bytes.fromhex("A4C13847610B")
+    data += int(temperature * 10).to_bytes(2, "big", signed=True)
+    data += bytes([humidity, battery]) + millivolts.to_bytes(2, "big") + bytes([1])
+    return {ENVIRONMENTAL_SENSING_UUID: data}
+
+def pvvx_advertisement(temperature, humidity, battery=87, millivolts=2950):
+    data = bytes.fromhex("0B614738C1A4")
+    data += int(temperature * 100).to_bytes(2, "little", signed=True)
+    data += int(humidity * 100).to_bytes(2, "little") + millivolts.to_bytes(2, "little")
+    data += bytes([battery, 1, 0])
+    return {ENVIRONMENTAL_SENSING_UUID: data}
+
+def wait_for_temperature(listener, mac, temperature, timeout=2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        reading = listener.get_reading(mac)
+        if reading and reading["temperature"] == temperature:
+            return reading
+        time.sleep(0.01)
+    return None
+
+class TestDecoding:
+
+    def test_atc_format(self):
+        assert decode_service_data(atc_advertisement(-3.5, 48)) == {
+            "temperature": -3.5, "humidity": 48, "battery": 87, "voltage": 2.95,
+        }
+
+    def test_pvvx_format(self):
+        reading = decode_service_data(pvvx_advertisement(21.37, 55.2))
+        assert reading["temperature"] == 21.4
+        assert reading["humidity"] == 55
+        assert reading["voltage"] == 2.95
+
+    def test_unrelated_service_data_is_ignored(self):
+        assert decode_service_data({"0000fe95-0000-1000-8000-00805f9b34fb": b"\x00" * 13}) is None
+
+    def test_gatt_reading(self):
+        assert decode_gatt_reading(bytes.fromhex("5A0832720B")) == {
+            "temperature": 21.4, "humidity": 50, "voltage": 2.93,
+        }
+
+class TestXiaomiSensorListener:
+
+    def test_collects_readings_from_watched_sensors_only(self):
+        source = SimulatedAdvertisementSource([
+            ("11:22:33:44:55:66", atc_advertisement(30.0, 10)),
+            (SENSOR_MAC.lower(), atc_advertisement(20.5, 40)),
+            (SENSOR_MAC, atc_advertisement(21.0, 41)),
+        ])
+        listener = XiaomiSensorListener(source, [SENSOR_MAC])
+        listener.start()
+        try:
+            assert wait_for_temperature(listener, SENSOR_MAC, 21.0)
+        finally:
+            listener.stop(timeout=2)
+
+        reading = listener.get_reading(SENSOR_MAC.replace(":", "-"))
+        assert reading["humidity"] == 41
+        assert reading["source"] == "advertisement"
+        assert listener.get_reading("11:22:33:44:55:66") is None
+        assert not listener.thread.is_alive()
+
+    def test_stale_readings(self):
+        listener = XiaomiSensorListener(SimulatedAdvertisementSource([]))
+        listener.watch(SENSOR_MAC)
+        assert listener.stale_addresses(60) == [SENSOR_MAC]
+
+        listener.handle_advertisement(SENSOR_MAC, atc_advertisement(19.0, 60))
+        assert listener.stale_addresses(60) == []
+
+        listener.readings[SENSOR_MAC]["timestamp"] -= 120
+        assert listener.get_reading(SENSOR_MAC, max_age=60) is None
+        assert listener.get_reading(SENSOR_MAC)["temperature"] == 19.0
+        assert listener.stale_addresses(60) == [SENSOR_MAC]